@@ -1,5 +1,13 @@
+from django import forms
 from django.contrib import admin
-from .models import DeviceInform, DeviceParameter, DeviceTask, DeviceSession, ACSConfig
+from core.models import ONU
+from . import firmware, rollout, rollups, status
+from .identity import identities
+from .routers import in_lookup
+from .models import (
+    BulkOperation, DeviceInform, DeviceParameter, DeviceTask, DeviceSession, ACSConfig,
+    FirmwareImage, next_change_seq,
+)
 
 
 @admin.register(DeviceInform)
@@ -34,12 +42,24 @@ class DeviceInformAdmin(admin.ModelAdmin):
     actions = ['mark_offline', 'mark_online', 'create_onu_records']
     
     def mark_offline(self, request, queryset):
-        queryset.update(is_online=False)
+        rollups.online_changed(-queryset.filter(is_online=True).update(
+            is_online=False, change_seq=next_change_seq()
+        ))
+        ONU.objects.filter(deviceinform__in=queryset).update(online=False)
+        device_pks = list(queryset.values_list('id', flat=True))
+        identities.invalidate_pks(device_pks)
+        status.publish(device_pks)
         self.message_user(request, f"Marked {queryset.count()} devices as offline.")
     mark_offline.short_description = "Mark selected devices as offline"
     
     def mark_online(self, request, queryset):
-        queryset.update(is_online=True)
+        rollups.online_changed(queryset.filter(is_online=False).update(
+            is_online=True, change_seq=next_change_seq()
+        ))
+        ONU.objects.filter(deviceinform__in=queryset).update(online=True)
+        device_pks = list(queryset.values_list('id', flat=True))
+        identities.invalidate_pks(device_pks)
+        status.publish(device_pks)
         self.message_user(request, f"Marked {queryset.count()} devices as online.")
     mark_online.short_description = "Mark selected devices as online"
     
@@ -53,24 +73,59 @@ class DeviceInformAdmin(admin.ModelAdmin):
     create_onu_records.short_description = "Create ONU records for selected devices"
 
 
+class DeviceManufacturerFilter(admin.SimpleListFilter):
+    """Filter rows by their device's manufacturer without joining DeviceInform"""
+    title = 'manufacturer'
+    parameter_name = 'manufacturer'
+    
+    def lookups(self, request, model_admin):
+        manufacturers = DeviceInform.objects.exclude(manufacturer='').order_by(
+            'manufacturer'
+        ).values_list('manufacturer', flat=True).distinct()
+        return [(manufacturer, manufacturer) for manufacturer in manufacturers]
+    
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        devices = DeviceInform.objects.filter(manufacturer=self.value())
+        return queryset.filter(device_inform_id__in=in_lookup(devices, 'id', queryset.model))
+
+
+class DeviceRowAdmin(admin.ModelAdmin):
+    """Admin for rows belonging to a device, which may be in another database (acs.routers).
+    
+    Devices are fetched with one extra query per page instead of a join,
+    and the search also matches the device id the same way.
+    """
+    raw_id_fields = ('device_inform',)
+    list_select_related = ()  # Not False, which would join the device shown in list_display
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('device_inform')
+    
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            devices = DeviceInform.objects.filter(device_id__icontains=search_term.strip())
+            results |= queryset.filter(device_inform_id__in=in_lookup(devices, 'id', queryset.model))
+        return results, may_have_duplicates
+
+
 @admin.register(DeviceParameter)
-class DeviceParameterAdmin(admin.ModelAdmin):
+class DeviceParameterAdmin(DeviceRowAdmin):
     list_display = ('device_inform', 'parameter_name', 'parameter_value', 'value_type', 'last_updated')
-    list_filter = ('value_type', 'last_updated', 'device_inform__manufacturer')
-    search_fields = ('parameter_name', 'parameter_value', 'device_inform__device_id')
+    list_filter = ('value_type', 'last_updated', DeviceManufacturerFilter)
+    search_fields = ('parameter_name', 'parameter_value')
     readonly_fields = ('last_updated',)
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('device_inform')
 
 
 @admin.register(DeviceTask)
-class DeviceTaskAdmin(admin.ModelAdmin):
+class DeviceTaskAdmin(DeviceRowAdmin):
     list_display = (
         'device_inform', 'task_type', 'status', 'created_at', 'sent_at', 'completed_at'
     )
     list_filter = ('task_type', 'status', 'created_at')
-    search_fields = ('device_inform__device_id', 'task_type', 'error_message')
+    search_fields = ('task_type', 'error_message')
     readonly_fields = ('created_at', 'sent_at', 'completed_at', 'result')
     
     fieldsets = (
@@ -99,9 +154,135 @@ class DeviceTaskAdmin(admin.ModelAdmin):
     mark_as_failed.short_description = "Mark selected tasks as failed"
 
 
+class FirmwareImageForm(forms.ModelForm):
+    upload = forms.FileField(required=False, help_text="Firmware file (only when adding an image)")
+    
+    class Meta:
+        model = FirmwareImage
+        fields = (
+            'name', 'version', 'manufacturer', 'product_class', 'file_type', 'max_concurrent_downloads',
+        )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = cleaned_data.get('upload')
+        if self.instance.pk is None:
+            if not upload:
+                raise forms.ValidationError("Choose a firmware file to upload.")
+            # Only hashed here; FirmwareImageAdmin.save_model() stores it
+            sha256, size = firmware.hash_file(upload)
+            existing = FirmwareImage.objects.filter(sha256=sha256).first()
+            if existing is not None:
+                raise forms.ValidationError(f"This file is already uploaded as {existing}.")
+            self.instance.sha256 = sha256
+            self.instance.size = size
+            self.instance.filename = firmware.safe_filename(upload.name)
+        return cleaned_data
+
+
+@admin.register(FirmwareImage)
+class FirmwareImageAdmin(admin.ModelAdmin):
+    form = FirmwareImageForm
+    list_display = (
+        'name', 'version', 'manufacturer', 'product_class', 'filename', 'size',
+        'max_concurrent_downloads', 'created_at',
+    )
+    list_filter = ('manufacturer', 'file_type', 'created_at')
+    search_fields = ('name', 'version', 'filename', 'sha256')
+    readonly_fields = ('sha256', 'size', 'filename', 'created_at')
+    
+    def get_fields(self, request, obj=None):
+        fields = list(self.form.Meta.fields)
+        if obj is None:
+            return ['upload'] + fields
+        return fields + list(self.readonly_fields)
+    
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.sha256, obj.size = firmware.store_file(form.cleaned_data['upload'])
+        super().save_model(request, obj, form, change)
+
+
+class BulkOperationForm(forms.ModelForm):
+    class Meta:
+        model = BulkOperation
+        fields = '__all__'
+    
+    def clean_filters(self):
+        filters = self.cleaned_data['filters']
+        try:
+            rollout.validate_filters(filters)
+        except rollout.BulkOperationError as e:
+            raise forms.ValidationError(str(e))
+        return filters
+
+
+@admin.register(BulkOperation)
+class BulkOperationAdmin(admin.ModelAdmin):
+    form = BulkOperationForm
+    list_display = ('name', 'task_type', 'status', 'total_tasks', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status', 'task_type', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = (
+        'status', 'status_message', 'total_tasks', 'progress',
+        'created_at', 'started_at', 'resumed_at', 'last_wave_at', 'finished_at',
+    )
+    
+    fieldsets = (
+        ('Operation', {
+            'fields': ('name', 'task_type', 'parameters', 'filters')
+        }),
+        ('Rollout', {
+            'fields': ('wave_size', 'max_in_flight', 'wave_interval', 'min_success_rate', 'task_timeout')
+        }),
+        ('Progress', {
+            'fields': ('status', 'status_message', 'total_tasks', 'progress',
+                       'created_at', 'started_at', 'resumed_at', 'last_wave_at', 'finished_at')
+        }),
+    )
+    
+    actions = ['start_operations', 'pause_operations', 'abort_operations']
+    
+    def get_readonly_fields(self, request, obj=None):
+        # The tasks are created with the operation; changing what they do afterwards has no effect
+        if obj is not None:
+            return self.readonly_fields + ('task_type', 'parameters', 'filters')
+        return self.readonly_fields
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            created = rollout.populate(obj)
+            self.message_user(request, f"Created {created} held tasks; start the operation to release them.")
+    
+    def progress(self, obj):
+        if obj.pk is None:
+            return '-'
+        counts = rollout.task_counts(obj)
+        return ", ".join(f"{status} {count}" for status, count in counts.items() if count)
+    
+    def start_operations(self, request, queryset):
+        for operation in queryset:
+            rollout.start(operation)
+        self.message_user(request, f"Started {queryset.filter(status='running').count()} operations.")
+    start_operations.short_description = "Start or resume selected operations"
+    
+    def pause_operations(self, request, queryset):
+        for operation in queryset:
+            rollout.pause(operation)
+        self.message_user(request, f"Paused {queryset.filter(status='paused').count()} operations.")
+    pause_operations.short_description = "Pause selected operations"
+    
+    def abort_operations(self, request, queryset):
+        for operation in queryset:
+            rollout.abort(operation)
+        self.message_user(request, f"Aborted {queryset.filter(status='aborted').count()} operations.")
+    abort_operations.short_description = "Abort selected operations"
+
+
 @admin.register(DeviceSession)
 class DeviceSessionAdmin(admin.ModelAdmin):
-    list_display = ('session_id', 'device_id', 'ip_address', 'is_active', 'created_at', 'last_activity')
+    list_display = ('session_id', 'device_id', 'state', 'is_active', 'created_at', 'last_activity', 'expires_at')
     list_filter = ('is_active', 'created_at', 'last_activity')
     search_fields = ('session_id', 'device_id', 'ip_address')
     readonly_fields = ('created_at', 'last_activity')
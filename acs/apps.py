@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class AcsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'acs'
+    verbose_name = 'TR-069 ACS'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .routers import configure_sqlite
+
+        connection_created.connect(configure_sqlite, dispatch_uid='acs.configure_sqlite')
@@ -0,0 +1,235 @@
+"""
+ACS Benchmarks
+Repeatable microbenchmarks of the TR-069 hot paths with a regression baseline.
+
+Each benchmark reports the median and best wall time per call, the memory
+one call allocates (tracemalloc peak) and the SQL queries one call makes.
+``compare()`` checks a run against a stored baseline: any extra query is a
+regression, time and allocations may grow by a tolerance. Run them with
+``manage.py benchmark_acs``, which sets up a throwaway test database.
+"""
+
+import gc
+import itertools
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+BASELINE_VERSION = 1
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.10
+
+_benchmarks = {}
+
+
+class Benchmark:
+    """A named hot path; ``setup()`` returns the callable that is timed"""
+
+    def __init__(self, name, setup, number):
+        self.name = name
+        self.setup = setup
+        self.number = number
+
+    def measure(self, rounds):
+        call = self.setup()
+        call()  # Warm caches (lru caches, identity cache, compiled regexes)
+
+        timings = []
+        for _ in range(rounds):
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                started = time.perf_counter()
+                for _ in range(self.number):
+                    call()
+                timings.append((time.perf_counter() - started) / self.number)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+
+        with ExitStack() as stack:
+            captures = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+            call()
+
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'median_us': round(statistics.median(timings) * 1e6, 2),
+            'best_us': round(min(timings) * 1e6, 2),
+            'calls': self.number * rounds,
+            'peak_alloc_bytes': peak - baseline,
+            'queries': sum(len(capture.captured_queries) for capture in captures),
+        }
+
+
+def benchmark(name, number=100):
+    """Register ``setup`` as a benchmark"""
+    def register(setup):
+        _benchmarks[name] = Benchmark(name, setup, number)
+        return setup
+    return register
+
+
+def inform_payload(parameter_count, serial_number='BENCH0001'):
+    from .simulator import VirtualCPE
+
+    return VirtualCPE('huawei', serial_number, parameter_count, seed=1).inform(('2 PERIODIC',))
+
+
+for _count in (10, 100, 1000):
+    def _setup_parse(count=_count):
+        from .tr069 import TR069Handler
+
+        handler = TR069Handler()
+        payload = inform_payload(count)
+        return lambda: handler.parse_inform(payload)
+    benchmark(f'parse_inform[{_count}]', number=2000 // _count + 10)(_setup_parse)
+
+
+def _response_builders():
+    from .models import DeviceTask, FirmwareImage
+    from .tr069 import TR069Handler
+
+    handler = TR069Handler()
+    image = FirmwareImage(pk=1, name='bench', sha256='0' * 64, size=16 * 1024 * 1024, filename='bench.bin')
+    download = DeviceTask(pk=1, task_type='Download', firmware_image=image)
+    names = [f'InternetGatewayDevice.LANDevice.1.Hosts.Host.{i}.HostName' for i in range(20)]
+    values = {name: f'value-{i}' for i, name in enumerate(names)}
+    return {
+        'create_inform_response': lambda: handler.create_inform_response(cwmp_id='1234'),
+        'create_get_parameter_values': lambda: handler.create_get_parameter_values(names, '1234'),
+        'create_set_parameter_values': lambda: handler.create_set_parameter_values(values, '1234'),
+        'create_reboot': lambda: handler.create_reboot('bench', '1234'),
+        'create_factory_reset': lambda: handler.create_factory_reset('1234'),
+        'create_download': lambda: handler.create_download(download, 'http://acs.example.com', '1234'),
+        'create_transfer_complete_response': lambda: handler.create_transfer_complete_response('1234'),
+    }
+
+
+for _builder in (
+    'create_inform_response', 'create_get_parameter_values', 'create_set_parameter_values',
+    'create_reboot', 'create_factory_reset', 'create_download', 'create_transfer_complete_response',
+):
+    benchmark(_builder, number=2000)(lambda builder=_builder: _response_builders()[builder])
+
+
+@benchmark('handle_device_discovery[new]', number=20)
+def _setup_discovery_new():
+    from .tr069 import TR069ACSView
+
+    view = TR069ACSView()
+    serials = itertools.count(1)
+    handler = view.tr069_handler
+
+    def call():
+        message = handler.parse_inform(inform_payload(100, f'BENCHNEW{next(serials):08d}'))
+        view.handle_device_discovery(message, '10.0.0.1', None)
+    return call
+
+
+@benchmark('handle_device_discovery[known]', number=50)
+def _setup_discovery_known():
+    from .tr069 import TR069ACSView
+
+    view = TR069ACSView()
+    message = view.tr069_handler.parse_inform(inform_payload(100, 'BENCHKNOWN'))
+    return lambda: view.handle_device_discovery(message, '10.0.0.1', None)
+
+
+def _view_call(view, path):
+    from django.contrib.auth import get_user_model
+    from django.test import RequestFactory
+
+    user, _ = get_user_model().objects.get_or_create(username='benchmark')
+    request_factory = RequestFactory()
+
+    def call():
+        request = request_factory.get(path)
+        request.user = user
+        return view(request)
+    return call
+
+
+@benchmark('acs_dashboard', number=20)
+def _setup_dashboard():
+    from . import views
+
+    return _view_call(views.acs_dashboard, '/acs/dashboard/')
+
+
+@benchmark('device_statistics', number=50)
+def _setup_statistics():
+    from . import views
+
+    return _view_call(views.device_statistics, '/acs/api/statistics/')
+
+
+def populate(devices=500):
+    """Seed the database so the dashboard queries have rows to read.
+
+    The known-device benchmark gets its device and ONU here: auto-discovered
+    devices without a MAC address share a placeholder ONU MAC, so whether
+    discovery could link one would depend on the benchmarks run before it.
+    """
+    from core.models import ONU
+    from . import rollups
+    from .models import DeviceInform
+
+    onu = ONU.objects.create(serial_number='BENCHKNOWN', mac_address='02:00:00:00:00:01', vendor='Huawei')
+    DeviceInform.objects.create(
+        device_id='00E0FC-BENCHKNOWN', oui='00E0FC', serial_number='BENCHKNOWN',
+        manufacturer='Huawei Technologies Co., Ltd', model_name='HG8245H',
+        ip_address='10.0.0.1', is_online=True, onu=onu,
+    )
+    DeviceInform.objects.bulk_create([
+        DeviceInform(
+            device_id=f'BENCH-{i}', oui='00E0FC', serial_number=f'BENCHSEED{i:06d}',
+            manufacturer=('Huawei', 'ZTE')[i % 2], model_name='HG8245H',
+            software_version=f'V{i % 5}', ip_address='10.0.0.1', is_online=i % 3 != 0,
+        )
+        for i in range(devices)
+    ], batch_size=500)
+    rollups.rebuild()
+
+
+def run(names=None, rounds=5):
+    """Run the selected benchmarks (default: all); returns ``{name: result}``"""
+    selected = names or list(_benchmarks)
+    unknown = set(selected) - set(_benchmarks)
+    if unknown:
+        raise KeyError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    return {name: _benchmarks[name].measure(rounds) for name in selected}
+
+
+def compare(results, baseline, time_tolerance=DEFAULT_TIME_TOLERANCE,
+            memory_tolerance=DEFAULT_MEMORY_TOLERANCE, check_time=True):
+    """Regressions of ``results`` against a baseline, as human-readable strings"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            continue
+        if result['queries'] > reference['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, baseline {reference['queries']}")
+        limit = reference['peak_alloc_bytes'] * (1 + memory_tolerance)
+        if result['peak_alloc_bytes'] > limit and result['peak_alloc_bytes'] - reference['peak_alloc_bytes'] > 1024:
+            regressions.append(
+                f"{name}: allocates {result['peak_alloc_bytes']} bytes, "
+                f"baseline {reference['peak_alloc_bytes']}"
+            )
+        if check_time and result['median_us'] > reference['median_us'] * (1 + time_tolerance):
+            regressions.append(
+                f"{name}: {result['median_us']}us per call, baseline {reference['median_us']}us"
+            )
+    return regressions
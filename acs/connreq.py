@@ -0,0 +1,366 @@
+"""
+TR-069 Connection Request Dispatcher
+Asks CPEs to open a CWMP session now instead of at their next periodic Inform
+"""
+
+import asyncio
+import base64
+import hashlib
+import ipaddress
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_REQUEST_PARAMETER = 'ManagementServer.ConnectionRequestURL'
+
+DEFAULT_CONCURRENCY = 200
+DEFAULT_SUBNET_CONCURRENCY = 16
+DEFAULT_SUBNET_PREFIX = 24
+DEFAULT_TIMEOUT = 10
+DEFAULT_ATTEMPTS = 3
+DEFAULT_BACKOFF = 1.0
+DEFAULT_NONCE_TTL = 300
+MAX_CACHED_CHALLENGES = 50000
+
+_AUTH_PARAM_RE = re.compile(r'(\w+)\s*=\s*(?:"([^"]*)"|([^\s,]+))')
+
+
+def find_connection_request_url(parameters):
+    """Return the ConnectionRequestURL from an Inform ParameterList, if any"""
+    for name, value in parameters.items():
+        if name.endswith(CONNECTION_REQUEST_PARAMETER) and value:
+            return value.strip()
+    return ''
+
+
+class ConnectionRequestResult:
+    """Outcome of one connection request"""
+    __slots__ = ('device_pk', 'url', 'ok', 'status', 'attempts', 'error')
+
+    def __init__(self, device_pk, url, ok=False, status=None, attempts=0, error=''):
+        self.device_pk = device_pk
+        self.url = url
+        self.ok = ok
+        self.status = status
+        self.attempts = attempts
+        self.error = error
+
+    def __repr__(self):
+        return f"ConnectionRequestResult({self.device_pk}, ok={self.ok}, status={self.status})"
+
+
+class DigestChallenge:
+    """Cached digest challenge for one CPE, reused until the CPE issues a new nonce"""
+    __slots__ = ('realm', 'nonce', 'opaque', 'qop', 'algorithm', '_nonce_count')
+
+    def __init__(self, header):
+        params = {
+            key.lower(): quoted if quoted else bare
+            for key, quoted, bare in _AUTH_PARAM_RE.findall(header)
+        }
+        self.realm = params.get('realm', '')
+        self.nonce = params.get('nonce', '')
+        self.opaque = params.get('opaque')
+        qops = [q.strip() for q in params.get('qop', '').split(',') if q.strip()]
+        self.qop = 'auth' if 'auth' in qops else None
+        self.algorithm = params.get('algorithm', 'MD5')
+        self._nonce_count = itertools.count(1)  # next() is thread-safe
+
+    def _hash(self, data):
+        name = 'sha256' if self.algorithm.upper().startswith('SHA-256') else 'md5'
+        return hashlib.new(name, data.encode('utf-8')).hexdigest()
+
+    def authorization(self, method, uri, username, password):
+        """Build the Authorization header for the next request on this nonce"""
+        nc = f"{next(self._nonce_count):08x}"
+        cnonce = os.urandom(8).hex()
+        ha1 = self._hash(f"{username}:{self.realm}:{password}")
+        if self.algorithm.upper().endswith('-SESS'):
+            ha1 = self._hash(f"{ha1}:{self.nonce}:{cnonce}")
+        ha2 = self._hash(f"{method}:{uri}")
+        if self.qop:
+            response = self._hash(f"{ha1}:{self.nonce}:{nc}:{cnonce}:{self.qop}:{ha2}")
+        else:
+            response = self._hash(f"{ha1}:{self.nonce}:{ha2}")
+
+        parts = [
+            f'username="{username}"', f'realm="{self.realm}"', f'nonce="{self.nonce}"',
+            f'uri="{uri}"', f'response="{response}"', f'algorithm={self.algorithm}',
+        ]
+        if self.qop:
+            parts += [f'qop={self.qop}', f'nc={nc}', f'cnonce="{cnonce}"']
+        if self.opaque is not None:
+            parts.append(f'opaque="{self.opaque}"')
+        return 'Digest ' + ', '.join(parts)
+
+
+class ChallengeCache:
+    """Digest challenges by CPE address, kept across dispatches for a TTL
+
+    Every wake is a dispatch of its own, so a cache held by one client
+    would be gone before the CPE is woken again.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, challenge = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            return challenge
+
+    def put(self, key, challenge):
+        ttl = self.ttl or getattr(settings, 'ACS_CONNECTION_REQUEST_NONCE_TTL', DEFAULT_NONCE_TTL)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= MAX_CACHED_CHALLENGES:
+                self._entries = {
+                    key: entry for key, entry in self._entries.items() if entry[0] > now
+                }
+            self._entries[key] = (now + ttl, challenge)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+challenge_cache = ChallengeCache()
+
+
+class _Response:
+    __slots__ = ('status', 'headers', 'keep_alive')
+
+    def __init__(self, status, headers, keep_alive):
+        self.status = status
+        self.headers = headers
+        self.keep_alive = keep_alive
+
+
+class ConnectionRequestClient:
+    """asyncio HTTP/1.1 client for connection requests
+
+    Keeps one idle keep-alive connection per CPE address while it is open,
+    and each CPE's digest challenge in ``challenges`` (by default
+    ``challenge_cache``, shared by the process) so the 401 round trip is only paid when the nonce
+    changes.
+    """
+
+    def __init__(self, username='', password='', timeout=DEFAULT_TIMEOUT, challenges=None):
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._idle = {}
+        self._challenges = challenges if challenges is not None else challenge_cache
+
+    async def request(self, url):
+        """Issue one connection request; returns the final HTTP status"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Invalid connection request URL: {url}")
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        uri = parts.path or '/'
+        if parts.query:
+            uri = f"{uri}?{parts.query}"
+
+        challenge = self._challenges.get(key)
+        response = await self._send(key, uri, challenge)
+        if response.status == 401 and self.username:
+            header = response.headers.get('www-authenticate', '')
+            if header.lower().startswith('digest'):
+                challenge = DigestChallenge(header)
+                self._challenges.put(key, challenge)
+                response = await self._send(key, uri, challenge)
+            elif header.lower().startswith('basic'):
+                response = await self._send(key, uri, None, basic=True)
+        return response.status
+
+    async def _send(self, key, uri, challenge, basic=False):
+        scheme, host, port = key
+        reader, writer = self._idle.pop(key, (None, None))
+        if writer is None or writer.is_closing():
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=scheme == 'https'),
+                self.timeout,
+            )
+
+        headers = [f"GET {uri} HTTP/1.1", f"Host: {host}:{port}", "Content-Length: 0"]
+        if challenge is not None:
+            headers.append(
+                "Authorization: " + challenge.authorization('GET', uri, self.username, self.password)
+            )
+        elif basic:
+            token = base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
+            headers.append(f"Authorization: Basic {token}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1'))
+
+        try:
+            response = await asyncio.wait_for(self._read_response(reader), self.timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if response.keep_alive:
+            self._idle[key] = (reader, writer)
+        else:
+            writer.close()
+        return response
+
+    async def _read_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed before response")
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        status = int(status)
+        if status == 204 or status == 304 or status < 200:
+            pass
+        elif 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await reader.read()
+            keep_alive = False
+        return _Response(status, headers, keep_alive)
+
+    async def close(self):
+        for _, writer in self._idle.values():
+            writer.close()
+        self._idle.clear()
+
+
+class ConnectionRequestDispatcher:
+    """Fire connection requests concurrently with per-subnet limits and retries"""
+
+    def __init__(self, username=None, password=None, concurrency=None,
+                 subnet_concurrency=None, subnet_prefix=None, timeout=None,
+                 attempts=None, backoff=None):
+        self.username = username if username is not None else getattr(
+            settings, 'ACS_CONNECTION_REQUEST_USERNAME', '')
+        self.password = password if password is not None else getattr(
+            settings, 'ACS_CONNECTION_REQUEST_PASSWORD', '')
+        self.concurrency = concurrency or getattr(
+            settings, 'ACS_CONNECTION_REQUEST_CONCURRENCY', DEFAULT_CONCURRENCY)
+        self.subnet_concurrency = subnet_concurrency or getattr(
+            settings, 'ACS_CONNECTION_REQUEST_SUBNET_CONCURRENCY', DEFAULT_SUBNET_CONCURRENCY)
+        self.subnet_prefix = subnet_prefix or DEFAULT_SUBNET_PREFIX
+        self.timeout = timeout or getattr(
+            settings, 'ACS_CONNECTION_REQUEST_TIMEOUT', DEFAULT_TIMEOUT)
+        self.attempts = attempts or DEFAULT_ATTEMPTS
+        self.backoff = backoff if backoff is not None else DEFAULT_BACKOFF
+
+    def subnet_key(self, url):
+        """Group CPEs by subnet so one access network is not flooded"""
+        host = urlsplit(url).hostname or ''
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return host
+        prefix = self.subnet_prefix if address.version == 4 else 64
+        return ipaddress.ip_network(f"{address}/{prefix}", strict=False)
+
+    async def dispatch(self, targets):
+        """Send a connection request to each ``(device_pk, url)`` target"""
+        client = ConnectionRequestClient(self.username, self.password, self.timeout)
+        limit = asyncio.Semaphore(self.concurrency)
+        subnets = {}
+
+        async def run(device_pk, url):
+            subnet = subnets.setdefault(
+                self.subnet_key(url), asyncio.Semaphore(self.subnet_concurrency)
+            )
+            async with limit, subnet:
+                return await self._request_with_retry(client, device_pk, url)
+
+        try:
+            return await asyncio.gather(*(run(pk, url) for pk, url in targets))
+        finally:
+            await client.close()
+
+    async def _request_with_retry(self, client, device_pk, url):
+        result = ConnectionRequestResult(device_pk, url)
+        for attempt in range(1, self.attempts + 1):
+            result.attempts = attempt
+            try:
+                result.status = await client.request(url)
+            except (OSError, EOFError, asyncio.TimeoutError, ValueError) as e:
+                result.error = str(e) or e.__class__.__name__
+                if isinstance(e, ValueError):
+                    break
+            else:
+                result.ok = result.status in (200, 204)
+                if result.ok or result.status in (401, 403, 404):
+                    break
+                result.error = f"HTTP {result.status}"
+            if attempt < self.attempts:
+                delay = self.backoff * (2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+        if not result.ok:
+            logger.warning(f"Connection request to {url} failed: {result.error or result.status}")
+        return result
+
+    def dispatch_devices(self, devices):
+        """Synchronously wake DeviceInform rows that have a connection request URL"""
+        targets = [
+            (device.pk, device.connection_request_url)
+            for device in devices if device.connection_request_url
+        ]
+        if not targets:
+            return []
+        started = time.monotonic()
+        results = asyncio.run(self.dispatch(targets))
+        logger.info(
+            f"Sent {len(results)} connection requests "
+            f"({sum(r.ok for r in results)} ok) in {time.monotonic() - started:.2f}s"
+        )
+        return results
+
+
+def wake_devices(device_pks):
+    """Send connection requests for the given devices from a background thread"""
+    from .models import DeviceInform
+
+    def run():
+        try:
+            devices = DeviceInform.objects.filter(pk__in=list(device_pks)).only(
+                'id', 'connection_request_url'
+            )
+            ConnectionRequestDispatcher().dispatch_devices(devices)
+        except Exception as e:
+            logger.error(f"Connection request dispatch failed: {e}")
+        finally:
+            from django.db import connection
+            connection.close()
+
+    thread = threading.Thread(target=run, name='acs-connreq', daemon=True)
+    thread.start()
+    return thread
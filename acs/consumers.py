@@ -0,0 +1,33 @@
+"""
+ACS WebSocket Consumers
+"""
+
+import asyncio
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.utils import timezone
+
+from .status import STATUS_GROUP, broadcaster
+
+
+class DeviceStatusConsumer(AsyncJsonWebsocketConsumer):
+    """Pushes device status changes to logged-in dashboard users"""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated or not broadcaster.active:
+            # Without pushes (no cross-process channel layer) the dashboard polls
+            await self.close()
+            return
+        broadcaster.bind_loop(asyncio.get_running_loop())
+        await self.channel_layer.group_add(STATUS_GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(STATUS_GROUP, self.channel_name)
+
+    async def device_status(self, event):
+        await self.send_json({
+            'devices': event['devices'],
+            'timestamp': timezone.now().isoformat(),
+        })
@@ -0,0 +1,250 @@
+"""
+Firmware Images
+Content-addressed firmware storage and the download side of Download tasks.
+
+Images are stored once per SHA-256 under ACS_FIRMWARE_ROOT. A Download task
+hands the CPE a signed, expiring URL; the view checks the token and, with
+ACS_FIRMWARE_SENDFILE set, leaves the transfer (including Range requests)
+to nginx or the WSGI server so no worker is held for the minutes a CPE
+takes to fetch an image.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.db import router
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .routers import atomic_write
+
+logger = logging.getLogger(__name__)
+
+SENDFILE_NGINX = 'nginx'
+SENDFILE_HEADER = 'x-sendfile'
+
+DEFAULT_ACCEL_PREFIX = '/protected-firmware/'
+DEFAULT_URL_MAX_AGE = 86400
+DEFAULT_DOWNLOAD_TIMEOUT = 3600
+CHUNK_SIZE = 64 * 1024
+TOKEN_SALT = 'acs.firmware'
+COMMAND_KEY_PREFIX = 'download-'
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def firmware_root():
+    return Path(getattr(settings, 'ACS_FIRMWARE_ROOT', Path(settings.BASE_DIR) / 'firmware'))
+
+
+def image_path(image):
+    return firmware_root() / image.storage_name
+
+
+def hash_file(fileobj):
+    """``(sha256, size)`` of a file's content, read from the start"""
+    if hasattr(fileobj, 'seek'):
+        fileobj.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def store_file(fileobj):
+    """Store a file's content under its hash; returns ``(sha256, size)``.
+
+    The file is hashed while it is copied to a temporary file, which is then
+    renamed into place, so the same content is only ever stored once.
+    """
+    root = firmware_root()
+    root.mkdir(parents=True, exist_ok=True)
+    if hasattr(fileobj, 'seek'):
+        fileobj.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=root, delete=False) as tmp:
+        try:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+
+    sha256 = digest.hexdigest()
+    target = root / sha256[:2] / sha256
+    if target.exists():
+        os.unlink(tmp.name)
+    else:
+        target.parent.mkdir(exist_ok=True)
+        os.replace(tmp.name, target)
+        os.chmod(target, 0o644)
+        logger.info(f"Stored firmware file {sha256} ({size} bytes)")
+    return sha256, size
+
+
+def safe_filename(filename):
+    """Filename reduced to characters that are safe in a download URL"""
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', os.path.basename(filename or '')).strip('._')
+    return name[:128] or 'firmware.bin'
+
+
+def command_key(task):
+    """CommandKey sent with a Download RPC; TransferComplete echoes it back"""
+    return f"{COMMAND_KEY_PREFIX}{task.pk}"
+
+
+def task_id_from_command_key(key):
+    if key and key.startswith(COMMAND_KEY_PREFIX):
+        task_id = key[len(COMMAND_KEY_PREFIX):]
+        if task_id.isdigit():
+            return int(task_id)
+    return None
+
+
+def download_token(task):
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(f"{task.pk}.{task.firmware_image_id}")
+
+
+def read_token(token):
+    """``(task pk, image pk)`` for a valid, unexpired token, else None"""
+    max_age = getattr(settings, 'ACS_FIRMWARE_URL_MAX_AGE', DEFAULT_URL_MAX_AGE)
+    try:
+        value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age)
+        task_pk, image_pk = value.split('.')
+        return int(task_pk), int(image_pk)
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def download_url(task, base_url):
+    """Absolute URL the CPE fetches the task's image from"""
+    from django.urls import reverse
+
+    base_url = getattr(settings, 'ACS_FIRMWARE_BASE_URL', '') or base_url
+    path = reverse('acs:firmware_download', args=[download_token(task), task.firmware_image.filename])
+    return base_url.rstrip('/') + path
+
+
+def claim_download(task, now=None):
+    """Move a pending Download task to ``sent`` if its image has a free slot.
+
+    Downloads count against the image's limit from the moment the RPC is
+    sent until TransferComplete closes the task, or ACS_FIRMWARE_DOWNLOAD_TIMEOUT
+    passes for a CPE that never reports back. The count and the claim run
+    under a lock on the image row (the write lock on SQLite), so two workers
+    cannot both take the last slot. Returns whether the task was claimed.
+    """
+    from .models import DeviceTask, FirmwareImage
+
+    image = task.firmware_image
+    now = now or timezone.now()
+    with atomic_write(router.db_for_write(DeviceTask)):
+        if image.max_concurrent_downloads:
+            FirmwareImage.objects.select_for_update().filter(pk=image.pk).values_list('pk').first()
+            timeout = getattr(settings, 'ACS_FIRMWARE_DOWNLOAD_TIMEOUT', DEFAULT_DOWNLOAD_TIMEOUT)
+            in_progress = image.tasks.filter(
+                status='sent', sent_at__gte=now - timedelta(seconds=timeout)
+            )[:image.max_concurrent_downloads].count()
+            if in_progress >= image.max_concurrent_downloads:
+                return False
+        return bool(DeviceTask.objects.filter(pk=task.pk, status='pending').update(status='sent', sent_at=now))
+
+
+def parse_range(header, size):
+    """``(first, last)`` byte positions for a single-range Range header, or None to send it all"""
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - suffix, 0), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        # Syntactically invalid (RFC 9110 14.1.1): ignore the header
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable(header)
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+def _read_range(f, first, length):
+    with f:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(request, image):
+    """Response delivering an image's file, honouring Range"""
+    mode = getattr(settings, 'ACS_FIRMWARE_SENDFILE', '')
+    path = image_path(image)
+    if mode == SENDFILE_NGINX:
+        # nginx serves the internal location itself, Range requests included
+        response = HttpResponse(content_type='application/octet-stream')
+        prefix = getattr(settings, 'ACS_FIRMWARE_ACCEL_PREFIX', DEFAULT_ACCEL_PREFIX)
+        response['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{image.storage_name}"
+    elif mode == SENDFILE_HEADER:
+        response = HttpResponse(content_type='application/octet-stream')
+        response['X-Sendfile'] = str(path)
+    else:
+        response = _serve_file(request, image, path)
+    response['ETag'] = f'"{image.sha256}"'
+    response['Content-Disposition'] = f'attachment; filename="{image.filename}"'
+    return response
+
+
+def _serve_file(request, image, path):
+    size = image.size
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range.strip('"') == image.sha256:
+        try:
+            byte_range = parse_range(request.headers.get('Range', ''), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        logger.error(f"Firmware file {path} of image {image.pk} is missing")
+        raise Http404("Firmware file not found")
+    if byte_range is None:
+        # Whole file: FileResponse lets the WSGI server use sendfile()
+        response = FileResponse(f, content_type='application/octet-stream')
+    else:
+        first, last = byte_range
+        length = last - first + 1
+        response = StreamingHttpResponse(
+            _read_range(f, first, length), status=206, content_type='application/octet-stream'
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,282 @@
+"""
+Parameter History
+Records parameter value changes and downsamples old points into buckets.
+
+Raw change points are kept for ACS_HISTORY_RAW_DAYS, then compacted into
+hourly min/max/avg buckets, which after ACS_HISTORY_HOURLY_DAYS are rolled
+into daily buckets kept for ACS_HISTORY_RETENTION_DAYS. Storage per
+parameter is therefore bounded however often a device informs.
+"""
+
+import fnmatch
+import logging
+import re
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import router
+from django.utils import timezone
+
+from .routers import atomic_write
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 86400
+
+DEFAULT_PARAMETERS = [
+    '*.RXPower', '*.TXPower', '*.RxPower', '*.TxPower',
+    '*.OpticalSignalLevel', '*.TransmitOpticalLevel',
+    '*.Temperature', '*.Voltage', '*.BiasCurrent',
+    '*.ExternalIPAddress', '*.SoftwareVersion',
+]
+DEFAULT_RAW_DAYS = 7
+DEFAULT_HOURLY_DAYS = 90
+DEFAULT_RETENTION_DAYS = 365
+WRITE_BATCH_SIZE = 1000
+
+
+@lru_cache(maxsize=1)
+def _tracked_re(patterns):
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+def is_tracked(name):
+    """Whether changes to this parameter are kept (ACS_HISTORY_PARAMETERS globs)"""
+    tracked = _tracked_re(tuple(getattr(settings, 'ACS_HISTORY_PARAMETERS', DEFAULT_PARAMETERS)))
+    return tracked is not None and tracked.match(name) is not None
+
+
+def record(changes, recorded_at=None):
+    """Append history rows for tracked parameters.
+
+    ``changes`` is an iterable of ``(device pk, parameter pk or None, name,
+    value)`` for values that were just created or changed. Missing parameter
+    pks (rows created by a bulk insert that did not return them) are looked
+    up in one query.
+    """
+    from .models import DeviceParameter, ParameterHistory
+
+    changes = [change for change in changes if is_tracked(change[2])]
+    if not changes:
+        return 0
+    recorded_at = recorded_at or timezone.now()
+
+    missing = [(device_pk, name) for device_pk, pk, name, _ in changes if pk is None]
+    ids = {}
+    if missing:
+        for pk, device_pk, name in DeviceParameter.objects.filter(
+            device_inform_id__in={device_pk for device_pk, _ in missing},
+            parameter_name__in={name for _, name in missing},
+        ).values_list('id', 'device_inform_id', 'parameter_name'):
+            ids[device_pk, name] = pk
+
+    rows = []
+    for device_pk, pk, name, value in changes:
+        pk = pk or ids.get((device_pk, name))
+        if pk is not None:
+            rows.append(ParameterHistory(
+                device_inform_id=device_pk, parameter_id=pk,
+                recorded_at=recorded_at, value='' if value is None else str(value),
+            ))
+    ParameterHistory.objects.bulk_create(rows, batch_size=WRITE_BATCH_SIZE)
+    return len(rows)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _bucket_start(moment, seconds):
+    epoch = int(moment.timestamp())
+    return moment - timedelta(seconds=epoch % seconds, microseconds=moment.microsecond)
+
+
+class _Bucket:
+    __slots__ = ('device_pk', 'samples', 'numeric', 'total', 'low', 'high', 'last_at', 'last')
+
+    def __init__(self, device_pk):
+        self.device_pk = device_pk
+        self.samples = 0
+        self.numeric = 0
+        self.total = 0.0
+        self.low = None
+        self.high = None
+        self.last_at = None
+        self.last = ''
+
+    def add(self, at, value):
+        """Fold in one raw point"""
+        number = _number(value)
+        self.merge(at, value, 1, number, number, number)
+
+    def merge(self, at, last, samples, low, high, total):
+        """Fold in a finer bucket; ``total`` is None when it held no numbers"""
+        self.samples += samples
+        if total is not None:
+            self.numeric += samples
+            self.total += total
+            self.low = low if self.low is None else min(self.low, low)
+            self.high = high if self.high is None else max(self.high, high)
+        if self.last_at is None or at >= self.last_at:
+            self.last_at = at
+            self.last = last
+
+    def model(self, parameter_pk, start, seconds):
+        from .models import ParameterHistoryBucket
+
+        return ParameterHistoryBucket(
+            device_inform_id=self.device_pk, parameter_id=parameter_pk,
+            bucket_start=start, bucket_seconds=seconds, samples=self.samples,
+            min_value=self.low, max_value=self.high,
+            avg_value=self.total / self.numeric if self.numeric else None,
+            last_value=self.last,
+        )
+
+
+def _row_total(row):
+    return row.avg_value * row.samples if row.avg_value is not None else None
+
+
+def _save_buckets(buckets, seconds):
+    """Insert buckets, merging into any already stored for the same slot"""
+    from .models import ParameterHistoryBucket
+
+    if not buckets:
+        return
+    existing = ParameterHistoryBucket.objects.filter(
+        bucket_seconds=seconds,
+        bucket_start__in={start for _, start in buckets},
+        parameter_id__in={pk for pk, _ in buckets},
+    )
+    for row in existing:
+        bucket = buckets.get((row.parameter_id, row.bucket_start))
+        if bucket is not None:
+            bucket.merge(row.bucket_start, row.last_value, row.samples,
+                         row.min_value, row.max_value, _row_total(row))
+    ParameterHistoryBucket.objects.filter(id__in=[row.id for row in existing]).delete()
+    ParameterHistoryBucket.objects.bulk_create(
+        [bucket.model(pk, start, seconds) for (pk, start), bucket in buckets.items()],
+        batch_size=WRITE_BATCH_SIZE,
+    )
+
+
+def _compact_raw(cutoff):
+    """Fold raw points older than ``cutoff`` into hourly buckets, a day at a time"""
+    from .models import ParameterHistory
+
+    old = ParameterHistory.objects.filter(recorded_at__lt=cutoff)
+    compacted = 0
+    while True:
+        oldest = old.order_by('recorded_at').first()
+        if oldest is None:
+            return compacted
+        window = _bucket_start(oldest.recorded_at, DAY)
+        end = min(window + timedelta(seconds=DAY), cutoff)
+        points = old.filter(recorded_at__gte=window, recorded_at__lt=end)
+        buckets = {}
+        for device_pk, parameter_pk, at, value in points.values_list(
+            'device_inform_id', 'parameter_id', 'recorded_at', 'value'
+        ).iterator(chunk_size=WRITE_BATCH_SIZE):
+            key = (parameter_pk, _bucket_start(at, HOUR))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = _Bucket(device_pk)
+            bucket.add(at, value)
+        with atomic_write(router.db_for_write(ParameterHistory)):
+            _save_buckets(buckets, HOUR)
+            compacted += points.delete()[0]
+
+
+def _compact_hourly(cutoff):
+    """Fold hourly buckets older than ``cutoff`` into daily buckets, a day at a time"""
+    from .models import ParameterHistoryBucket
+
+    hourly = ParameterHistoryBucket.objects.filter(bucket_seconds=HOUR, bucket_start__lt=cutoff)
+    compacted = 0
+    while True:
+        oldest = hourly.order_by('bucket_start').first()
+        if oldest is None:
+            return compacted
+        window = _bucket_start(oldest.bucket_start, DAY)
+        end = min(window + timedelta(seconds=DAY), cutoff)
+        rows = hourly.filter(bucket_start__gte=window, bucket_start__lt=end)
+        buckets = {}
+        for row in rows.iterator(chunk_size=WRITE_BATCH_SIZE):
+            key = (row.parameter_id, window)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = _Bucket(row.device_inform_id)
+            bucket.merge(row.bucket_start, row.last_value, row.samples,
+                         row.min_value, row.max_value, _row_total(row))
+        with atomic_write(router.db_for_write(ParameterHistoryBucket)):
+            compacted += rows.delete()[0]
+            _save_buckets(buckets, DAY)
+
+
+def compact(now=None):
+    """Apply the retention policy; returns counts of rows compacted or expired"""
+    from .models import ParameterHistoryBucket
+
+    now = now or timezone.now()
+    raw_days = getattr(settings, 'ACS_HISTORY_RAW_DAYS', DEFAULT_RAW_DAYS)
+    hourly_days = getattr(settings, 'ACS_HISTORY_HOURLY_DAYS', DEFAULT_HOURLY_DAYS)
+    retention_days = getattr(settings, 'ACS_HISTORY_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+
+    result = {
+        'raw': _compact_raw(_bucket_start(now - timedelta(days=raw_days), HOUR)),
+        'hourly': _compact_hourly(_bucket_start(now - timedelta(days=hourly_days), DAY)),
+        'expired': ParameterHistoryBucket.objects.filter(
+            bucket_seconds=DAY, bucket_start__lt=now - timedelta(days=retention_days)
+        ).delete()[0],
+    }
+    logger.info(
+        f"Compacted {result['raw']} history points and {result['hourly']} hourly buckets, "
+        f"expired {result['expired']} daily buckets"
+    )
+    return result
+
+
+def series(device_pk, parameters, start, end):
+    """History of the given DeviceParameter rows between ``start`` and ``end``
+
+    Returns ``{parameter pk: {'points': [...], 'buckets': [...]}}``. Points
+    are raw changes; buckets cover ranges that have already been compacted.
+    """
+    from .models import ParameterHistory, ParameterHistoryBucket
+
+    result = {pk: {'points': [], 'buckets': []} for pk in parameters}
+    if not result:
+        return result
+    points = ParameterHistory.objects.filter(
+        device_inform_id=device_pk, parameter_id__in=list(result),
+        recorded_at__gte=start, recorded_at__lt=end,
+    ).order_by('recorded_at').values_list('parameter_id', 'recorded_at', 'value')
+    for pk, at, value in points:
+        result[pk]['points'].append({'t': at.isoformat(), 'value': value})
+
+    buckets = ParameterHistoryBucket.objects.filter(
+        device_inform_id=device_pk, parameter_id__in=list(result),
+        bucket_seconds__in=[HOUR, DAY],
+        bucket_start__gte=_bucket_start(start, DAY), bucket_start__lt=end,
+    ).order_by('bucket_start')
+    for bucket in buckets:
+        bucket_end = bucket.bucket_start + timedelta(seconds=bucket.bucket_seconds)
+        if bucket_end <= start:
+            continue
+        result[bucket.parameter_id]['buckets'].append({
+            't': bucket.bucket_start.isoformat(),
+            'seconds': bucket.bucket_seconds,
+            'samples': bucket.samples,
+            'min': bucket.min_value,
+            'max': bucket.max_value,
+            'avg': bucket.avg_value,
+            'last': bucket.last_value,
+        })
+    return result
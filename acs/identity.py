@@ -0,0 +1,92 @@
+"""
+Device Identity Cache
+Per-process LRU map from (OUI, serial number) to a known device's pk and
+the mutable fields the Inform path compares against.
+
+Entries are hints, not truth: other workers, the offline sweeper and the
+admin change devices behind this process's back. The Inform path therefore
+only writes through a cached entry with an UPDATE whose WHERE clause
+repeats the cached values, and drops the entry when no row matches.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULT_CACHE_SIZE = 100000
+
+
+class DeviceIdentity:
+    """Last-known state of one device"""
+    __slots__ = (
+        'pk', 'ip_address', 'connection_request_url', 'inform_interval', 'onu_id', 'is_online',
+    )
+
+    def __init__(self, pk, ip_address, connection_request_url, inform_interval, onu_id, is_online):
+        self.pk = pk
+        self.ip_address = ip_address
+        self.connection_request_url = connection_request_url
+        self.inform_interval = inform_interval
+        self.onu_id = onu_id
+        self.is_online = is_online
+
+    @classmethod
+    def from_device(cls, device):
+        return cls(
+            device.pk, device.ip_address, device.connection_request_url,
+            device.inform_interval, device.onu_id, device.is_online,
+        )
+
+
+class IdentityCache:
+    """Thread-safe LRU of ``(oui, serial) -> DeviceIdentity``"""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size if max_size is not None else getattr(
+            settings, 'ACS_IDENTITY_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+        self._entries = OrderedDict()
+        self._keys_by_pk = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            identity = self._entries.get(key)
+            if identity is not None:
+                self._entries.move_to_end(key)
+            return identity
+
+    def put(self, key, identity):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = identity
+            self._entries.move_to_end(key)
+            self._keys_by_pk[identity.pk] = key
+            while len(self._entries) > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._keys_by_pk.pop(evicted.pk, None)
+
+    def invalidate(self, key):
+        with self._lock:
+            identity = self._entries.pop(key, None)
+            if identity is not None:
+                self._keys_by_pk.pop(identity.pk, None)
+
+    def invalidate_pks(self, pks):
+        with self._lock:
+            for pk in pks:
+                key = self._keys_by_pk.pop(pk, None)
+                if key is not None:
+                    self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_pk.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+identities = IdentityCache()
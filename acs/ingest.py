@@ -0,0 +1,443 @@
+"""
+Inform Ingestion
+Writes Inform data to the database, either inline or write-behind from a queue
+"""
+
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import search
+
+from . import metrics, optical, rollups, status
+from .connreq import find_connection_request_url
+from .identity import DeviceIdentity, identities
+from .liveness import find_inform_interval
+from .routers import atomic_write
+
+logger = logging.getLogger(__name__)
+
+MODE_SYNC = 'sync'
+MODE_MEMORY = 'memory'
+MODE_REDIS = 'redis'
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_BATCH_WAIT = 0.5
+REDIS_QUEUE_KEY = 'acs:inform-queue'
+
+
+def determine_value_type(value):
+    """Determine parameter value type"""
+    if isinstance(value, bool):
+        return 'boolean'
+    elif isinstance(value, int):
+        return 'int'
+    elif isinstance(value, float):
+        return 'float'
+    else:
+        return 'string'
+
+
+class InformJob:
+    """The parts of an Inform that are written to the database"""
+    __slots__ = (
+        'oui', 'serial_number', 'device_info', 'parameters',
+        'client_ip', 'connection_request_url', 'inform_interval', 'received_at',
+    )
+
+    def __init__(self, device_info, parameters, client_ip, received_at=None):
+        self.oui = device_info.get('OUI', '')
+        self.serial_number = device_info.get('SerialNumber', '')
+        self.device_info = device_info
+        self.parameters = parameters
+        self.client_ip = client_ip
+        self.connection_request_url = find_connection_request_url(parameters)
+        self.inform_interval = find_inform_interval(parameters)
+        self.received_at = received_at or timezone.now()
+
+    @classmethod
+    def from_message(cls, message, client_ip):
+        return cls(message.device_info, message.parameters, client_ip)
+
+    @property
+    def key(self):
+        return (self.oui, self.serial_number)
+
+    def to_json(self):
+        return json.dumps({
+            'device_info': self.device_info,
+            'parameters': self.parameters,
+            'client_ip': self.client_ip,
+            'received_at': self.received_at.isoformat(),
+        })
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        return cls(
+            data['device_info'], data['parameters'], data['client_ip'],
+            parse_datetime(data['received_at']),
+        )
+
+
+class InformWriter:
+    """Apply Inform jobs for many devices in one transaction"""
+
+    def write(self, jobs):
+        """Write a batch of jobs. Returns ``{(oui, serial): device pk}``."""
+        from core.models import ONU
+        from .models import DeviceInform, DeviceParameter, next_change_seq
+
+        # Later Informs from the same device win; their parameters are merged
+        latest = {}
+        for job in jobs:
+            previous = latest.get(job.key)
+            if previous is not None:
+                job.parameters = {**previous.parameters, **job.parameters}
+                job.connection_request_url = (
+                    job.connection_request_url or previous.connection_request_url
+                )
+                job.inform_interval = job.inform_interval or previous.inform_interval
+            latest[job.key] = job
+
+        device_pks = {}
+        onu_seen = {}
+        device_onus = {}
+        moved = []
+        with atomic_write():
+            started = time.perf_counter()
+            # Devices this process has seen need no read: one guarded UPDATE each
+            misses = []
+            for key, job in latest.items():
+                identity = identities.get(key)
+                if identity is not None and self.update_known(job, identity, moved):
+                    device_pks[key] = identity.pk
+                    if identity.onu_id is not None:
+                        onu_seen[identity.onu_id] = job.received_at
+                        device_onus[key] = identity.onu_id
+                else:
+                    identities.invalidate(key)
+                    misses.append(key)
+
+            known = {}
+            if misses:
+                known = {
+                    (oui, serial): (pk, ip_address, url, interval, onu_id, is_online)
+                    for pk, oui, serial, ip_address, url, interval, onu_id, is_online
+                    in DeviceInform.objects.filter(
+                        serial_number__in={serial for _, serial in misses}
+                    ).values_list(
+                        'id', 'oui', 'serial_number', 'ip_address', 'connection_request_url',
+                        'inform_interval', 'onu_id', 'is_online',
+                    )
+                }
+
+            updates = []
+            came_online = 0
+            for key in misses:
+                job = latest[key]
+                if key in known:
+                    pk, ip_address, url, interval, onu_id, is_online = known[key]
+                    came_online += not is_online
+                    if ip_address != job.client_ip:
+                        moved.append(pk)
+                    device = DeviceInform(
+                        id=pk,
+                        ip_address=job.client_ip,
+                        is_online=True,
+                        last_inform=job.received_at,
+                        connection_request_url=job.connection_request_url or url,
+                        inform_interval=job.inform_interval or interval,
+                        onu_id=onu_id,
+                        change_seq=next_change_seq(),
+                    )
+                    updates.append(device)
+                    device_pks[key] = pk
+                    if onu_id is not None:
+                        onu_seen[onu_id] = job.received_at
+                        device_onus[key] = onu_id
+                else:
+                    device = self.create_device(job)
+                    device_pks[key] = device.pk
+                    if device.onu_id is not None:
+                        device_onus[key] = device.onu_id
+                identities.put(key, DeviceIdentity.from_device(device))
+
+            if updates:
+                DeviceInform.objects.bulk_update(
+                    updates,
+                    ['ip_address', 'is_online', 'last_inform', 'connection_request_url',
+                     'inform_interval', 'change_seq'],
+                    batch_size=DeviceParameter.WRITE_BATCH_SIZE,
+                )
+            if onu_seen:
+                # Keep the ONU view's online flag in step with the ACS
+                ONU.objects.filter(id__in=list(onu_seen)).update(
+                    online=True, last_inform=max(onu_seen.values())
+                )
+            if device_onus:
+                self.update_optical_power(latest, device_onus)
+            if came_online:
+                rollups.online_changed(came_online)
+            if moved:
+                # The IP address is searchable; bulk_update skips the save signal
+                search.update_pks('device', moved)
+            metrics.STAGE_SECONDS.labels('device_lookup').observe(time.perf_counter() - started)
+
+            with metrics.stage('parameter_write'):
+                DeviceParameter.upsert_many({
+                    device_pks[key]: {
+                        name: (value, determine_value_type(value))
+                        for name, value in job.parameters.items()
+                    }
+                    for key, job in latest.items()
+                })
+            status.publish(device_pks.values())
+        return device_pks
+
+    def update_known(self, job, identity, moved):
+        """Write an Inform through a cached identity.
+
+        Only last_inform, change_seq and the fields that differ from the
+        cache are set. The cached values of everything else are repeated in
+        the WHERE clause, so if another process changed the device (or it
+        went offline) no row matches and False is returned.
+        """
+        from .models import DeviceInform, next_change_seq
+
+        values = {'last_inform': job.received_at, 'change_seq': next_change_seq()}
+        guard = {'pk': identity.pk, 'is_online': True, 'onu_id': identity.onu_id}
+        for field, value in (
+            ('ip_address', job.client_ip),
+            ('connection_request_url', job.connection_request_url),
+            ('inform_interval', job.inform_interval),
+        ):
+            if value and value != getattr(identity, field):
+                values[field] = value
+            else:
+                guard[field] = getattr(identity, field)
+
+        if not DeviceInform.objects.filter(**guard).update(**values):
+            return False
+        if 'ip_address' in values:
+            moved.append(identity.pk)
+        for field in ('ip_address', 'connection_request_url', 'inform_interval'):
+            if field in values:
+                setattr(identity, field, values[field])
+        return True
+
+    def update_optical_power(self, latest, device_onus):
+        """Copy optical levels from the Informs onto their ONUs, one statement per field set"""
+        from core.models import ONU
+        from .models import DeviceParameter
+
+        by_fields = {}
+        for key, onu_id in device_onus.items():
+            job = latest[key]
+            readings = optical.extract(job.device_info, job.parameters)
+            if readings:
+                by_fields.setdefault(tuple(sorted(readings)), []).append(ONU(id=onu_id, **readings))
+        for fields, onus in by_fields.items():
+            ONU.objects.bulk_update(onus, list(fields), batch_size=DeviceParameter.WRITE_BATCH_SIZE)
+
+    def create_device(self, job):
+        """Create (or fetch, if another worker won the race) a device record"""
+        from .models import DeviceInform
+
+        device_info = job.device_info
+        device_id = f"{job.oui}-{job.serial_number}"
+        device_inform, created = DeviceInform.objects.get_or_create(
+            oui=job.oui,
+            serial_number=job.serial_number,
+            defaults={
+                'device_id': device_id,
+                'product_class': device_info.get('ProductClass', ''),
+                'manufacturer': device_info.get('Manufacturer', ''),
+                'model_name': device_info.get('ModelName', ''),
+                'software_version': device_info.get('SoftwareVersion', ''),
+                'hardware_version': device_info.get('HardwareVersion', ''),
+                'ip_address': job.client_ip,
+                'connection_request_url': job.connection_request_url,
+                'inform_interval': job.inform_interval or 0,
+                'is_online': True,
+                'auto_discovered': True
+            }
+        )
+
+        # Auto-create ONU record if new device
+        if created:
+            try:
+                with transaction.atomic():
+                    device_inform.create_onu_record()
+            except IntegrityError as e:
+                # Keep the device even if its ONU clashes with an existing one
+                logger.warning(f"Could not create ONU record for {device_id}: {e}")
+            logger.info(f"Auto-discovered new device: {device_id}")
+        return device_inform
+
+
+class MemoryInformQueue:
+    """Bounded in-process queue drained by a consumer thread in the same worker"""
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+        self._consumer = None
+        self._lock = threading.Lock()
+
+    def put(self, job):
+        """Enqueue a job; raises queue.Full when the consumer is behind"""
+        self.queue.put_nowait(job)
+        if self._consumer is None:
+            self.start_consumer()
+
+    def get_batch(self, max_items, timeout):
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < max_items:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def start_consumer(self):
+        with self._lock:
+            if self._consumer is not None:
+                return
+            consumer = InformConsumer(self)
+            self._consumer = threading.Thread(
+                target=consumer.run_forever, name='acs-inform-consumer', daemon=True
+            )
+            self._consumer.start()
+            # Flush whatever is still queued when the worker exits
+            atexit.register(consumer.drain)
+
+
+class RedisInformQueue:
+    """Redis list shared by all workers, drained by `manage.py run_inform_consumer`"""
+
+    def __init__(self, url=None, key=REDIS_QUEUE_KEY):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.ACS_INFORM_REDIS_URL)
+        self.key = key
+
+    def put(self, job):
+        self.client.lpush(self.key, job.to_json())
+
+    def get_batch(self, max_items, timeout):
+        item = self.client.brpop(self.key, timeout=max(1, int(timeout)))
+        if item is None:
+            return []
+        raw = [item[1]]
+        more = self.client.rpop(self.key, max_items - 1) if max_items > 1 else None
+        raw.extend(more or [])
+        return [InformJob.from_json(data) for data in raw]
+
+
+class InformConsumer:
+    """Drain a queue and write Informs in batches spanning many devices"""
+
+    def __init__(self, inform_queue, batch_size=None, batch_wait=None, writer=None):
+        self.queue = inform_queue
+        self.batch_size = batch_size or getattr(settings, 'ACS_INFORM_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.batch_wait = batch_wait or getattr(settings, 'ACS_INFORM_BATCH_WAIT', DEFAULT_BATCH_WAIT)
+        self.writer = writer or InformWriter()
+        self.stopped = threading.Event()
+
+    def run_once(self):
+        """Write one batch; returns the number of jobs taken from the queue"""
+        jobs = self.queue.get_batch(self.batch_size, self.batch_wait)
+        if not jobs:
+            return 0
+        close_old_connections()
+        try:
+            self.writer.write(jobs)
+        except Exception as e:
+            logger.error(f"Inform batch of {len(jobs)} failed, retrying one by one: {e}")
+            for job in jobs:
+                try:
+                    self.writer.write([job])
+                except Exception as e:
+                    logger.error(f"Dropping Inform from {job.oui}-{job.serial_number}: {e}")
+        return len(jobs)
+
+    def run_forever(self):
+        while not self.stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Inform consumer error: {e}")
+                time.sleep(self.batch_wait)
+
+    def drain(self):
+        self.stopped.set()
+        while self.run_once():
+            pass
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def ingest_mode():
+    return getattr(settings, 'ACS_INFORM_INGEST_MODE', MODE_SYNC)
+
+
+def get_queue():
+    """The configured Inform queue, or None in synchronous mode"""
+    global _queue
+    mode = ingest_mode()
+    if mode == MODE_SYNC:
+        return None
+    with _queue_lock:
+        if _queue is None:
+            if mode == MODE_REDIS:
+                _queue = RedisInformQueue()
+            else:
+                _queue = MemoryInformQueue(
+                    getattr(settings, 'ACS_INFORM_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+                )
+        return _queue
+
+
+def submit(job):
+    """Queue a job for a known device.
+
+    Returns the device pk once queued, or None when the caller must write
+    the Inform synchronously: synchronous mode, a device seen for the first
+    time, or a queue that is full or unreachable.
+    """
+    from .models import DeviceInform
+
+    inform_queue = get_queue()
+    if inform_queue is None:
+        return None
+
+    identity = identities.get(job.key)
+    if identity is not None:
+        device_pk = identity.pk
+    else:
+        device_pk = DeviceInform.objects.filter(
+            oui=job.oui, serial_number=job.serial_number
+        ).values_list('id', flat=True).first()
+        if device_pk is None:
+            return None
+
+    try:
+        inform_queue.put(job)
+    except Exception as e:
+        logger.warning(f"Inform queue unavailable, writing synchronously: {e}")
+        return None
+    return device_pk
@@ -0,0 +1,101 @@
+"""
+Device Liveness
+Marks devices offline once they miss their periodic Inform deadline
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups, status
+from .identity import identities
+
+logger = logging.getLogger(__name__)
+
+INFORM_INTERVAL_PARAMETER = 'ManagementServer.PeriodicInformInterval'
+
+DEFAULT_INFORM_INTERVAL = 300
+DEFAULT_GRACE_FACTOR = 2.5
+DEFAULT_GRACE_SECONDS = 60
+UPDATE_CHUNK_SIZE = 500
+
+
+def find_inform_interval(parameters):
+    """Return the PeriodicInformInterval from an Inform ParameterList, or None"""
+    for name, value in parameters.items():
+        if name.endswith(INFORM_INTERVAL_PARAMETER):
+            try:
+                interval = int(value)
+            except (TypeError, ValueError):
+                return None
+            return interval if interval > 0 else None
+    return None
+
+
+class LivenessPolicy:
+    """How long a device may stay silent before it is considered offline"""
+
+    def __init__(self, default_interval=None, grace_factor=None, grace_seconds=None):
+        self.default_interval = default_interval or getattr(
+            settings, 'ACS_DEFAULT_INFORM_INTERVAL', DEFAULT_INFORM_INTERVAL)
+        self.grace_factor = grace_factor or getattr(
+            settings, 'ACS_OFFLINE_GRACE_FACTOR', DEFAULT_GRACE_FACTOR)
+        self.grace_seconds = grace_seconds if grace_seconds is not None else getattr(
+            settings, 'ACS_OFFLINE_GRACE_SECONDS', DEFAULT_GRACE_SECONDS)
+
+    def allowance(self, inform_interval):
+        """Silence allowed after last_inform for a device with this interval"""
+        interval = inform_interval or self.default_interval
+        return timedelta(seconds=interval * self.grace_factor + self.grace_seconds)
+
+
+def sweep(now=None, policy=None):
+    """Mark devices whose Inform deadline has passed as offline.
+
+    The ``(is_online, last_inform)`` index narrows the scan to online
+    devices silent for longer than the shortest possible allowance; each
+    candidate is then checked against its own interval. Linked ONUs are
+    flipped in the same transaction. Returns the pks of the devices flipped.
+    """
+    from core.models import ONU
+    from .models import DeviceInform, next_change_seq
+
+    now = now or timezone.now()
+    policy = policy or LivenessPolicy()
+
+    shortest = policy.allowance(1)
+    candidates = DeviceInform.objects.filter(
+        is_online=True, last_inform__lt=now - shortest
+    ).values_list('id', 'inform_interval', 'last_inform')
+
+    expired = [
+        pk for pk, interval, last_inform in candidates.iterator(chunk_size=2000)
+        if last_inform + policy.allowance(interval) < now
+    ]
+    if not expired:
+        return []
+
+    flipped = []
+    with transaction.atomic():
+        for start in range(0, len(expired), UPDATE_CHUNK_SIZE):
+            chunk = expired[start:start + UPDATE_CHUNK_SIZE]
+            # Skip devices that informed after the candidate read; the rows
+            # updated are then read back by the sequence they were given
+            seq = next_change_seq()
+            DeviceInform.objects.filter(
+                id__in=chunk, is_online=True, last_inform__lt=now - shortest,
+            ).update(is_online=False, change_seq=seq)
+            pks = list(DeviceInform.objects.filter(
+                id__in=chunk, is_online=False, change_seq=seq,
+            ).values_list('id', flat=True))
+            ONU.objects.filter(deviceinform__in=pks).update(online=False)
+            flipped += pks
+        rollups.online_changed(-len(flipped))
+        status.publish(flipped)
+    identities.invalidate_pks(flipped)
+
+    logger.info(f"Marked {len(flipped)} devices offline")
+    return flipped
@@ -0,0 +1,106 @@
+import json
+import logging
+import platform
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from acs import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the TR-069 hot path microbenchmarks on a throwaway test database and "
+        "compare them with a stored baseline; exits non-zero on a regression."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='BENCHMARK', help="Only run these benchmarks")
+        parser.add_argument('--rounds', type=int, default=5, help="Timed rounds per benchmark (default 5)")
+        parser.add_argument(
+            '--baseline', default=str(Path(settings.BASE_DIR) / 'benchmark_baseline.json'),
+            help="Baseline JSON file (default benchmark_baseline.json in the project)",
+        )
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Store this run as the baseline instead of comparing")
+        parser.add_argument('--time-tolerance', type=float, default=benchmarks.DEFAULT_TIME_TOLERANCE,
+                            help="Allowed slowdown as a fraction (default 0.25)")
+        parser.add_argument('--memory-tolerance', type=float, default=benchmarks.DEFAULT_MEMORY_TOLERANCE,
+                            help="Allowed allocation growth as a fraction (default 0.10)")
+        parser.add_argument('--no-time', action='store_true',
+                            help="Only compare queries and allocations (for baselines from another machine)")
+        parser.add_argument('--devices', type=int, default=500,
+                            help="Devices seeded for the dashboard benchmarks (default 500)")
+        parser.add_argument('--output', metavar='FILE', help="Also write this run's results to FILE")
+        parser.add_argument('--list', action='store_true', help="List the benchmarks and exit")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in benchmarks._benchmarks:
+                self.stdout.write(name)
+            return
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        logging.disable(logging.CRITICAL)
+        try:
+            benchmarks.populate(options['devices'])
+            results = benchmarks.run(options['names'] or None, rounds=options['rounds'])
+        except KeyError as e:
+            raise CommandError(e.args[0])
+        finally:
+            logging.disable(logging.NOTSET)
+            teardown_databases(old_config, verbosity=0)
+
+        report = {
+            'version': benchmarks.BASELINE_VERSION,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'results': results,
+        }
+        self.stdout.write(self.table(results))
+        if options['output']:
+            self.write(options['output'], report)
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            self.write(baseline_path, report)
+            return
+        if not baseline_path.exists():
+            self.stdout.write(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+            return
+
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = benchmarks.compare(
+            results, baseline,
+            time_tolerance=options['time_tolerance'],
+            memory_tolerance=options['memory_tolerance'],
+            check_time=not options['no_time'],
+        )
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f"{len(regressions)} regressions against {baseline_path}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path}"))
+
+    def write(self, path, report):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        self.stdout.write(f"Results written to {path}")
+
+    def table(self, results):
+        width = max(len(name) for name in results)
+        lines = [f"{'benchmark':<{width}}  {'median us':>11}  {'best us':>11}  {'peak alloc':>10}  {'queries':>7}"]
+        for name, result in results.items():
+            lines.append(
+                f"{name:<{width}}  {result['median_us']:>11.2f}  {result['best_us']:>11.2f}  "
+                f"{result['peak_alloc_bytes']:>10}  {result['queries']:>7}"
+            )
+        return '\n'.join(lines)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from acs.history import compact
+
+
+class Command(BaseCommand):
+    help = "Downsample old parameter history into hourly and daily buckets and expire the oldest"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', type=int, metavar='SECONDS',
+            help="Keep compacting every SECONDS instead of running once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            result = compact()
+            self.stdout.write(
+                f"Compacted {result['raw']} points and {result['hourly']} hourly buckets, "
+                f"expired {result['expired']} daily buckets in {time.monotonic() - started:.3f}s"
+            )
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['loop'])
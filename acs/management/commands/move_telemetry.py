@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from acs.models import (
+    BulkOperation, DeviceParameter, DeviceSession, DeviceTask, FirmwareImage,
+    ParameterHistory, ParameterHistoryBucket,
+)
+from acs.routers import TELEMETRY_DB, telemetry_enabled
+
+# Referenced rows first, so foreign keys always point at copied rows
+MODELS = (
+    FirmwareImage, BulkOperation, DeviceTask, DeviceParameter,
+    ParameterHistory, ParameterHistoryBucket, DeviceSession,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the ACS telemetry tables from the default database to the telemetry "
+        "database (acs.routers). Run it with the portal stopped; rows already "
+        "copied are skipped, so it can be rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows copied per transaction")
+        parser.add_argument(
+            '--delete-source', action='store_true',
+            help="Empty the tables in the default database once everything is copied",
+        )
+
+    def handle(self, *args, **options):
+        if not telemetry_enabled():
+            raise CommandError("No telemetry database configured (ACS_TELEMETRY_DATABASE_URL)")
+
+        for model in MODELS:
+            copied = self.copy(model, options['batch_size'])
+            self.stdout.write(f"{model._meta.db_table}: copied {copied} rows")
+
+        # Explicit primary keys were inserted; move the sequences past them
+        connection = connections[TELEMETRY_DB]
+        statements = connection.ops.sequence_reset_sql(no_style(), MODELS)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+        if options['delete_source']:
+            source = connections[DEFAULT_DB_ALIAS]
+            with transaction.atomic(using=DEFAULT_DB_ALIAS), source.cursor() as cursor:
+                for model in reversed(MODELS):
+                    cursor.execute(f"DELETE FROM {source.ops.quote_name(model._meta.db_table)}")
+            self.stdout.write("Emptied the telemetry tables of the default database")
+        self.stdout.write(self.style.SUCCESS("Telemetry moved"))
+
+    def copy(self, model, batch_size):
+        rows = model.objects.using(DEFAULT_DB_ALIAS).order_by('pk')
+        copied = 0
+        last_pk = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return copied
+            with transaction.atomic(using=TELEMETRY_DB):
+                model.objects.using(TELEMETRY_DB).bulk_create(batch, ignore_conflicts=True)
+            copied += len(batch)
+            last_pk = batch[-1].pk
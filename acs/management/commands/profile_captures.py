@@ -0,0 +1,84 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from acs.profiling import CaptureStore
+
+SECTIONS = ('summary', 'profile', 'queries', 'body')
+
+
+class Command(BaseCommand):
+    help = (
+        "List, dump or clear the TR-069 request captures written by the profiling "
+        "middleware (ACS_PROFILE_SAMPLE_RATE / ACS_PROFILE_SLOW_MS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', nargs='?', default='list', choices=('list', 'show', 'clear'))
+        parser.add_argument('capture_id', nargs='?', help="Capture to show ('latest' for the newest)")
+        parser.add_argument('--limit', type=int, default=50, help="Captures to list, newest first (default 50)")
+        parser.add_argument('--slowest', action='store_true', help="List the slowest captures first")
+        parser.add_argument('--section', action='append', choices=SECTIONS,
+                            help="Parts of a capture to show (repeatable; default all)")
+        parser.add_argument('--json', action='store_true', help="Dump the raw capture as JSON")
+
+    def handle(self, *args, **options):
+        store = CaptureStore()
+        if options['action'] == 'clear':
+            self.stdout.write(f"Deleted {store.clear()} captures from {store.directory}")
+        elif options['action'] == 'show':
+            self.show(store, options)
+        else:
+            self.list(store, options)
+
+    def list(self, store, options):
+        captures = list(store.all())
+        if options['slowest']:
+            captures.sort(key=lambda capture: capture['duration_ms'], reverse=True)
+        else:
+            captures.reverse()
+        if not captures:
+            self.stdout.write(f"No captures in {store.directory}")
+            return
+        self.stdout.write(f"{'id':<30} {'started':<20} {'ms':>9} {'status':>6} {'queries':>7} {'query ms':>9}  reason")
+        for capture in captures[:options['limit']]:
+            self.stdout.write(
+                f"{capture['id']:<30} {capture['started_at'][:19]:<20} {capture['duration_ms']:>9.1f} "
+                f"{capture['status']:>6} {capture['query_count']:>7} {capture['query_ms']:>9.1f}  {capture['reason']}"
+            )
+
+    def show(self, store, options):
+        capture_id = options['capture_id']
+        if not capture_id:
+            raise CommandError("show needs a capture id (or 'latest')")
+        if capture_id == 'latest':
+            ids = store.ids()
+            capture_id = ids[-1] if ids else None
+        capture = store.get(capture_id) if capture_id else None
+        if capture is None:
+            raise CommandError(f"No capture {options['capture_id']}")
+        if options['json']:
+            self.stdout.write(json.dumps(capture, indent=2))
+            return
+
+        sections = options['section'] or SECTIONS
+        if 'summary' in sections:
+            self.stdout.write(
+                f"{capture['id']}: {capture['method']} {capture['path']} -> {capture['status']} in "
+                f"{capture['duration_ms']} ms ({capture['reason']}), {capture['query_count']} queries "
+                f"taking {capture['query_ms']} ms"
+            )
+        if 'profile' in sections:
+            self.stdout.write(f"\n== Profile ({capture['engine']}) ==")
+            self.stdout.write(capture['profile'] or "(not sampled; only slow-request data was captured)")
+        if 'queries' in sections:
+            self.stdout.write("\n== Queries ==")
+            for statement in capture['queries']:
+                many = ' (executemany)' if statement['many'] else ''
+                db = f" [{statement['db']}]" if statement.get('db') else ''
+                self.stdout.write(f"{statement['ms']:>9.3f} ms{db}{many}  {statement['sql']}")
+            if capture['query_count'] > len(capture['queries']):
+                self.stdout.write(f"... {capture['query_count'] - len(capture['queries'])} more not recorded")
+        if 'body' in sections:
+            self.stdout.write(f"\n== SOAP body ({capture['body_bytes']} bytes, anonymized) ==")
+            self.stdout.write(capture['body'])
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+
+from acs.models import DeviceParameter
+from acs.paths import parent_path
+
+
+class Command(BaseCommand):
+    help = "Fill in DeviceParameter.parent_path for rows stored before the path index existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Recompute every row instead of only rows without a parent path",
+        )
+
+    def handle(self, *args, **options):
+        rows = DeviceParameter.objects.order_by('id').only('id', 'parameter_name', 'parent_path')
+        if not options['all']:
+            rows = rows.filter(parent_path='', parameter_name__contains='.')
+
+        # Walk by primary key so no cursor stays open across the writes
+        updated = 0
+        last_id = 0
+        while True:
+            chunk = list(rows.filter(id__gt=last_id)[:DeviceParameter.WRITE_BATCH_SIZE])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            batch = []
+            for parameter in chunk:
+                path = parent_path(parameter.parameter_name)
+                if path != parameter.parent_path:
+                    parameter.parent_path = path
+                    batch.append(parameter)
+            if batch:
+                updated += self.write(batch)
+        self.stdout.write(self.style.SUCCESS(f"Updated the parent path of {updated} parameters"))
+
+    def write(self, batch):
+        with transaction.atomic(using=router.db_for_write(DeviceParameter)):
+            DeviceParameter.objects.bulk_update(batch, ['parent_path'])
+        return len(batch)
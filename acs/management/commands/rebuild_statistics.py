@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from acs import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the ACS dashboard counters and daily discovery buckets from scratch"
+
+    def handle(self, *args, **options):
+        counters, buckets = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {counters} device counters and {buckets} daily discovery buckets"
+        ))
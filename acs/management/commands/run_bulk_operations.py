@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from acs.rollout import advance_all
+
+
+class Command(BaseCommand):
+    help = "Release the next wave of tasks for running bulk operations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', type=int, metavar='SECONDS',
+            help="Keep releasing every SECONDS instead of running once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = advance_all()
+            if released:
+                self.stdout.write(
+                    f"Released {sum(released.values())} tasks for {len(released)} running operations"
+                )
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['loop'])
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from acs import ingest
+
+
+class Command(BaseCommand):
+    help = "Write queued Informs to the database in batches (ACS_INFORM_INGEST_MODE=redis)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Maximum Informs per transaction")
+        parser.add_argument('--batch-wait', type=float, help="Seconds to wait for a batch to fill")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Drain the queue once and exit instead of running forever",
+        )
+
+    def handle(self, *args, **options):
+        if ingest.ingest_mode() != ingest.MODE_REDIS:
+            raise CommandError(
+                "The consumer command needs ACS_INFORM_INGEST_MODE=redis; "
+                "the memory queue is drained inside each worker."
+            )
+
+        consumer = ingest.InformConsumer(
+            ingest.get_queue(),
+            batch_size=options['batch_size'],
+            batch_wait=options['batch_wait'],
+        )
+        if options['once']:
+            total = 0
+            while True:
+                written = consumer.run_once()
+                if not written:
+                    break
+                total += written
+            self.stdout.write(self.style.SUCCESS(f"Wrote {total} queued Informs"))
+            return
+
+        self.stdout.write(f"Consuming Informs from {ingest.REDIS_QUEUE_KEY}")
+        try:
+            consumer.run_forever()
+        except KeyboardInterrupt:
+            consumer.drain()
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from acs.connreq import ConnectionRequestDispatcher
+from acs.models import DeviceInform, DeviceTask
+from acs.routers import in_lookup
+
+
+class Command(BaseCommand):
+    help = "Send TR-069 connection requests so CPEs open a session immediately"
+
+    def add_arguments(self, parser):
+        parser.add_argument('device_ids', nargs='*', type=int, help="DeviceInform ids to wake")
+        parser.add_argument(
+            '--pending', action='store_true',
+            help="Wake every device that has pending tasks",
+        )
+        parser.add_argument('--concurrency', type=int, help="Maximum requests in flight")
+        parser.add_argument('--subnet-concurrency', type=int, help="Maximum requests per subnet")
+        parser.add_argument('--attempts', type=int, help="Attempts per device")
+
+    def handle(self, *args, **options):
+        devices = DeviceInform.objects.exclude(connection_request_url='')
+        if options['pending']:
+            pending = DeviceTask.objects.filter(status='pending').order_by().distinct()
+            devices = devices.filter(pk__in=in_lookup(pending, 'device_inform_id', DeviceInform))
+        elif options['device_ids']:
+            devices = devices.filter(pk__in=options['device_ids'])
+        else:
+            raise CommandError("Give device ids or --pending")
+
+        dispatcher = ConnectionRequestDispatcher(
+            concurrency=options['concurrency'],
+            subnet_concurrency=options['subnet_concurrency'],
+            attempts=options['attempts'],
+        )
+        results = dispatcher.dispatch_devices(devices.only('id', 'connection_request_url'))
+
+        failed = [result for result in results if not result.ok]
+        for result in failed:
+            self.stderr.write(f"{result.device_pk} {result.url}: {result.error or result.status}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(results) - len(failed)} of {len(results)} connection requests accepted"
+        ))
@@ -0,0 +1,135 @@
+import json
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+from acs import simulator
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class QueryCounter:
+    """Counts SQL statements run on every connection opened while installed"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the TR-069 endpoint with simulated Huawei/ZTE CPEs running full CWMP "
+        "sessions. Without --url an in-process server is started on this project's "
+        "database, so simulated devices are written to it (see --cleanup)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="ACS endpoint to test instead of an in-process server")
+        parser.add_argument('--devices', type=int, default=100, help="Virtual CPEs (default 100)")
+        parser.add_argument('--rounds', type=int, default=1,
+                            help="Sessions per CPE; the first is a BOOT Inform (default 1)")
+        parser.add_argument('--concurrency', type=int, default=20, help="Concurrent sessions (default 20)")
+        parser.add_argument('--parameters', type=int, default=100,
+                            help="Parameters per Inform ParameterList (default 100)")
+        parser.add_argument('--vendors', default='huawei,zte',
+                            help="Comma-separated vendor profiles, assigned round-robin")
+        parser.add_argument('--serial-prefix', default='SIM', help="Serial number prefix of simulated CPEs")
+        parser.add_argument('--timeout', type=float, default=30, help="HTTP timeout in seconds")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for generated parameter values")
+        parser.add_argument('--output', metavar='FILE', help="Write the JSON report to FILE")
+        parser.add_argument('--cleanup', action='store_true',
+                            help="Delete the simulated devices and their ONUs afterwards (in-process only)")
+
+    def handle(self, *args, **options):
+        vendors = [vendor.strip() for vendor in options['vendors'].split(',') if vendor.strip()]
+        unknown = set(vendors) - set(simulator.PROFILES)
+        if unknown or not vendors:
+            raise CommandError(f"Unknown vendor profiles: {', '.join(sorted(unknown)) or '(none)'}")
+
+        settings = dict(
+            devices=options['devices'], rounds=options['rounds'], concurrency=options['concurrency'],
+            parameter_count=options['parameters'], vendors=vendors,
+            serial_prefix=options['serial_prefix'], timeout=options['timeout'], seed=options['seed'],
+        )
+        if options['url']:
+            report = simulator.run(options['url'], **settings)
+            report['queries'] = None
+        else:
+            report = self.run_local(settings)
+            if options['cleanup']:
+                self.cleanup(options['serial_prefix'])
+
+        self.stdout.write(self.summary(report))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def run_local(self, settings):
+        """Run against an in-process threaded server, counting the queries it makes"""
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+        server.set_app(get_internal_wsgi_application())
+        thread = threading.Thread(target=server.serve_forever, name='acs-simulator-server', daemon=True)
+        counter = QueryCounter()
+        connection_created.connect(counter.install)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}{reverse('acs:tr069_endpoint')}"
+            report = simulator.run(url, **settings)
+        finally:
+            server.shutdown()
+            server.server_close()
+            connection_created.disconnect(counter.install)
+        sessions = report['sessions']
+        report['queries'] = {
+            'total': counter.count,
+            'per_session': round(counter.count / sessions, 2) if sessions else None,
+            'per_request': round(counter.count / report['requests'], 2) if report['requests'] else None,
+        }
+        return report
+
+    def cleanup(self, serial_prefix):
+        from core.models import ONU
+        from acs.models import DeviceInform
+
+        onus = ONU.objects.filter(serial_number__startswith=serial_prefix).delete()[1]
+        devices = DeviceInform.objects.filter(serial_number__startswith=serial_prefix).delete()[1]
+        deleted = onus.get('acs.DeviceInform', 0) + devices.get('acs.DeviceInform', 0)
+        self.stdout.write(f"Deleted {deleted} simulated devices and {onus.get('core.ONU', 0)} ONUs")
+
+    def summary(self, report):
+        lines = [
+            f"{report['sessions']} sessions ({report['requests']} requests) in "
+            f"{report['duration_seconds']}s, {report['errors']} errors",
+            f"Throughput: {report['informs_per_second']} Informs/s, "
+            f"{report['requests_per_second']} requests/s",
+        ]
+        for label, key in (('Inform latency', 'inform_latency_ms'), ('Session latency', 'session_latency_ms')):
+            stats = report[key]
+            if stats:
+                lines.append(
+                    f"{label}: p50 {stats['p50']}ms  p95 {stats['p95']}ms  "
+                    f"p99 {stats['p99']}ms  max {stats['max']}ms"
+                )
+        if report['queries']:
+            lines.append(
+                f"Queries: {report['queries']['total']} "
+                f"({report['queries']['per_session']} per session)"
+            )
+        for error, count in report['error_kinds'].items():
+            lines.append(f"  {count} x {error}")
+        return '\n'.join(lines)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from acs import sessions, status
+from acs.liveness import sweep
+
+
+class Command(BaseCommand):
+    help = "Mark devices offline once they miss their periodic Inform deadline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', type=int, metavar='SECONDS',
+            help="Keep sweeping every SECONDS instead of running once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            expired = sweep()
+            # Push before sleeping (or exiting) rather than on the timer
+            status.flush()
+            purged = sessions.get_store().purge()
+            self.stdout.write(
+                f"Marked {len(expired)} devices offline and purged {purged} expired CWMP sessions "
+                f"in {time.monotonic() - started:.3f}s"
+            )
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['loop'])
@@ -0,0 +1,115 @@
+"""
+ACS Metrics
+Prometheus instrumentation of the TR-069 endpoint.
+
+Records per-stage latency histograms (parse, device lookup, parameter
+write, response build and the whole request), Informs by EventCode and
+vendor, task dispatch outcomes and the queries each request makes. With
+PROMETHEUS_MULTIPROC_DIR set, every gunicorn worker writes its samples to
+mmap'd files in that directory and ``render()`` merges them, so a scrape
+sees the whole server rather than the worker that happened to answer it.
+"""
+
+import os
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+from .optical import vendor_key
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Event codes defined by TR-069; vendor "X <OUI> ..." events are counted as 'X'
+EVENT_CODES = frozenset((
+    '0 BOOTSTRAP', '1 BOOT', '2 PERIODIC', '3 SCHEDULED', '4 VALUE CHANGE', '5 KICKED',
+    '6 CONNECTION REQUEST', '7 TRANSFER COMPLETE', '8 DIAGNOSTICS COMPLETE', '9 REQUEST DOWNLOAD',
+    '10 AUTONOMOUS TRANSFER COMPLETE', '11 DU STATE CHANGE COMPLETE',
+    '12 AUTONOMOUS DU STATE CHANGE COMPLETE', '13 WAKEUP', '14 HEARTBEAT',
+    'M Reboot', 'M ScheduleInform', 'M Download', 'M ScheduleDownload', 'M Upload', 'M ChangeDUState',
+))
+
+STAGE_SECONDS = Histogram(
+    'acs_stage_duration_seconds', "Time spent in each stage of a TR-069 request", ['stage'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter(
+    'acs_requests', "TR-069 requests by CWMP message and HTTP status", ['message', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'acs_request_queries', "Database queries made by one TR-069 request",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 500),
+)
+INFORMS = Counter(
+    'acs_informs', "Informs received, once per EventCode they carry", ['event', 'vendor'],
+)
+TASK_DISPATCH = Counter(
+    'acs_task_dispatch', "Device task dispatch outcomes", ['task_type', 'outcome'],
+)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage ``name``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+class RequestMetrics:
+    """Context manager around one TR-069 request.
+
+    Counts the queries run on this thread's connections and, on exit, records
+    the total time, the query count and the request under ``message`` and
+    ``status``, which the view fills in as it learns them.
+    """
+
+    def __init__(self):
+        self.message = 'invalid'
+        self.status = 500
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._wrappers = ExitStack()
+        for connection in connections.all():
+            self._wrappers.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrappers.__exit__(*exc_info)
+        STAGE_SECONDS.labels('total').observe(time.perf_counter() - self.started)
+        REQUEST_QUERIES.observe(self.queries)
+        REQUESTS.labels(self.message, str(self.status)).inc()
+
+
+def inform_received(message):
+    vendor = vendor_key(message.device_info.get('Manufacturer')) or 'other'
+    for event in message.events or ():
+        code = event.code
+        if code not in EVENT_CODES:
+            code = 'X' if code.startswith('X ') else 'other'
+        INFORMS.labels(code, vendor).inc()
+
+
+def task_dispatched(task_type, outcome):
+    TASK_DISPATCH.labels(task_type, outcome).inc()
+
+
+def render():
+    """The metrics exposition; merged across processes in multiprocess mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
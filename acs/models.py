@@ -1,17 +1,35 @@
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.utils import timezone
 from core.models import ONU, CustomerInfo
+from . import history, paths
+from .routers import atomic_write
 import json
+import threading
+import time
+
+
+_change_seq_lock = threading.Lock()
+_last_change_seq = 0
+
+
+def next_change_seq():
+    """Monotonic (per process) microsecond sequence for device status changes"""
+    global _last_change_seq
+    with _change_seq_lock:
+        _last_change_seq = max(time.time_ns() // 1000, _last_change_seq + 1)
+        return _last_change_seq
 
 
 class DeviceSession(models.Model):
-    """Track TR-069 sessions with devices"""
+    """Track TR-069 sessions with devices (the ``db`` CWMP session store)"""
     session_id = models.CharField(max_length=128, unique=True)
-    device_id = models.CharField(max_length=256)  # Device OUI-Serial
-    ip_address = models.GenericIPAddressField()
+    device_id = models.CharField(max_length=256, blank=True)  # Device OUI-Serial
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
+    state = models.CharField(max_length=255, blank=True)  # Encoded by acs.tr069.CwmpSession
     created_at = models.DateTimeField(auto_now_add=True)
     last_activity = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     is_active = models.BooleanField(default=True)
     
     class Meta:
@@ -41,6 +59,10 @@ class DeviceInform(models.Model):
     is_online = models.BooleanField(default=True)
     last_inform = models.DateTimeField(auto_now=True)
     first_contact = models.DateTimeField(auto_now_add=True)
+    # PeriodicInformInterval reported by the device, in seconds (0 = unknown)
+    inform_interval = models.PositiveIntegerField(default=0)
+    # Bumped whenever is_online or last_inform changes; drives status deltas
+    change_seq = models.BigIntegerField(default=next_change_seq)
     
     # Auto-discovered device (not manually added)
     auto_discovered = models.BooleanField(default=True)
@@ -49,10 +71,25 @@ class DeviceInform(models.Model):
     class Meta:
         db_table = 'acs_device_inform'
         unique_together = ['oui', 'serial_number']
+        indexes = [
+            # Offline sweeps range-scan online devices by last contact
+            models.Index(fields=['is_online', 'last_inform'], name='acs_device_online_idx'),
+            models.Index(fields=['change_seq', 'id'], name='acs_device_change_idx'),
+            # Device lists page newest-first by (last_inform, id)
+            models.Index(fields=['last_inform', 'id'], name='acs_device_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.device_id} ({self.manufacturer} {self.model_name})"
     
+    def save(self, *args, **kwargs):
+        # last_inform is auto_now, so every save is a status change
+        self.change_seq = next_change_seq()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'change_seq' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['change_seq']
+        super().save(*args, **kwargs)
+    
     def create_onu_record(self):
         """Automatically create ONU record from discovered device"""
         if not self.onu:
@@ -77,25 +114,162 @@ class DeviceInform(models.Model):
                 last_inform=self.last_inform
             )
             self.onu = onu
-            self.save()
+            self.save(update_fields=['onu'])
             return onu
         return self.onu
 
 
 class DeviceParameter(models.Model):
     """Store device parameters from TR-069"""
-    device_inform = models.ForeignKey(DeviceInform, on_delete=models.CASCADE, related_name='parameters')
+    # May be in another database (acs.routers): no constraint, deleted by acs.signals
+    device_inform = models.ForeignKey(
+        DeviceInform, on_delete=models.DO_NOTHING, db_constraint=False, related_name='parameters'
+    )
     parameter_name = models.CharField(max_length=512)
+    # Object path holding the parameter (name up to its last '.'), for tree browsing
+    parent_path = models.CharField(max_length=512, blank=True, default='')
     parameter_value = models.TextField()
     value_type = models.CharField(max_length=20, default='string')  # string, int, boolean
     last_updated = models.DateTimeField(auto_now=True)
     
+    # Rows per INSERT/UPDATE statement when writing a whole ParameterList
+    WRITE_BATCH_SIZE = 500
+    
     class Meta:
         db_table = 'acs_device_parameter'
+        # Also serves subtree queries as a range scan on parameter_name
         unique_together = ['device_inform', 'parameter_name']
+        indexes = [
+            models.Index(
+                fields=['device_inform', 'parent_path', 'parameter_name'],
+                name='acs_param_parent_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.device_inform.device_id}: {self.parameter_name}"
+    
+    def save(self, *args, **kwargs):
+        self.parent_path = paths.parent_path(self.parameter_name)
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def subtree(cls, device_pk, pattern):
+        """A device's parameters under a partial path, ``*`` matching one segment"""
+        return cls.objects.filter(paths.path_q(pattern), device_inform_id=device_pk)
+    
+    @classmethod
+    def tree_level(cls, device_pk, path=''):
+        """One level of a device's parameter tree.
+        
+        Returns ``(child object paths, parameters directly under path)``.
+        Both come from the (device, parent_path) index; only the distinct
+        object paths below ``path`` are read, never the rows under them.
+        """
+        parameters = cls.objects.filter(device_inform_id=device_pk)
+        below = parameters.filter(parent_path__gt=path)
+        if path:
+            below = below.filter(paths.path_q(path, 'parent_path'))
+        objects = paths.child_objects(
+            path, below.order_by().values_list('parent_path', flat=True).distinct()
+        )
+        leaves = sorted(
+            parameters.filter(parent_path=path),
+            key=lambda parameter: paths.path_sort_key(parameter.parameter_name),
+        )
+        return objects, leaves
+    
+    @classmethod
+    def upsert_for_device(cls, device_inform, values):
+        """Store a device's parameters with one read and batched writes.
+        
+        ``values`` maps parameter name to a ``(value, value_type)`` pair.
+        Rows whose value and type are unchanged are not written. Returns
+        the names that were created or updated.
+        """
+        return cls.upsert_many({device_inform.pk: values}).get(device_inform.pk, [])
+    
+    @classmethod
+    def upsert_many(cls, values_by_device):
+        """Store parameters for several devices in one transaction.
+        
+        ``values_by_device`` maps a DeviceInform pk to the ``values`` mapping
+        taken by upsert_for_device(). Returns ``{device pk: changed names}``.
+        """
+        values_by_device = {pk: values for pk, values in values_by_device.items() if values}
+        if not values_by_device:
+            return {}
+        
+        existing = {}
+        for pk, device_pk, name, value, value_type in cls.objects.filter(
+            device_inform_id__in=list(values_by_device)
+        ).values_list('id', 'device_inform_id', 'parameter_name', 'parameter_value', 'value_type'):
+            existing[device_pk, name] = (pk, value, value_type)
+        
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        changed = {}
+        history_changes = []
+        for device_pk, values in values_by_device.items():
+            device_changed = changed.setdefault(device_pk, [])
+            for name, (value, value_type) in values.items():
+                value = '' if value is None else value
+                current = existing.get((device_pk, name))
+                if current is None:
+                    to_create.append(cls(
+                        device_inform_id=device_pk,
+                        parameter_name=name,
+                        parent_path=paths.parent_path(name),
+                        parameter_value=value,
+                        value_type=value_type,
+                        last_updated=now,
+                    ))
+                    device_changed.append(name)
+                    history_changes.append((device_pk, None, name, value))
+                elif current[1] != value or current[2] != value_type:
+                    to_update.append(cls(
+                        id=current[0],
+                        parameter_value=value,
+                        value_type=value_type,
+                        last_updated=now,
+                    ))
+                    device_changed.append(name)
+                    history_changes.append((device_pk, current[0], name, value))
+        
+        if not to_create and not to_update:
+            # Nothing changed: don't open a write transaction just to commit it
+            return changed
+        with atomic_write(router.db_for_write(cls)):
+            if to_create:
+                # A concurrent Inform from the same device may insert the same
+                # names between our read and this write; let the database merge.
+                cls.objects.bulk_create(
+                    to_create, batch_size=cls.WRITE_BATCH_SIZE, **cls._conflict_options()
+                )
+            if to_update:
+                cls.objects.bulk_update(
+                    to_update,
+                    ['parameter_value', 'value_type', 'last_updated'],
+                    batch_size=cls.WRITE_BATCH_SIZE,
+                )
+            history.record(history_changes, now)
+        
+        return changed
+    
+    @staticmethod
+    def _conflict_options():
+        """bulk_create() arguments for an upsert on the current backend"""
+        features = connections[router.db_for_write(DeviceParameter)].features
+        if not features.supports_update_conflicts:
+            return {}
+        options = {
+            'update_conflicts': True,
+            'update_fields': ['parameter_value', 'value_type', 'last_updated'],
+        }
+        if features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['device_inform', 'parameter_name']
+        return options
 
 
 class DeviceTask(models.Model):
@@ -109,13 +283,25 @@ class DeviceTask(models.Model):
     ]
     
     STATUS_CHOICES = [
+        ('held', 'Held'),  # Part of a bulk operation, not yet released
         ('pending', 'Pending'),
         ('sent', 'Sent'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
     ]
     
-    device_inform = models.ForeignKey(DeviceInform, on_delete=models.CASCADE, related_name='tasks')
+    # May be in another database (acs.routers): no constraint, deleted by acs.signals
+    device_inform = models.ForeignKey(
+        DeviceInform, on_delete=models.DO_NOTHING, db_constraint=False, related_name='tasks'
+    )
+    bulk_operation = models.ForeignKey(
+        'BulkOperation', on_delete=models.CASCADE, null=True, blank=True, related_name='tasks'
+    )
+    # Image delivered by a Download task
+    firmware_image = models.ForeignKey(
+        'FirmwareImage', on_delete=models.PROTECT, null=True, blank=True, related_name='tasks'
+    )
     task_type = models.CharField(max_length=20, choices=TASK_TYPES)
     parameters = models.JSONField(default=dict)  # Task parameters
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
@@ -128,11 +314,102 @@ class DeviceTask(models.Model):
     class Meta:
         db_table = 'acs_device_task'
         ordering = ['-created_at']
+        indexes = [
+            # Rollouts release and count their tasks by status
+            models.Index(fields=['bulk_operation', 'status', 'id'], name='acs_task_bulk_idx'),
+            # Downloads in progress are counted per image
+            models.Index(fields=['firmware_image', 'status', 'sent_at'], name='acs_task_firmware_idx'),
+        ]
     
     def __str__(self):
         return f"{self.device_inform.device_id}: {self.task_type} ({self.status})"
 
 
+class FirmwareImage(models.Model):
+    """A firmware file stored under its SHA-256 and served to CPEs by Download tasks"""
+    FILE_TYPES = [
+        ('1 Firmware Upgrade Image', 'Firmware Upgrade Image'),
+        ('2 Web Content', 'Web Content'),
+        ('3 Vendor Configuration File', 'Vendor Configuration File'),
+    ]
+    
+    name = models.CharField(max_length=255)
+    version = models.CharField(max_length=64, blank=True)
+    manufacturer = models.CharField(max_length=64, blank=True)
+    product_class = models.CharField(max_length=64, blank=True)
+    file_type = models.CharField(max_length=64, choices=FILE_TYPES, default='1 Firmware Upgrade Image')
+    
+    # Content-addressed storage: the file lives at <ACS_FIRMWARE_ROOT>/<sha256[:2]>/<sha256>
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    filename = models.CharField(max_length=128, help_text="Name the CPE sees in the download URL")
+    
+    max_concurrent_downloads = models.PositiveIntegerField(
+        default=50, help_text="Download tasks for this image sent at once (0 = unlimited)"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'acs_firmware_image'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.name} {self.version}".strip()
+    
+    @property
+    def storage_name(self):
+        """Path of the file relative to ACS_FIRMWARE_ROOT"""
+        return f"{self.sha256[:2]}/{self.sha256}"
+
+
+class BulkOperation(models.Model):
+    """One task for every device matching a filter, released in waves"""
+    STATUS_CHOICES = [
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('paused', 'Paused'),
+        ('completed', 'Completed'),
+        ('aborted', 'Aborted'),
+    ]
+    
+    name = models.CharField(max_length=255)
+    task_type = models.CharField(max_length=20, choices=DeviceTask.TASK_TYPES)
+    parameters = models.JSONField(default=dict, blank=True)  # Task parameters for every device
+    # Device filter: manufacturer, model_name, product_class, software_version
+    # and an optional parameter predicate {"name", "op", "value"}
+    filters = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
+    
+    # Rollout limits
+    wave_size = models.PositiveIntegerField(default=100, help_text="Tasks released per wave")
+    max_in_flight = models.PositiveIntegerField(
+        default=500, help_text="Released tasks allowed to be pending or sent at once"
+    )
+    wave_interval = models.PositiveIntegerField(default=60, help_text="Seconds between waves")
+    min_success_rate = models.FloatField(
+        default=0.9, help_text="Pause when the share of finished tasks that succeeded drops below this"
+    )
+    task_timeout = models.PositiveIntegerField(
+        default=3600, help_text="Seconds a released task may stay unfinished before it is failed"
+    )
+    
+    total_tasks = models.PositiveIntegerField(default=0)
+    status_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # The success-rate gate counts tasks finished since the last start or resume
+    resumed_at = models.DateTimeField(null=True, blank=True)
+    last_wave_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'acs_bulk_operation'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.name}: {self.task_type} x{self.total_tasks} ({self.status})"
+
+
 class ACSConfig(models.Model):
     """ACS Configuration settings"""
     key = models.CharField(max_length=100, unique=True)
@@ -163,4 +440,91 @@ class ACSConfig(models.Model):
             obj.value = value
             obj.description = description
             obj.save()
-        return obj 
\ No newline at end of file
+        return obj
+
+
+class DeviceCounter(models.Model):
+    """Live device counts maintained incrementally for the dashboards"""
+    KIND_CHOICES = [
+        ('total', 'Total devices'),
+        ('online', 'Online devices'),
+        ('auto_discovered', 'Auto-discovered devices'),
+        ('vendor', 'Devices per manufacturer'),
+        ('firmware', 'Devices per software version'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    key = models.CharField(max_length=64, blank=True)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'acs_device_counter'
+        unique_together = ['kind', 'key']
+    
+    def __str__(self):
+        return f"{self.kind}[{self.key}]: {self.count}"
+
+
+class DailyDiscovery(models.Model):
+    """Number of devices first seen on each day"""
+    date = models.DateField(unique=True)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'acs_daily_discovery'
+        ordering = ['date']
+    
+    def __str__(self):
+        return f"{self.date}: {self.count}"
+
+
+class ParameterHistory(models.Model):
+    """A parameter value as it was at one point in time, written only on change"""
+    device_inform = models.ForeignKey(
+        DeviceInform, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    parameter = models.ForeignKey(DeviceParameter, on_delete=models.CASCADE, related_name='history')
+    recorded_at = models.DateTimeField()
+    value = models.TextField()
+    
+    class Meta:
+        db_table = 'acs_parameter_history'
+        indexes = [
+            models.Index(fields=['device_inform', 'recorded_at'], name='acs_history_device_idx'),
+            models.Index(fields=['parameter', 'recorded_at'], name='acs_history_param_idx'),
+            # Compaction walks old rows by time
+            models.Index(fields=['recorded_at'], name='acs_history_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.parameter_id} @ {self.recorded_at}: {self.value}"
+
+
+class ParameterHistoryBucket(models.Model):
+    """Downsampled history: min/max/avg of a parameter over an hour or a day"""
+    device_inform = models.ForeignKey(
+        DeviceInform, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    parameter = models.ForeignKey(DeviceParameter, on_delete=models.CASCADE, related_name='history_buckets')
+    bucket_start = models.DateTimeField()
+    bucket_seconds = models.PositiveIntegerField()
+    samples = models.PositiveIntegerField()
+    # Numeric summaries are null for non-numeric parameters
+    min_value = models.FloatField(null=True)
+    max_value = models.FloatField(null=True)
+    avg_value = models.FloatField(null=True)
+    last_value = models.TextField()
+    
+    class Meta:
+        db_table = 'acs_parameter_history_bucket'
+        unique_together = ['parameter', 'bucket_seconds', 'bucket_start']
+        indexes = [
+            models.Index(
+                fields=['device_inform', 'bucket_seconds', 'bucket_start'],
+                name='acs_bucket_device_idx',
+            ),
+            models.Index(fields=['bucket_seconds', 'bucket_start'], name='acs_bucket_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.parameter_id} @ {self.bucket_start} ({self.bucket_seconds}s)"
@@ -0,0 +1,107 @@
+"""
+Optical Power Extraction
+Reads ONU receive/transmit optical power (dBm) from Inform parameters.
+
+Vendors publish optical levels under their own paths and units. The paths
+for a (manufacturer, product class) pair are resolved once into a dict of
+``path -> (ONU field, converter)``, so an Inform costs one dictionary
+lookup per known path.
+"""
+
+import math
+from decimal import Decimal
+from functools import lru_cache
+
+# Plausible range for a PON optic; matches the ONU.rx_power/tx_power validators
+MIN_DBM = Decimal('-40')
+MAX_DBM = Decimal('10')
+TWO_PLACES = Decimal('0.01')
+
+
+def dbm(value):
+    """Value already in dBm"""
+    return float(value)
+
+
+def milli_dbm(value):
+    """TR-181 Optical.Interface levels, in thousandths of a dBm"""
+    return float(value) / 1000
+
+
+def dbm_or_tenth_microwatt(value):
+    """ZTE firmwares report either dBm or raw power in units of 0.1 uW"""
+    number = float(value)
+    if number > float(MAX_DBM):
+        return 10 * math.log10(number / 10000)
+    return number
+
+
+# TR-181 data model, used by any vendor that implements it
+STANDARD_PATHS = {
+    'Device.Optical.Interface.1.OpticalSignalLevel': ('rx_power', milli_dbm),
+    'Device.Optical.Interface.1.TransmitOpticalLevel': ('tx_power', milli_dbm),
+}
+
+VENDOR_PATHS = {
+    'huawei': {
+        'InternetGatewayDevice.WANDevice.1.X_GponInterafceConfig.RXPower': ('rx_power', dbm),
+        'InternetGatewayDevice.WANDevice.1.X_GponInterafceConfig.TXPower': ('tx_power', dbm),
+        'InternetGatewayDevice.WANDevice.1.X_HW_GponInterfaceConfig.RXPower': ('rx_power', dbm),
+        'InternetGatewayDevice.WANDevice.1.X_HW_GponInterfaceConfig.TXPower': ('tx_power', dbm),
+        'InternetGatewayDevice.WANDevice.1.X_EponInterfaceConfig.RXPower': ('rx_power', dbm),
+        'InternetGatewayDevice.WANDevice.1.X_EponInterfaceConfig.TXPower': ('tx_power', dbm),
+    },
+    'zte': {
+        'InternetGatewayDevice.WANDevice.1.X_ZTE-COM_WANPONInterfaceConfig.RXPower':
+            ('rx_power', dbm_or_tenth_microwatt),
+        'InternetGatewayDevice.WANDevice.1.X_ZTE-COM_WANPONInterfaceConfig.TXPower':
+            ('tx_power', dbm_or_tenth_microwatt),
+        'InternetGatewayDevice.WANDevice.1.X_ZTE-COM_GponInterfaceConfig.RxPower':
+            ('rx_power', dbm_or_tenth_microwatt),
+        'InternetGatewayDevice.WANDevice.1.X_ZTE-COM_GponInterfaceConfig.TxPower':
+            ('tx_power', dbm_or_tenth_microwatt),
+    },
+}
+
+# Per-model exceptions, keyed by (vendor, ProductClass); merged over VENDOR_PATHS
+MODEL_PATHS = {}
+
+
+def vendor_key(manufacturer):
+    """'huawei', 'zte' or '' for a DeviceId Manufacturer string"""
+    manufacturer = (manufacturer or '').lower()
+    for vendor in VENDOR_PATHS:
+        if vendor in manufacturer:
+            return vendor
+    return ''
+
+
+@lru_cache(maxsize=256)
+def paths_for(manufacturer, product_class):
+    """Optical parameter paths for a device model, resolved once per model"""
+    vendor = vendor_key(manufacturer)
+    paths = dict(STANDARD_PATHS)
+    paths.update(VENDOR_PATHS.get(vendor, {}))
+    paths.update(MODEL_PATHS.get((vendor, product_class), {}))
+    return paths
+
+
+def extract(device_info, parameters):
+    """``{'rx_power': Decimal, 'tx_power': Decimal}`` for the levels this Inform carries.
+
+    Unparseable readings and readings outside the plausible optical range
+    (a dark or unplugged fibre reports values like -inf or 0 uW) are skipped.
+    """
+    readings = {}
+    paths = paths_for(device_info.get('Manufacturer', ''), device_info.get('ProductClass', ''))
+    for path, (field, convert) in paths.items():
+        value = parameters.get(path)
+        if value is None or value == '':
+            continue
+        try:
+            level = Decimal(str(convert(value))).quantize(TWO_PLACES)
+            if MIN_DBM <= level <= MAX_DBM:
+                readings[field] = level
+        except (ArithmeticError, TypeError, ValueError):
+            continue
+    return readings
@@ -0,0 +1,248 @@
+"""
+CWMP Message Parser
+Streaming, namespace-aware parsing of TR-069 SOAP envelopes
+"""
+
+import io
+
+from django.conf import settings
+from lxml import etree
+
+SOAP_ENV = "http://schemas.xmlsoap.org/soap/envelope/"
+CWMP_NS_PREFIX = "urn:dslforum-org:cwmp-"
+
+DEFAULT_MAX_BODY_BYTES = 2 * 1024 * 1024
+DEFAULT_MAX_PARAMETERS = 5000
+
+# Element positions in a SOAP envelope: Envelope(1) > Body(2) > RPC(3) > field(4)
+RPC_DEPTH = 3
+FIELD_DEPTH = 4
+
+# Structs that are consumed as soon as they close so the tree never grows
+_STREAMED_STRUCTS = frozenset(('ParameterValueStruct', 'EventStruct'))
+
+
+class CwmpParseError(Exception):
+    """Raised for bodies that are not a well-formed CWMP SOAP envelope"""
+
+
+class CwmpLimitExceeded(CwmpParseError):
+    """Raised when a body exceeds the configured size or parameter caps"""
+
+
+class EventRecord:
+    """One EventStruct from an Inform"""
+    __slots__ = ('code', 'command_key')
+
+    def __init__(self, code='', command_key=''):
+        self.code = code
+        self.command_key = command_key
+
+    def __repr__(self):
+        return f"EventRecord({self.code!r}, {self.command_key!r})"
+
+
+class FaultRecord:
+    """A CWMP fault, from a SOAP Fault or a TransferComplete FaultStruct.
+
+    ``parameter_faults`` maps parameter names to the FaultRecords of a
+    SetParameterValuesFault's per-parameter entries.
+    """
+    __slots__ = ('code', 'string', 'parameter_faults')
+
+    def __init__(self, code='', string='', parameter_faults=None):
+        self.code = code
+        self.string = string
+        self.parameter_faults = parameter_faults or {}
+
+    def __repr__(self):
+        return f"FaultRecord({self.code!r}, {self.string!r})"
+
+
+class CwmpMessage:
+    """A parsed CWMP message.
+
+    ``rpc`` is the local name of the first Body element (``Inform``,
+    ``GetParameterValuesResponse``, ``Fault``...). Scalar children of the
+    RPC element (``MaxEnvelopes``, ``Status``, ``CommandKey``...) are kept
+    in ``fields``.
+    """
+    __slots__ = (
+        'rpc', 'cwmp_ns', 'cwmp_id', 'fields',
+        'device_info', 'events', 'parameters', 'fault',
+    )
+
+    def __init__(self):
+        self.rpc = None
+        self.cwmp_ns = None
+        self.cwmp_id = None
+        self.fields = {}
+        self.device_info = {}
+        self.events = []
+        self.parameters = {}
+        self.fault = None
+
+    @property
+    def is_inform(self):
+        return self.rpc == 'Inform'
+
+    def __repr__(self):
+        return f"CwmpMessage({self.rpc!r}, id={self.cwmp_id!r}, parameters={len(self.parameters)})"
+
+
+_local_names = {}
+
+
+def _split_tag(tag):
+    """Return (namespace, local name) for a Clark-notation tag, memoized"""
+    try:
+        return _local_names[tag]
+    except KeyError:
+        if tag[:1] == '{':
+            ns, _, local = tag[1:].partition('}')
+        else:
+            ns, local = '', tag
+        _local_names[tag] = (ns, local)
+        return ns, local
+
+
+class CwmpParser:
+    """Incremental CWMP parser with hard caps on body size and parameter count"""
+
+    def __init__(self, max_body_bytes=None, max_parameters=None):
+        self.max_body_bytes = max_body_bytes or getattr(
+            settings, 'ACS_MAX_BODY_BYTES', DEFAULT_MAX_BODY_BYTES
+        )
+        self.max_parameters = max_parameters or getattr(
+            settings, 'ACS_MAX_PARAMETERS', DEFAULT_MAX_PARAMETERS
+        )
+
+    def parse(self, data):
+        """Parse a request body. Returns None for an empty body."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if len(data) > self.max_body_bytes:
+            raise CwmpLimitExceeded(
+                f"Body of {len(data)} bytes exceeds limit of {self.max_body_bytes}"
+            )
+        if not data.strip():
+            return None
+
+        try:
+            return self._parse(io.BytesIO(data))
+        except etree.XMLSyntaxError as e:
+            raise CwmpParseError(str(e)) from e
+
+    def _parse(self, stream):
+        message = CwmpMessage()
+        parameters = message.parameters
+        max_parameters = self.max_parameters
+        path = []
+        in_body = False
+        in_header = False
+        name = value = None
+        event_code = command_key = ''
+        fault_code = fault_string = None
+        soap_fault_code = soap_fault_string = None
+        parameter_faults = {}
+        parameter_fault = {}
+
+        context = etree.iterparse(
+            stream,
+            events=('start', 'end'),
+            resolve_entities=False,
+            no_network=True,
+            remove_comments=True,
+            remove_pis=True,
+        )
+        for event, elem in context:
+            ns, local = _split_tag(elem.tag)
+
+            if event == 'start':
+                path.append(local)
+                depth = len(path)
+                if depth == 1:
+                    if ns != SOAP_ENV or local != 'Envelope':
+                        raise CwmpParseError(f"Root element is not a SOAP Envelope: {elem.tag}")
+                elif depth == 2:
+                    in_body = local == 'Body'
+                    in_header = local == 'Header'
+                elif depth == RPC_DEPTH and in_body and message.rpc is None:
+                    message.rpc = local
+                    if ns.startswith(CWMP_NS_PREFIX):
+                        message.cwmp_ns = ns
+                continue
+
+            depth = len(path)
+            path.pop()
+            parent = path[-1] if path else None
+
+            if in_header:
+                if local == 'ID' and ns.startswith(CWMP_NS_PREFIX):
+                    message.cwmp_id = (elem.text or '').strip()
+                    message.cwmp_ns = message.cwmp_ns or ns
+                continue
+            if not in_body or depth <= RPC_DEPTH:
+                continue
+
+            if parent == 'ParameterValueStruct':
+                if local == 'Name':
+                    name = elem.text
+                elif local == 'Value':
+                    value = elem.text
+            elif local == 'ParameterValueStruct':
+                if name:
+                    parameters[name] = value
+                    if len(parameters) > max_parameters:
+                        raise CwmpLimitExceeded(
+                            f"ParameterList exceeds limit of {max_parameters} parameters"
+                        )
+                name = value = None
+            elif parent == 'DeviceId':
+                message.device_info[local] = elem.text or ''
+            elif parent == 'EventStruct':
+                if local == 'EventCode':
+                    event_code = (elem.text or '').strip()
+                elif local == 'CommandKey':
+                    command_key = elem.text or ''
+            elif local == 'EventStruct':
+                message.events.append(EventRecord(event_code, command_key))
+                event_code = command_key = ''
+            elif parent == 'SetParameterValuesFault':
+                parameter_fault[local] = elem.text or ''
+            elif local == 'SetParameterValuesFault':
+                parameter_faults[parameter_fault.get('ParameterName', '').strip()] = FaultRecord(
+                    parameter_fault.get('FaultCode', '').strip(), parameter_fault.get('FaultString', '')
+                )
+                parameter_fault = {}
+            elif local == 'FaultCode':
+                # cwmp:Fault or FaultStruct; per-parameter codes are handled above
+                fault_code = (elem.text or '').strip()
+            elif local == 'FaultString':
+                fault_string = elem.text or ''
+            elif local == 'faultcode':
+                soap_fault_code = (elem.text or '').strip()
+            elif local == 'faultstring':
+                soap_fault_string = elem.text or ''
+            elif depth == FIELD_DEPTH and len(elem) == 0:
+                message.fields[local] = elem.text or ''
+
+            if local in _STREAMED_STRUCTS:
+                # Release the consumed struct and everything before it
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+        if message.rpc is None:
+            raise CwmpParseError("SOAP Body contains no CWMP message")
+        if fault_code is None and fault_string is None:
+            # A bare SOAP fault without the cwmp:Fault detail
+            fault_code, fault_string = soap_fault_code, soap_fault_string
+        if fault_code is not None or fault_string is not None or parameter_faults:
+            message.fault = FaultRecord(fault_code or '', fault_string or '', parameter_faults)
+        return message
+
+
+def parse_message(data):
+    """Parse a CWMP request body with the configured limits"""
+    return CwmpParser().parse(data)
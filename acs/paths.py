@@ -0,0 +1,61 @@
+"""
+TR-069 Parameter Paths
+Materialized object paths and index-friendly prefix/wildcard lookups
+"""
+
+import re
+
+from django.db.models import Q
+
+WILDCARD = '*'
+
+
+def parent_path(name):
+    """Object path containing a parameter or object.
+
+    ``A.B.C`` -> ``A.B.``; ``A.B.`` -> ``A.``; a top-level name -> ``''``.
+    """
+    head = name[:-1] if name.endswith('.') else name
+    return head[:head.rfind('.') + 1]
+
+
+def prefix_range(prefix):
+    """``(low, high)`` bounds that select exactly the strings starting with ``prefix``"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def path_q(pattern, field='parameter_name'):
+    """Match names starting with ``pattern``, where ``*`` stands for one path segment.
+
+    ``InternetGatewayDevice.WANDevice.1.`` and ``...WANDevice.1.*`` select
+    the whole subtree; ``...WANDevice.*.WANConnectionDevice.`` selects that
+    object under every WANDevice instance. The literal part before the first
+    wildcard becomes a range on ``field`` so the (device, name) index is
+    used; only the rows in that range are tested against the wildcard.
+    """
+    if pattern.endswith('.' + WILDCARD):
+        pattern = pattern[:-1]
+    literal, wildcard, _ = pattern.partition(WILDCARD)
+    q = Q()
+    if literal:
+        low, high = prefix_range(literal)
+        q &= Q(**{f'{field}__gte': low, f'{field}__lt': high})
+    if wildcard:
+        regex = '^' + '[^.]+'.join(re.escape(part) for part in pattern.split(WILDCARD))
+        q &= Q(**{f'{field}__regex': regex})
+    return q
+
+
+def path_sort_key(path):
+    """Sort key that orders instance numbers numerically (2 before 10)"""
+    return [(0, int(part), '') if part.isdigit() else (1, 0, part) for part in path.split('.')]
+
+
+def child_objects(path, descendant_paths):
+    """Immediate child object paths of ``path`` given the object paths below it"""
+    children = set()
+    for descendant in descendant_paths:
+        if descendant.startswith(path) and descendant != path:
+            segment = descendant[len(path):].split('.', 1)[0]
+            children.add(f'{path}{segment}.')
+    return sorted(children, key=path_sort_key)
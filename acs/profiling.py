@@ -0,0 +1,333 @@
+"""
+Request Profiling
+Sampled and slow-request capture for the TR-069 endpoint.
+
+``ProfilingMiddleware`` profiles a random ACS_PROFILE_SAMPLE_RATE fraction
+of CWMP requests and captures every request slower than ACS_PROFILE_SLOW_MS.
+Each capture holds the profiler report (sampled requests only), the SQL
+statements with their timings and the SOAP body with credentials, serial
+numbers and addresses masked. Captures go to a bounded on-disk ring buffer
+that ``manage.py profile_captures`` lists and dumps. With both settings at
+zero the middleware removes itself at startup.
+
+The middleware only decides what to capture and times the request. The
+profiler and the statement recorder run in ``recording()``, which the CWMP
+view enters on the thread that runs its handler: the request thread under
+WSGI, a database pool thread for the async endpoint. The middleware works
+in both sync and async chains, so it never makes Django adapt the async
+endpoint to sync.
+"""
+
+import cProfile
+import hashlib
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+ENGINE_CPROFILE = 'cprofile'
+ENGINE_PYINSTRUMENT = 'pyinstrument'
+
+DEFAULT_MAX_CAPTURES = 200
+MAX_STATEMENTS = 500
+MAX_BODY_BYTES = 64 * 1024
+PROFILE_LINES = 60
+
+SENSITIVE_NAME_RE = re.compile(r'(Password|Passphrase|PreSharedKey|WEPKey|Secret|Username|SSID)', re.I)
+IPV4_RE = re.compile(rb'\b(\d{1,3})\.\d{1,3}\.\d{1,3}\.(\d{1,3})\b')
+MAC_RE = re.compile(rb'\b([0-9A-Fa-f]{2})(?:[:-][0-9A-Fa-f]{2}){4}[:-]([0-9A-Fa-f]{2})\b')
+
+_xml_parser = etree.XMLParser(resolve_entities=False, no_network=True, remove_blank_text=False)
+
+# Capture of the request being handled; sync_to_async copies it into pool threads
+_current = ContextVar('acs_profiling_capture', default=None)
+
+
+def pseudonym(value):
+    """Stable stand-in for an identifier, so captures of one device can be matched"""
+    return 'anon-' + hashlib.sha256(value.encode()).hexdigest()[:12]
+
+
+def anonymize(body):
+    """SOAP body with secrets, serial numbers, IP and MAC addresses masked"""
+    body = body[:MAX_BODY_BYTES]
+    try:
+        root = etree.fromstring(body, _xml_parser)
+    except etree.XMLSyntaxError:
+        masked = body
+    else:
+        for element in root.iter('{*}SerialNumber', 'SerialNumber'):
+            if element.text:
+                element.text = pseudonym(element.text)
+        for struct in root.iter('ParameterValueStruct'):
+            name = struct.findtext('Name') or ''
+            value = struct.find('Value')
+            if value is None or not value.text:
+                continue
+            if SENSITIVE_NAME_RE.search(name):
+                value.text = '***'
+            elif name.endswith('SerialNumber'):
+                value.text = pseudonym(value.text)
+        masked = etree.tostring(root)
+    masked = IPV4_RE.sub(rb'\1.x.x.\2', masked)
+    masked = MAC_RE.sub(rb'\1:xx:xx:xx:xx:\2', masked)
+    return masked.decode('utf-8', 'replace')
+
+
+class StatementRecorder:
+    """Execute wrapper keeping each statement's database, SQL and duration"""
+
+    def __init__(self):
+        self.statements = []
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.statements) < MAX_STATEMENTS:
+                self.statements.append({
+                    'db': context['connection'].alias, 'sql': sql, 'many': many, 'ms': round(elapsed * 1000, 3),
+                })
+
+
+class Profiler:
+    """cProfile or pyinstrument behind one start/stop/report interface"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        if engine == ENGINE_PYINSTRUMENT:
+            import pyinstrument
+
+            self.profiler = pyinstrument.Profiler()
+        else:
+            self.profiler = cProfile.Profile()
+
+    def start(self):
+        try:
+            if self.engine == ENGINE_PYINSTRUMENT:
+                self.profiler.start()
+            else:
+                self.profiler.enable()
+        except (RuntimeError, ValueError) as e:
+            # Another profiler is already active on this thread
+            logger.warning(f"Request profiler not started: {e}")
+            return False
+        return True
+
+    def stop(self):
+        if self.engine == ENGINE_PYINSTRUMENT:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def report(self):
+        if self.engine == ENGINE_PYINSTRUMENT:
+            return self.profiler.output_text(unicode=False, color=False)
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        return out.getvalue()
+
+
+class Capture:
+    """Profiler and statements of one captured request, filled by recording()"""
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.profiled = False
+        self.recorder = StatementRecorder()
+
+
+@contextmanager
+def recording():
+    """Profile this thread and record its statements while the request is captured"""
+    capture = _current.get()
+    if capture is None:
+        yield
+        return
+    profiling = capture.profiler is not None and capture.profiler.start()
+    try:
+        with ExitStack() as wrappers:
+            for connection in connections.all():
+                wrappers.enter_context(connection.execute_wrapper(capture.recorder))
+            yield
+    finally:
+        if profiling:
+            capture.profiler.stop()
+            capture.profiled = True
+
+
+class CaptureStore:
+    """Ring buffer of captures, one JSON file each, oldest removed first.
+
+    File names start with the capture time in nanoseconds, so any number of
+    worker processes can write to the directory and listing it in name
+    order gives the captures in time order.
+    """
+
+    def __init__(self, directory=None, max_captures=None):
+        self.directory = Path(directory or getattr(
+            settings, 'ACS_PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'
+        ))
+        self.max_captures = max_captures or getattr(settings, 'ACS_PROFILE_MAX_CAPTURES', DEFAULT_MAX_CAPTURES)
+
+    def ids(self):
+        if not self.directory.exists():
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def save(self, capture):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        capture_id = f"{time.time_ns()}-{os.getpid()}"
+        capture['id'] = capture_id
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False) as tmp:
+            json.dump(capture, tmp)
+        os.replace(tmp.name, self.directory / f"{capture_id}.json")
+        for old in self.ids()[:-self.max_captures]:
+            try:
+                os.unlink(self.directory / f"{old}.json")
+            except FileNotFoundError:
+                pass  # Pruned by another worker
+        return capture_id
+
+    def get(self, capture_id):
+        try:
+            with open(self.directory / f"{Path(capture_id).name}.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def all(self):
+        for capture_id in self.ids():
+            capture = self.get(capture_id)
+            if capture is not None:
+                yield capture
+
+    def clear(self):
+        ids = self.ids()
+        for capture_id in ids:
+            try:
+                os.unlink(self.directory / f"{capture_id}.json")
+            except FileNotFoundError:
+                pass
+        return len(ids)
+
+
+class ProfilingMiddleware:
+    """Capture sampled and slow requests to the CWMP endpoint"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'ACS_PROFILE_SAMPLE_RATE', 0.0)
+        self.slow_seconds = getattr(settings, 'ACS_PROFILE_SLOW_MS', 0) / 1000
+        if self.sample_rate <= 0 and self.slow_seconds <= 0:
+            raise MiddlewareNotUsed
+        self.engine = getattr(settings, 'ACS_PROFILE_ENGINE', ENGINE_CPROFILE)
+        if self.engine not in (ENGINE_CPROFILE, ENGINE_PYINSTRUMENT):
+            raise ImproperlyConfigured(f"Unknown ACS_PROFILE_ENGINE {self.engine!r}")
+        self.store = CaptureStore()
+        self._path = None
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @property
+    def path(self):
+        # Resolved lazily: the URLconf may not be loaded when middleware is built
+        if self._path is None:
+            self._path = reverse('acs:tr069_endpoint')
+        return self._path
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path != self.path:
+            return self.get_response(request)
+
+        capture = self.begin()
+        token = _current.set(capture)
+        started_at = timezone.now()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, capture, started_at, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if request.path != self.path:
+            return await self.get_response(request)
+
+        capture = self.begin()
+        token = _current.set(capture)
+        started_at = timezone.now()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, capture, started_at, time.perf_counter() - started)
+        return response
+
+    def begin(self):
+        profiler = None
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            profiler = Profiler(self.engine)
+        return Capture(profiler)
+
+    def finish(self, request, response, capture, started_at, elapsed):
+        slow = 0 < self.slow_seconds <= elapsed
+        if capture.profiled or slow:
+            try:
+                self.capture(request, response, capture, started_at, elapsed, slow)
+            except Exception as e:
+                logger.error(f"Could not store request capture: {e}")
+
+    def capture(self, request, response, capture, started_at, elapsed, slow):
+        # The view has read the body unless it rejected the request by size
+        body = getattr(request, '_body', None)
+        recorder = capture.recorder
+        capture_id = self.store.save({
+            'started_at': started_at.isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 3),
+            'reason': 'slow' if slow else 'sampled',
+            'engine': self.engine if capture.profiled else None,
+            'profile': capture.profiler.report() if capture.profiled else None,
+            'query_count': recorder.count,
+            'query_ms': round(recorder.seconds * 1000, 3),
+            'queries': recorder.statements,
+            'body_bytes': len(body) if body is not None else None,
+            'body': anonymize(body) if body else '',
+        })
+        if slow:
+            logger.info(f"Slow TR-069 request ({elapsed * 1000:.0f} ms) captured as {capture_id}")
@@ -0,0 +1,240 @@
+"""
+Bulk Operations
+Creates one task per matching device and releases them to the CPEs in waves.
+
+Tasks are inserted ``held`` in chunks, so populating a 20k-device operation
+never holds one long transaction. ``advance()`` moves held tasks to
+``pending`` a wave at a time, keeping at most ``max_in_flight`` released
+tasks unfinished and pausing the operation when too many of the finished
+ones failed. Resuming a paused operation restarts the success-rate count.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .connreq import wake_devices
+from .routers import atomic_write
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+FILTER_FIELDS = ('manufacturer', 'model_name', 'product_class', 'software_version')
+PARAMETER_OPS = {
+    'eq': 'parameter_value',
+    'contains': 'parameter_value__contains',
+    'startswith': 'parameter_value__startswith',
+}
+IN_FLIGHT = ('pending', 'sent')
+FINISHED = ('completed', 'failed')
+
+# Finished tasks needed before the success-rate gate can pause a rollout
+MIN_GATE_SAMPLES = 10
+
+
+class BulkOperationError(ValueError):
+    pass
+
+
+def validate_filters(filters):
+    """Raise BulkOperationError for an unusable device filter"""
+    if not isinstance(filters, dict):
+        raise BulkOperationError("filters must be an object")
+    unknown = set(filters) - set(FILTER_FIELDS) - {'parameter'}
+    if unknown:
+        raise BulkOperationError(f"Unknown filters: {', '.join(sorted(unknown))}")
+    predicate = filters.get('parameter')
+    if predicate is not None:
+        if not isinstance(predicate, dict) or not predicate.get('name'):
+            raise BulkOperationError("parameter filter needs a name")
+        op = predicate.get('op', 'eq')
+        if op not in PARAMETER_OPS and op != 'ne':
+            raise BulkOperationError(f"Unknown parameter operator {op}")
+
+
+def matching_devices(filters, chunk_size=None):
+    """Pks of the devices selected by a bulk operation filter, yielded in chunks.
+
+    The parameter predicate is checked a chunk at a time with a separate
+    query, since DeviceParameter may live in another database (acs.routers).
+    """
+    from .models import DeviceInform, DeviceParameter
+
+    validate_filters(filters)
+    chunk_size = chunk_size or getattr(settings, 'ACS_BULK_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    devices = DeviceInform.objects.filter(
+        **{field: filters[field] for field in FILTER_FIELDS if filters.get(field)}
+    ).order_by('id')
+    parameters = None
+    predicate = filters.get('parameter')
+    if predicate:
+        op = predicate.get('op', 'eq')
+        value = str(predicate.get('value', ''))
+        parameters = DeviceParameter.objects.filter(parameter_name=predicate['name'])
+        if op == 'ne':
+            parameters = parameters.exclude(parameter_value=value)
+        else:
+            parameters = parameters.filter(**{PARAMETER_OPS[op]: value})
+    last_pk = 0
+    while True:
+        device_pks = list(devices.filter(pk__gt=last_pk).values_list('id', flat=True)[:chunk_size])
+        if not device_pks:
+            return
+        last_pk = device_pks[-1]
+        if parameters is not None:
+            matched = set(parameters.filter(
+                device_inform_id__in=device_pks
+            ).values_list('device_inform_id', flat=True))
+            device_pks = [pk for pk in device_pks if pk in matched]
+        if device_pks:
+            yield device_pks
+
+
+def count_matching(filters):
+    """Number of devices a bulk operation filter selects"""
+    return sum(len(device_pks) for device_pks in matching_devices(filters))
+
+
+def populate(operation, chunk_size=None):
+    """Create the operation's held tasks; returns how many were created"""
+    from .models import DeviceTask
+
+    created = 0
+    for device_pks in matching_devices(operation.filters, chunk_size):
+        with transaction.atomic(using=router.db_for_write(DeviceTask)):
+            DeviceTask.objects.bulk_create([
+                DeviceTask(
+                    device_inform_id=device_pk, bulk_operation=operation,
+                    task_type=operation.task_type, parameters=operation.parameters,
+                    firmware_image_id=operation.parameters.get('firmware_image'),
+                    status='held',
+                )
+                for device_pk in device_pks
+            ])
+        created += len(device_pks)
+
+    operation.total_tasks = created
+    operation.save(update_fields=['total_tasks'])
+    logger.info(f"Bulk operation {operation.pk} created {created} {operation.task_type} tasks")
+    return created
+
+
+def task_counts(operation):
+    """``{status: count}`` for the operation's tasks"""
+    counts = dict.fromkeys(dict(operation.tasks.model.STATUS_CHOICES), 0)
+    counts.update(
+        operation.tasks.order_by().values_list('status').annotate(count=Count('id'))
+    )
+    return counts
+
+
+def _set_status(operation, status, message=''):
+    operation.status = status
+    operation.status_message = message
+    fields = ['status', 'status_message']
+    if status == 'running':
+        operation.resumed_at = timezone.now()
+        fields.append('resumed_at')
+        if operation.started_at is None:
+            operation.started_at = operation.resumed_at
+            fields.append('started_at')
+    if status in ('completed', 'aborted'):
+        operation.finished_at = timezone.now()
+        fields.append('finished_at')
+    operation.save(update_fields=fields)
+
+
+def start(operation):
+    if operation.status in ('draft', 'paused'):
+        _set_status(operation, 'running')
+        advance(operation)
+
+
+def pause(operation, message="Paused by operator"):
+    if operation.status == 'running':
+        _set_status(operation, 'paused', message)
+
+
+def abort(operation):
+    """Stop the rollout; tasks not yet sent to a CPE are cancelled, sent ones finish"""
+    if operation.status in ('completed', 'aborted'):
+        return
+    operation.tasks.filter(status__in=('held', 'pending')).update(
+        status='cancelled', completed_at=timezone.now(), error_message="Bulk operation aborted"
+    )
+    _set_status(operation, 'aborted')
+
+
+def _expire(operation, now):
+    """Fail released tasks the CPE never finished"""
+    return operation.tasks.filter(
+        status__in=IN_FLIGHT, created_at__lt=now - timedelta(seconds=operation.task_timeout)
+    ).update(status='failed', completed_at=now, error_message="Timed out waiting for the CPE")
+
+
+def advance(operation, now=None):
+    """Release the operation's next wave if its limits allow.
+
+    Returns the number of tasks released. A released task's ``created_at``
+    is reset to the release time, so it is queued behind tasks already
+    waiting for the device and its timeout runs from the release.
+    """
+    from .models import DeviceTask
+
+    if operation.status != 'running':
+        return 0
+    now = now or timezone.now()
+    _expire(operation, now)
+    counts = task_counts(operation)
+
+    gate = operation.tasks.filter(
+        status__in=FINISHED, completed_at__gte=operation.resumed_at
+    ).aggregate(finished=Count('id'), completed=Count('id', filter=Q(status='completed')))
+    if gate['finished'] >= MIN_GATE_SAMPLES:
+        rate = gate['completed'] / gate['finished']
+        if rate < operation.min_success_rate:
+            pause(operation, f"Success rate {rate:.0%} is below {operation.min_success_rate:.0%}")
+            logger.warning(f"Bulk operation {operation.pk} paused: {operation.status_message}")
+            return 0
+
+    in_flight = sum(counts[status] for status in IN_FLIGHT)
+    if not counts['held']:
+        if not in_flight:
+            _set_status(operation, 'completed')
+            logger.info(f"Bulk operation {operation.pk} completed")
+        return 0
+    if operation.last_wave_at and now < operation.last_wave_at + timedelta(seconds=operation.wave_interval):
+        return 0
+    room = min(operation.wave_size, operation.max_in_flight - in_flight)
+    if room <= 0:
+        return 0
+
+    with atomic_write(router.db_for_write(DeviceTask)):
+        wave = list(
+            operation.tasks.filter(status='held').order_by('id').values_list('id', 'device_inform_id')[:room]
+        )
+        released = DeviceTask.objects.filter(
+            id__in=[task_pk for task_pk, _ in wave], status='held'
+        ).update(status='pending', created_at=now)
+        operation.last_wave_at = now
+        operation.save(update_fields=['last_wave_at'])
+
+    if getattr(settings, 'ACS_CONNECTION_REQUEST_ON_TASK', False):
+        wake_devices([device_pk for _, device_pk in wave])
+    logger.info(f"Bulk operation {operation.pk} released {released} tasks")
+    return released
+
+
+def advance_all():
+    """Advance every running operation; returns ``{operation pk: tasks released}``"""
+    from .models import BulkOperation
+
+    return {
+        operation.pk: advance(operation)
+        for operation in BulkOperation.objects.filter(status='running')
+    }
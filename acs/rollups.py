@@ -0,0 +1,169 @@
+"""
+Statistics Rollups
+Incrementally maintained device counters and daily discovery buckets
+"""
+
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TOTAL = 'total'
+ONLINE = 'online'
+AUTO_DISCOVERED = 'auto_discovered'
+VENDOR = 'vendor'
+FIRMWARE = 'firmware'
+
+# DeviceInform fields the counters are keyed on
+DEVICE_FIELDS = ('manufacturer', 'software_version', 'is_online', 'auto_discovered')
+
+
+def _add(model, lookup, delta):
+    """Atomically add ``delta`` to the row matching ``lookup``, creating it if needed"""
+    if not delta:
+        return
+    if model.objects.filter(**lookup).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Another worker created the row first
+        model.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def apply(deltas, discoveries=None):
+    """Apply ``{(kind, key): delta}`` counter changes and ``{date: delta}`` discoveries"""
+    from .models import DeviceCounter, DailyDiscovery
+
+    with transaction.atomic():
+        for (kind, key), delta in deltas.items():
+            _add(DeviceCounter, {'kind': kind, 'key': key}, delta)
+        for date, delta in (discoveries or {}).items():
+            _add(DailyDiscovery, {'date': date}, delta)
+
+
+def _device_deltas(device, sign):
+    deltas = Counter()
+    deltas[TOTAL, ''] += sign
+    deltas[VENDOR, device.manufacturer or ''] += sign
+    deltas[FIRMWARE, device.software_version or ''] += sign
+    if device.is_online:
+        deltas[ONLINE, ''] += sign
+    if device.auto_discovered:
+        deltas[AUTO_DISCOVERED, ''] += sign
+    return deltas
+
+
+def device_created(device):
+    apply(
+        _device_deltas(device, 1),
+        {timezone.localdate(device.first_contact or timezone.now()): 1},
+    )
+
+
+def device_deleted(device):
+    discoveries = {}
+    if device.first_contact:
+        discoveries[timezone.localdate(device.first_contact)] = -1
+    apply(_device_deltas(device, -1), discoveries)
+
+
+def device_changed(previous, device):
+    """Move a saved device between counters; ``previous`` has its old DEVICE_FIELDS"""
+    deltas = _device_deltas(previous, -1)
+    deltas.update(_device_deltas(device, 1))
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        apply(deltas)
+
+
+def online_changed(delta):
+    """Record ``delta`` devices coming online (positive) or going offline (negative)"""
+    apply({(ONLINE, ''): delta})
+
+
+def snapshot():
+    """All counters as ``{kind: {key: count}}`` from a single small table read"""
+    from .models import DeviceCounter
+
+    counters = {}
+    for kind, key, count in DeviceCounter.objects.values_list('kind', 'key', 'count'):
+        counters.setdefault(kind, {})[key] = count
+    return counters
+
+
+def breakdown(counters, kind, label, limit=None):
+    """Nonzero counters of one kind as ``[{label: key, 'count': n}]``, largest first"""
+    rows = sorted(
+        ((key, count) for key, count in counters.get(kind, {}).items() if count > 0),
+        key=lambda row: -row[1],
+    )
+    if limit is not None:
+        rows = rows[:limit]
+    return [{label: key, 'count': count} for key, count in rows]
+
+
+def daily_discoveries(start, days):
+    """Discovery counts for ``days`` consecutive dates from ``start``, zero-filled"""
+    from .models import DailyDiscovery
+
+    dates = [start + timedelta(days=i) for i in range(days)]
+    counts = dict(
+        DailyDiscovery.objects.filter(date__in=dates).values_list('date', 'count')
+    )
+    return [{'date': date.strftime('%Y-%m-%d'), 'count': counts.get(date, 0)} for date in dates]
+
+
+def discoveries_last_day(now=None):
+    """Devices discovered in the last 24 hours, estimated from the daily buckets.
+
+    Today's bucket counts whole; yesterday's counts for the share of
+    yesterday that falls within the last 24 hours, as if its discoveries
+    were spread evenly over the day.
+    """
+    now = timezone.localtime(now)
+    today = now.date()
+    yesterday_count, today_count = (row['count'] for row in daily_discoveries(today - timedelta(days=1), 2))
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    share = 1 - (now - midnight) / timedelta(days=1)
+    return today_count + round(yesterday_count * share)
+
+
+def rebuild():
+    """Recompute every counter and bucket from acs_device_inform"""
+    from .models import DeviceInform, DeviceCounter, DailyDiscovery
+
+    devices = DeviceInform.objects.order_by()
+    counters = [
+        DeviceCounter(kind=TOTAL, key='', count=devices.count()),
+        DeviceCounter(kind=ONLINE, key='', count=devices.filter(is_online=True).count()),
+        DeviceCounter(
+            kind=AUTO_DISCOVERED, key='', count=devices.filter(auto_discovered=True).count()
+        ),
+    ]
+    for field, kind in (('manufacturer', VENDOR), ('software_version', FIRMWARE)):
+        counters += [
+            DeviceCounter(kind=kind, key=row[field], count=row['count'])
+            for row in devices.values(field).annotate(count=Count('id'))
+        ]
+    buckets = [
+        DailyDiscovery(date=row['date'], count=row['count'])
+        for row in devices.annotate(
+            date=TruncDate('first_contact')
+        ).values('date').annotate(count=Count('id'))
+    ]
+
+    with transaction.atomic():
+        DeviceCounter.objects.all().delete()
+        DailyDiscovery.objects.all().delete()
+        DeviceCounter.objects.bulk_create(counters)
+        DailyDiscovery.objects.bulk_create(buckets)
+    logger.info(f"Rebuilt {len(counters)} device counters and {len(buckets)} daily buckets")
+    return len(counters), len(buckets)
@@ -0,0 +1,130 @@
+"""
+Database Routing
+Keeps the high-churn ACS telemetry tables in their own database.
+
+Parameters, parameter history, device tasks (with the bulk operations and
+firmware images they point to) and CWMP sessions make up nearly all the
+write volume. With a ``telemetry`` entry in DATABASES they are stored
+there, so Inform bursts no longer hold the write lock that logins, ONU and
+customer edits need on ``default``. Without one everything stays in
+``default``.
+
+The only relations across the two databases are the ``device_inform``
+foreign keys of telemetry rows. They carry no database constraint, their
+cascade is done by ``acs.signals``, and code must not join across them
+(``device_inform__...`` lookups, ``select_related``, subqueries); use
+``in_lookup()`` to filter one side by the other.
+"""
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+
+TELEMETRY_DB = 'telemetry'
+TELEMETRY_MODELS = frozenset((
+    'deviceparameter', 'parameterhistory', 'parameterhistorybucket',
+    'devicetask', 'bulkoperation', 'firmwareimage', 'devicesession',
+))
+
+
+def telemetry_enabled():
+    return TELEMETRY_DB in settings.DATABASES
+
+
+def is_telemetry(app_label, model_name):
+    return app_label == 'acs' and model_name in TELEMETRY_MODELS
+
+
+def db_for(model):
+    """Alias of the database a model is written to"""
+    return router.db_for_write(model)
+
+
+def same_database(*models):
+    return len({db_for(model) for model in models}) == 1
+
+
+def in_lookup(queryset, field, model):
+    """Value for an ``__in`` lookup on ``model`` matching ``field`` of the rows in ``queryset``.
+
+    A subquery when both models share a database, otherwise the values
+    themselves, read with a query of their own.
+    """
+    values = queryset.values(field)
+    if same_database(queryset.model, model):
+        return values
+    return list(values.values_list(field, flat=True))
+
+
+@contextmanager
+def atomic_write(using=None):
+    """``transaction.atomic()`` for a block that reads and then writes.
+
+    On the acs.sqlite3 backend the outermost such block starts with BEGIN
+    IMMEDIATE, so it waits for a concurrent writer instead of failing with
+    "database is locked" at its first write. Elsewhere it is plain atomic().
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    connection.begin_immediate = True
+    try:
+        with transaction.atomic(using=using):
+            connection.begin_immediate = False
+            yield
+    finally:
+        connection.begin_immediate = False
+
+
+class TelemetryRouter:
+    """Route the telemetry models to TELEMETRY_DB when it is configured.
+
+    Every other model is routed to ``default`` explicitly rather than left
+    to Django, which would otherwise follow the database of the instance a
+    relation was reached from (``parameter.device_inform`` would be looked
+    up in the telemetry database).
+    """
+
+    def _db(self, model):
+        if not telemetry_enabled():
+            return None
+        if is_telemetry(model._meta.app_label, model._meta.model_name):
+            return TELEMETRY_DB
+        return 'default'
+
+    def db_for_read(self, model, **hints):
+        return self._db(model)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not telemetry_enabled():
+            return None
+        if any(is_telemetry(obj._meta.app_label, obj._meta.model_name) for obj in (obj1, obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not telemetry_enabled():
+            return None
+        if model_name is not None and is_telemetry(app_label, model_name):
+            return db == TELEMETRY_DB
+        if db == TELEMETRY_DB:
+            return False
+        return None
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created handler applying ACS_SQLITE_PRAGMAS to SQLite connections.
+
+    WAL lets the UI keep reading while an Inform writes, and with it
+    synchronous=NORMAL only syncs at checkpoints instead of on every commit.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'ACS_SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
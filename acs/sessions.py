@@ -0,0 +1,210 @@
+"""
+CWMP Session Store
+State of a CWMP session across the HTTP POSTs of one CPE.
+
+The ACS issues a session cookie with the InformResponse and keeps the
+session's state (a few short fields, stored as one compact string) under
+it with a TTL. Backends, chosen by ACS_SESSION_BACKEND:
+
+- ``memory``: a dict in this process; only for a single-process server
+- ``redis``: shared by all workers and hosts, one round trip per request
+- ``db``: ``DeviceSession`` rows; shared, but writes on every state change,
+  so it is only used when chosen explicitly
+
+Stores write the state only when it changes. Loading a session restarts its
+TTL, so a CPE that takes long over one exchange keeps its session for as
+long as it keeps posting; the db store does that write at most once per
+half TTL.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router
+from django.utils import timezone
+
+from .routers import atomic_write
+
+logger = logging.getLogger(__name__)
+
+BACKEND_MEMORY = 'memory'
+BACKEND_REDIS = 'redis'
+BACKEND_DB = 'db'
+
+DEFAULT_TTL = 300
+DEFAULT_COOKIE_NAME = 'cwmpsid'
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+REDIS_KEY_PREFIX = 'acs:cwmp:'
+REDIS_ACTIVE_KEY = 'acs:cwmp-active'
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def session_ttl():
+    return getattr(settings, 'ACS_SESSION_TTL', DEFAULT_TTL)
+
+
+def cookie_name():
+    return getattr(settings, 'ACS_SESSION_COOKIE_NAME', DEFAULT_COOKIE_NAME)
+
+
+class MemorySessionStore:
+    """Sessions in a dict of this process, expired lazily"""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def load(self, session_id, ttl):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            expires, data = entry
+            now = time.monotonic()
+            if expires <= now:
+                del self._sessions[session_id]
+                return None
+            self._sessions[session_id] = (now + ttl, data)
+            return data
+
+    def save(self, session_id, data, ttl):
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic() + ttl, data)
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _prune(self):
+        now = time.monotonic()
+        for session_id in [key for key, (expires, _) in self._sessions.items() if expires <= now]:
+            del self._sessions[session_id]
+
+    def active_count(self):
+        with self._lock:
+            self._prune()
+            return len(self._sessions)
+
+    def purge(self):
+        with self._lock:
+            before = len(self._sessions)
+            self._prune()
+            return before - len(self._sessions)
+
+
+class RedisSessionStore:
+    """Sessions as expiring Redis keys, plus a sorted set for counting them"""
+
+    def __init__(self, url=None):
+        import redis
+
+        self.client = redis.Redis.from_url(
+            url or getattr(settings, 'ACS_SESSION_REDIS_URL', '') or DEFAULT_REDIS_URL
+        )
+
+    def load(self, session_id, ttl):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(REDIS_KEY_PREFIX + session_id)
+        pipe.expire(REDIS_KEY_PREFIX + session_id, ttl)
+        pipe.zadd(REDIS_ACTIVE_KEY, {session_id: time.time() + ttl}, xx=True)
+        data = pipe.execute()[0]
+        return data.decode() if data is not None else None
+
+    def save(self, session_id, data, ttl):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(REDIS_KEY_PREFIX + session_id, data, ex=ttl)
+        pipe.zadd(REDIS_ACTIVE_KEY, {session_id: time.time() + ttl})
+        pipe.execute()
+
+    def delete(self, session_id):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(REDIS_KEY_PREFIX + session_id)
+        pipe.zrem(REDIS_ACTIVE_KEY, session_id)
+        pipe.execute()
+
+    def active_count(self):
+        return self.client.zcount(REDIS_ACTIVE_KEY, time.time(), '+inf')
+
+    def purge(self):
+        # The keys expire by themselves; only the counting set needs trimming
+        return self.client.zremrangebyscore(REDIS_ACTIVE_KEY, '-inf', time.time())
+
+
+class DatabaseSessionStore:
+    """Sessions as DeviceSession rows"""
+
+    def load(self, session_id, ttl):
+        from .models import DeviceSession
+
+        now = timezone.now()
+        row = DeviceSession.objects.filter(
+            session_id=session_id, is_active=True, expires_at__gt=now
+        ).values_list('state', 'expires_at').first()
+        if row is None:
+            return None
+        state, expires_at = row
+        if expires_at - now < timedelta(seconds=ttl / 2):
+            DeviceSession.objects.filter(session_id=session_id).update(expires_at=now + timedelta(seconds=ttl))
+        return state
+
+    def save(self, session_id, data, ttl):
+        from .models import DeviceSession
+
+        # update_or_create() reads, then writes
+        with atomic_write(router.db_for_write(DeviceSession)):
+            DeviceSession.objects.update_or_create(
+                session_id=session_id,
+                defaults={'state': data, 'is_active': True, 'expires_at': timezone.now() + timedelta(seconds=ttl)},
+            )
+
+    def delete(self, session_id):
+        from .models import DeviceSession
+
+        DeviceSession.objects.filter(session_id=session_id).delete()
+
+    def active_count(self):
+        from .models import DeviceSession
+
+        return DeviceSession.objects.filter(is_active=True, expires_at__gt=timezone.now()).count()
+
+    def purge(self):
+        from .models import DeviceSession
+
+        return DeviceSession.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+BACKENDS = {
+    BACKEND_MEMORY: MemorySessionStore,
+    BACKEND_REDIS: RedisSessionStore,
+    BACKEND_DB: DatabaseSessionStore,
+}
+
+
+def get_store():
+    """The configured session store, shared by the process"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = getattr(settings, 'ACS_SESSION_BACKEND', BACKEND_MEMORY)
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown ACS_SESSION_BACKEND {backend!r}")
+            workers = os.environ.get('WEB_CONCURRENCY', '1')
+            if backend == BACKEND_MEMORY and workers.isdigit() and int(workers) > 1:
+                logger.warning(
+                    f"CWMP sessions are kept in memory but the server runs {workers} workers; "
+                    f"set REDIS_URL, or ACS_SESSION_BACKEND=db"
+                )
+            _store = BACKENDS[backend]()
+        return _store
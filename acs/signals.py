@@ -0,0 +1,60 @@
+"""
+ACS model signal handlers
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core import search
+
+from . import rollups
+from .identity import identities
+from .models import DeviceInform, DeviceParameter, DeviceTask, ParameterHistory, ParameterHistoryBucket
+
+search.register('device', 2, DeviceInform, (
+    'device_id', 'serial_number', 'manufacturer', 'model_name', 'product_class', 'ip_address',
+))
+
+
+@receiver(pre_delete, sender=DeviceInform)
+def delete_telemetry(sender, instance, **kwargs):
+    """Cascade a device delete to its telemetry rows, which may be in another database"""
+    for model in (ParameterHistory, ParameterHistoryBucket, DeviceParameter, DeviceTask):
+        model.objects.filter(device_inform_id=instance.pk).delete()
+
+
+@receiver(pre_save, sender=DeviceInform)
+def remember_counted_fields(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    """Read the counted fields a save is about to overwrite, for device_saved()"""
+    instance._rollup_previous = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(rollups.DEVICE_FIELDS):
+        return
+    instance._rollup_previous = sender.objects.using(using).filter(pk=instance.pk).only(
+        *rollups.DEVICE_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=DeviceInform)
+def device_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep the dashboard rollups in step with new devices and admin edits"""
+    if raw:
+        return
+    if created:
+        rollups.device_created(instance)
+    elif instance._rollup_previous is not None:
+        rollups.device_changed(instance._rollup_previous, instance)
+
+
+@receiver(post_delete, sender=DeviceInform)
+def device_deleted(sender, instance, **kwargs):
+    """Keep the dashboard rollups in step with admin deletions"""
+    rollups.device_deleted(instance)
+
+
+@receiver(post_save, sender=DeviceInform)
+@receiver(post_delete, sender=DeviceInform)
+def device_changed(sender, instance, **kwargs):
+    """Drop admin-edited devices from this process's identity cache"""
+    identities.invalidate_pks([instance.pk])
@@ -0,0 +1,289 @@
+"""
+CPE Simulator
+Virtual Huawei/ZTE CPEs that run full CWMP sessions against an ACS URL.
+
+Each virtual CPE keeps its own HTTP session (cookies), sends an Inform
+carrying a vendor-shaped ParameterList, then empty POSTs and answers any
+RPC the ACS sends until the ACS ends the session. ``run()`` drives many
+CPEs concurrently and returns throughput and latency percentiles.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import etree
+
+from . import soap
+
+SOAP_NS = {'soap': soap.SOAP_ENV}
+
+PROFILES = {
+    'huawei': {
+        'manufacturer': 'Huawei Technologies Co., Ltd',
+        'oui': '00E0FC',
+        'product_class': 'HG8245H',
+        'software_version': 'V3R017C10S130',
+        'hardware_version': '10C7.A',
+        'optical': 'InternetGatewayDevice.WANDevice.1.X_GponInterafceConfig.',
+        'tx_power': lambda rng: f"{rng.uniform(1.5, 3.0):.2f}",
+        'rx_power': lambda rng: f"{rng.uniform(-26.0, -16.0):.2f}",
+    },
+    'zte': {
+        'manufacturer': 'ZTE',
+        'oui': 'D4C1C8',
+        'product_class': 'F660',
+        'software_version': 'V6.0.10P2T2',
+        'hardware_version': 'V6.0',
+        'optical': 'InternetGatewayDevice.WANDevice.1.X_ZTE-COM_WANPONInterfaceConfig.',
+        # Raw power in 0.1 uW, as older ZTE firmwares report it
+        'tx_power': lambda rng: str(rng.randint(14000, 20000)),
+        'rx_power': lambda rng: str(rng.randint(25, 250)),
+    },
+}
+
+IGD = 'InternetGatewayDevice.'
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Nearest-rank percentiles (and mean/max) of a list of seconds, in milliseconds"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    result = {
+        f'p{point}': round(ordered[max(0, -(-len(ordered) * point // 100) - 1)] * 1000, 3)
+        for point in points
+    }
+    result['mean'] = round(sum(ordered) / len(ordered) * 1000, 3)
+    result['max'] = round(ordered[-1] * 1000, 3)
+    return result
+
+
+class VirtualCPE:
+    """One simulated CPE with a stable identity and parameter set"""
+
+    def __init__(self, vendor, serial_number, parameter_count, seed=None):
+        self.profile = PROFILES[vendor]
+        self.serial_number = serial_number
+        self.rng = random.Random(seed if seed is not None else serial_number)
+        self.started = time.time()
+        self.parameters = self.base_parameters()
+        # Pad with LAN host entries, the bulk of a real ParameterList
+        host = 1
+        while len(self.parameters) < parameter_count:
+            prefix = f'{IGD}LANDevice.1.Hosts.Host.{host}.'
+            for name, value in (
+                ('HostName', f'host-{host}'),
+                ('IPAddress', f'192.168.1.{host % 250 + 2}'),
+                ('MACAddress', self.mac(host)),
+                ('Active', 'true'),
+            ):
+                if len(self.parameters) < parameter_count:
+                    self.parameters[prefix + name] = value
+            host += 1
+        self.session = None
+
+    def mac(self, index=0):
+        value = self.rng.getrandbits(24) ^ index
+        return f"00:E0:FC:{value >> 16 & 255:02X}:{value >> 8 & 255:02X}:{value & 255:02X}"
+
+    def base_parameters(self):
+        profile = self.profile
+        return {
+            f'{IGD}DeviceInfo.Manufacturer': profile['manufacturer'],
+            f'{IGD}DeviceInfo.ModelName': profile['product_class'],
+            f'{IGD}DeviceInfo.SoftwareVersion': profile['software_version'],
+            f'{IGD}DeviceInfo.HardwareVersion': profile['hardware_version'],
+            f'{IGD}DeviceInfo.SerialNumber': self.serial_number,
+            f'{IGD}DeviceInfo.UpTime': '0',
+            f'{IGD}ManagementServer.PeriodicInformInterval': '300',
+            f'{IGD}ManagementServer.ConnectionRequestURL': (
+                f'http://10.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.'
+                f'{self.rng.randint(2, 254)}:7547/'
+            ),
+            f'{IGD}ManagementServer.ParameterKey': '',
+            f"{profile['optical']}RXPower": profile['rx_power'](self.rng),
+            f"{profile['optical']}TXPower": profile['tx_power'](self.rng),
+            f'{IGD}WANDevice.1.WANConnectionDevice.1.WANIPConnection.1.ExternalIPAddress': (
+                f'100.64.{self.rng.randint(0, 255)}.{self.rng.randint(2, 254)}'
+            ),
+            f'{IGD}LANDevice.1.WLANConfiguration.1.SSID': f'WIFI-{self.serial_number[-4:]}',
+            f'{IGD}LANDevice.1.WLANConfiguration.1.Channel': str(self.rng.choice((1, 6, 11))),
+        }
+
+    def refresh(self):
+        """Values that change between Informs"""
+        profile = self.profile
+        self.parameters[f'{IGD}DeviceInfo.UpTime'] = str(int(time.time() - self.started))
+        self.parameters[f"{profile['optical']}RXPower"] = profile['rx_power'](self.rng)
+
+    def inform(self, events):
+        self.refresh()
+        device_id = (
+            b'<DeviceId><Manufacturer>%s</Manufacturer><OUI>%s</OUI>'
+            b'<ProductClass>%s</ProductClass><SerialNumber>%s</SerialNumber></DeviceId>' % (
+                soap.escape(self.profile['manufacturer']), soap.escape(self.profile['oui']),
+                soap.escape(self.profile['product_class']), soap.escape(self.serial_number),
+            )
+        )
+        event_structs = b''.join(
+            b'<EventStruct><EventCode>%s</EventCode><CommandKey></CommandKey></EventStruct>'
+            % soap.escape(code) for code in events
+        )
+        return soap.envelope(b''.join((
+            b'<cwmp:Inform>', device_id,
+            b'<Event soap-enc:arrayType="cwmp:EventStruct[%d]">%s</Event>' % (len(events), event_structs),
+            b'<MaxEnvelopes>1</MaxEnvelopes><CurrentTime>%s</CurrentTime><RetryCount>0</RetryCount>'
+            % time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()).encode(),
+            self.parameter_list(self.parameters),
+            b'</cwmp:Inform>',
+        )), soap.new_cwmp_id()[:8])
+
+    @staticmethod
+    def parameter_list(parameters):
+        structs = [
+            b'<ParameterValueStruct><Name>%s</Name><Value xsi:type="xsd:string">%s</Value>'
+            b'</ParameterValueStruct>' % (soap.escape(name), soap.escape(value))
+            for name, value in parameters.items()
+        ]
+        return b''.join((
+            b'<ParameterList soap-enc:arrayType="cwmp:ParameterValueStruct[%d]">' % len(structs),
+            *structs,
+            b'</ParameterList>',
+        ))
+
+    def answer(self, body):
+        """This CPE's reply to an ACS request, or None if it is not an RPC"""
+        root = etree.fromstring(body)
+        rpc = root.find('soap:Body/*', SOAP_NS)
+        if rpc is None:
+            return None
+        cwmp_id = root.findtext('soap:Header/*', default=None, namespaces=SOAP_NS)
+        name = etree.QName(rpc).localname
+        if name == 'GetParameterValues':
+            requested = [element.text or '' for element in rpc.iter('string')]
+            values = {
+                key: value for key, value in self.parameters.items()
+                if any(key == path or (path.endswith('.') and key.startswith(path)) for path in requested)
+            }
+            return soap.envelope(
+                b'<cwmp:GetParameterValuesResponse>%s</cwmp:GetParameterValuesResponse>'
+                % self.parameter_list(values), cwmp_id
+            )
+        if name == 'SetParameterValues':
+            for struct in rpc.iter('ParameterValueStruct'):
+                self.parameters[struct.findtext('Name')] = struct.findtext('Value') or ''
+            return soap.envelope(
+                b'<cwmp:SetParameterValuesResponse><Status>0</Status></cwmp:SetParameterValuesResponse>',
+                cwmp_id,
+            )
+        if name == 'Download':
+            return soap.envelope(
+                b'<cwmp:DownloadResponse><Status>0</Status>'
+                b'<StartTime>0001-01-01T00:00:00Z</StartTime><CompleteTime>0001-01-01T00:00:00Z</CompleteTime>'
+                b'</cwmp:DownloadResponse>', cwmp_id
+            )
+        if name in ('Reboot', 'FactoryReset'):
+            return soap.envelope(b'<cwmp:%sResponse></cwmp:%sResponse>' % (name.encode(), name.encode()), cwmp_id)
+        return soap.envelope(
+            b'<soap:Fault><faultcode>Client</faultcode><faultstring>CWMP fault</faultstring>'
+            b'<detail><cwmp:Fault><FaultCode>9000</FaultCode><FaultString>Method not supported</FaultString>'
+            b'</cwmp:Fault></detail></soap:Fault>', cwmp_id
+        )
+
+    def run_session(self, url, events, timeout):
+        """One CWMP session; returns ``(Inform latency, session duration, requests)``"""
+        import requests
+
+        if self.session is None:
+            self.session = requests.Session()
+            self.session.headers['Content-Type'] = 'text/xml; charset=utf-8'
+        started = time.perf_counter()
+        response = self.session.post(url, data=self.inform(events), timeout=timeout)
+        inform_latency = time.perf_counter() - started
+        response.raise_for_status()
+        posts = 1
+        body = b''
+        while True:
+            response = self.session.post(url, data=body, timeout=timeout)
+            posts += 1
+            response.raise_for_status()
+            if response.status_code == 204 or not response.content.strip():
+                break
+            body = self.answer(response.content)
+            if body is None:
+                break
+        return inform_latency, time.perf_counter() - started, posts
+
+
+class SimulationResult:
+    """Timings and errors collected from all CPE sessions"""
+
+    def __init__(self):
+        self.inform_latencies = []
+        self.session_latencies = []
+        self.requests = 0
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, inform_latency, session_latency, requests):
+        with self._lock:
+            self.inform_latencies.append(inform_latency)
+            self.session_latencies.append(session_latency)
+            self.requests += requests
+
+    def add_error(self, error):
+        key = f"{type(error).__name__}: {error}"[:200]
+        with self._lock:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+
+def run(url, devices=100, rounds=1, concurrency=20, parameter_count=100,
+        vendors=('huawei', 'zte'), serial_prefix='SIM', timeout=30, seed=0):
+    """Simulate ``devices`` CPEs, each running ``rounds`` sessions, ``concurrency`` at a time.
+
+    The first session of every CPE is a BOOTSTRAP/BOOT Inform, so round one
+    behaves like a boot storm; later rounds are periodic Informs.
+    """
+    cpes = [
+        VirtualCPE(
+            vendors[index % len(vendors)], f'{serial_prefix}{index:08d}', parameter_count,
+            seed=seed * 1000003 + index,
+        )
+        for index in range(devices)
+    ]
+    result = SimulationResult()
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+    def session(cpe, events):
+        try:
+            result.add(*cpe.run_session(url, events, timeout))
+        except Exception as e:
+            result.add_error(e)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for round_number in range(rounds):
+            events = ('0 BOOTSTRAP', '1 BOOT') if round_number == 0 else ('2 PERIODIC',)
+            list(pool.map(lambda cpe: session(cpe, events), cpes))
+    duration = time.perf_counter() - started
+
+    sessions = len(result.session_latencies)
+    return {
+        'url': url,
+        'started_at': started_at,
+        'config': {
+            'devices': devices, 'rounds': rounds, 'concurrency': concurrency,
+            'parameters': parameter_count, 'vendors': list(vendors),
+        },
+        'duration_seconds': round(duration, 3),
+        'sessions': sessions,
+        'requests': result.requests,
+        'errors': sum(result.errors.values()),
+        'error_kinds': result.errors,
+        'informs_per_second': round(sessions / duration, 2) if duration else None,
+        'requests_per_second': round(result.requests / duration, 2) if duration else None,
+        'inform_latency_ms': percentiles(result.inform_latencies),
+        'session_latency_ms': percentiles(result.session_latencies),
+    }
@@ -0,0 +1,156 @@
+"""
+CWMP Response Builder
+Fills precompiled SOAP envelope templates and returns UTF-8 bytes
+"""
+
+import uuid
+from functools import lru_cache
+
+SOAP_ENV = "http://schemas.xmlsoap.org/soap/envelope/"
+SOAP_ENC = "http://schemas.xmlsoap.org/soap/encoding/"
+CWMP_NS = "urn:dslforum-org:cwmp-1-0"
+
+_ENVELOPE_OPEN = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    f'<soap:Envelope xmlns:soap="{SOAP_ENV}" xmlns:soap-enc="{SOAP_ENC}" '
+    'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    f'xmlns:cwmp="{CWMP_NS}">'
+).encode('utf-8')
+_HEADER_OPEN = b'<soap:Header><cwmp:ID soap:mustUnderstand="1">'
+_HEADER_CLOSE = b'</cwmp:ID></soap:Header>'
+_BODY_OPEN = b'<soap:Body>'
+_ENVELOPE_CLOSE = b'</soap:Body></soap:Envelope>'
+
+EMPTY_ENVELOPE = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    f'<soap:Envelope xmlns:soap="{SOAP_ENV}"><soap:Body></soap:Body></soap:Envelope>'
+).encode('utf-8')
+
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+
+_XSD_TYPES = (
+    (bool, 'xsd:boolean'),
+    (int, 'xsd:int'),
+)
+
+
+def escape(value):
+    """Escape a value for use as element text or attribute value, as bytes"""
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    return str(value).translate(_TEXT_ESCAPES).encode('utf-8')
+
+
+def xsd_type(value):
+    """xsi:type for a SetParameterValues value"""
+    for python_type, name in _XSD_TYPES:
+        if isinstance(value, python_type):
+            return name
+    return 'xsd:string'
+
+
+def new_cwmp_id():
+    return uuid.uuid4().hex
+
+
+def envelope(body, cwmp_id=None):
+    """Wrap an already-serialized RPC body in a SOAP envelope"""
+    if cwmp_id is None:
+        return b''.join((_ENVELOPE_OPEN, _BODY_OPEN, body, _ENVELOPE_CLOSE))
+    return b''.join((
+        _ENVELOPE_OPEN, _HEADER_OPEN, escape(cwmp_id), _HEADER_CLOSE,
+        _BODY_OPEN, body, _ENVELOPE_CLOSE,
+    ))
+
+
+@lru_cache(maxsize=8)
+def _inform_response_parts(max_envelopes):
+    """InformResponse envelope split around the cwmp:ID, and without a header"""
+    body = (
+        b'<cwmp:InformResponse><MaxEnvelopes>%d</MaxEnvelopes></cwmp:InformResponse>'
+        % max_envelopes
+    )
+    return (
+        _ENVELOPE_OPEN + _HEADER_OPEN,
+        b''.join((_HEADER_CLOSE, _BODY_OPEN, body, _ENVELOPE_CLOSE)),
+        envelope(body),
+    )
+
+
+def inform_response(max_envelopes=1, cwmp_id=None):
+    """InformResponse; only the echoed cwmp:ID is filled in per call"""
+    head, tail, without_id = _inform_response_parts(max_envelopes)
+    if cwmp_id is None:
+        return without_id
+    return b''.join((head, escape(cwmp_id), tail))
+
+
+def get_parameter_values(parameter_names, cwmp_id=None):
+    """GetParameterValues request"""
+    names = [b'<string>%s</string>' % escape(name) for name in parameter_names]
+    body = b''.join((
+        b'<cwmp:GetParameterValues>'
+        b'<ParameterNames soap-enc:arrayType="xsd:string[%d]">' % len(names),
+        *names,
+        b'</ParameterNames></cwmp:GetParameterValues>',
+    ))
+    return envelope(body, cwmp_id or new_cwmp_id())
+
+
+def set_parameter_values(parameters, parameter_key=None, cwmp_id=None):
+    """SetParameterValues request for a {name: value} mapping"""
+    structs = [
+        b'<ParameterValueStruct><Name>%s</Name><Value xsi:type="%s">%s</Value>'
+        b'</ParameterValueStruct>' % (escape(name), xsd_type(value).encode(), escape(value))
+        for name, value in parameters.items()
+    ]
+    if parameter_key is None:
+        parameter_key = new_cwmp_id()
+    body = b''.join((
+        b'<cwmp:SetParameterValues>'
+        b'<ParameterList soap-enc:arrayType="cwmp:ParameterValueStruct[%d]">' % len(structs),
+        *structs,
+        b'</ParameterList><ParameterKey>%s</ParameterKey>'
+        b'</cwmp:SetParameterValues>' % escape(parameter_key),
+    ))
+    return envelope(body, cwmp_id or new_cwmp_id())
+
+
+def reboot(command_key='', cwmp_id=None):
+    """Reboot request"""
+    body = b'<cwmp:Reboot><CommandKey>%s</CommandKey></cwmp:Reboot>' % escape(command_key)
+    return envelope(body, cwmp_id or new_cwmp_id())
+
+
+def factory_reset(cwmp_id=None):
+    """FactoryReset request"""
+    return envelope(b'<cwmp:FactoryReset></cwmp:FactoryReset>', cwmp_id or new_cwmp_id())
+
+
+def download(command_key, file_type, url, file_size=0, target_file_name='',
+             username='', password='', delay_seconds=0, cwmp_id=None):
+    """Download request"""
+    body = (
+        b'<cwmp:Download><CommandKey>%s</CommandKey><FileType>%s</FileType><URL>%s</URL>'
+        b'<Username>%s</Username><Password>%s</Password><FileSize>%d</FileSize>'
+        b'<TargetFileName>%s</TargetFileName><DelaySeconds>%d</DelaySeconds>'
+        b'<SuccessURL></SuccessURL><FailureURL></FailureURL></cwmp:Download>'
+        % (escape(command_key), escape(file_type), escape(url), escape(username),
+           escape(password), file_size, escape(target_file_name), delay_seconds)
+    )
+    return envelope(body, cwmp_id or new_cwmp_id())
+
+
+def transfer_complete_response(cwmp_id=None):
+    """TransferCompleteResponse, acknowledging a CPE's TransferComplete"""
+    return envelope(b'<cwmp:TransferCompleteResponse></cwmp:TransferCompleteResponse>', cwmp_id)
+
+
+def soap_fault(fault_code, fault_string):
+    """SOAP Fault response"""
+    body = (
+        b'<soap:Fault><faultcode>%s</faultcode><faultstring>%s</faultstring></soap:Fault>'
+        % (escape(fault_code), escape(fault_string))
+    )
+    return envelope(body)
@@ -0,0 +1,22 @@
+"""
+SQLite Backend
+Django's SQLite backend with transactions that can take the write lock up front.
+
+A transaction started with a plain BEGIN reads under a shared lock and
+asks for the write lock at its first write. If another connection wrote
+in between, SQLite cannot wait for it without deadlocking and fails the
+transaction with "database is locked" at once, ignoring the busy timeout.
+Blocks that read and then write (``acs.routers.atomic_write()``) start
+with BEGIN IMMEDIATE instead, which queues on the busy timeout; every
+other transaction, read-only ones included, keeps the deferred BEGIN.
+"""
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Set by acs.routers.atomic_write() around the BEGIN of its block
+    begin_immediate = False
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE" if self.begin_immediate else "BEGIN")
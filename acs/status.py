@@ -0,0 +1,147 @@
+"""
+Live Device Status
+Serializes device status rows and pushes coalesced changes to dashboard WebSockets
+"""
+
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+STATUS_FIELDS = (
+    'id', 'device_id', 'manufacturer', 'model_name', 'is_online', 'last_inform', 'ip_address',
+)
+STATUS_GROUP = 'acs-device-status'
+
+DEFAULT_BROADCAST_INTERVAL = 1.0
+BROADCAST_CHUNK = 500
+IN_MEMORY_LAYER = 'channels.layers.InMemoryChannelLayer'
+
+
+def status_row(device):
+    """JSON-ready status for a ``values(*STATUS_FIELDS)`` row"""
+    return {
+        'id': device['id'],
+        'device_id': device['device_id'],
+        'manufacturer': device['manufacturer'],
+        'model_name': device['model_name'],
+        'is_online': device['is_online'],
+        'last_inform': device['last_inform'].isoformat() if device['last_inform'] else None,
+        'ip_address': device['ip_address'],
+    }
+
+
+class StatusBroadcaster:
+    """Collect changed device pks and publish their status in batches
+
+    Changes to the same device within one interval are coalesced: the flush
+    reads the current rows once and sends one group message per chunk, so
+    subscribers see the latest state no matter how often a device informed.
+    
+    Pushes need a cross-process channel layer (CHANNEL_REDIS_URL): Informs
+    are handled by WSGI or other ASGI workers than the one holding a given
+    socket. With the in-memory layer nothing is collected, and the
+    dashboard polls instead.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval if interval is not None else getattr(
+            settings, 'ACS_STATUS_BROADCAST_INTERVAL', DEFAULT_BROADCAST_INTERVAL)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._timer = None
+        self._loop = None
+        backend = getattr(settings, 'CHANNEL_LAYERS', {}).get('default', {}).get('BACKEND')
+        self.active = bool(backend) and backend != IN_MEMORY_LAYER
+
+    def bind_loop(self, loop):
+        """Send through the event loop serving the WebSockets in this process
+
+        The in-memory channel layer only wakes consumers from their own loop.
+        """
+        self._loop = loop
+
+    def changed(self, device_pks):
+        """Schedule the given devices for the next flush"""
+        if not self.active:
+            return
+        with self._lock:
+            self._pending.update(device_pks)
+            if not self._pending or self._timer is not None:
+                return
+            self._timer = threading.Timer(self.interval, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Device status broadcast failed: {e}")
+        finally:
+            connection.close()
+
+    def _send(self, layer, message):
+        from asgiref.sync import async_to_sync
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            async_to_sync(layer.group_send)(STATUS_GROUP, message)
+            return
+        future = asyncio.run_coroutine_threadsafe(layer.group_send(STATUS_GROUP, message), loop)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not loop:
+            future.result(timeout=10)
+
+    def flush(self):
+        """Publish every pending device now; returns the number of devices sent"""
+        from channels.layers import get_channel_layer
+        from .models import DeviceInform
+
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+
+        layer = get_channel_layer()
+        if layer is None:
+            return 0
+
+        pending = sorted(pending)
+        sent = 0
+        for start in range(0, len(pending), BROADCAST_CHUNK):
+            devices = [
+                status_row(row) for row in DeviceInform.objects.filter(
+                    id__in=pending[start:start + BROADCAST_CHUNK]
+                ).values(*STATUS_FIELDS)
+            ]
+            if devices:
+                self._send(layer, {'type': 'device.status', 'devices': devices})
+                sent += len(devices)
+        return sent
+
+
+broadcaster = StatusBroadcaster()
+
+
+def publish(device_pks):
+    """Queue a status push for these devices once the current transaction commits"""
+    if not broadcaster.active:
+        return
+    device_pks = list(device_pks)
+    if device_pks:
+        transaction.on_commit(lambda: broadcaster.changed(device_pks))
+
+
+def flush():
+    return broadcaster.flush()
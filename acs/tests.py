@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import re
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import AsyncRequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from acs.connreq import ConnectionRequestDispatcher, challenge_cache
+from acs.firmware import RangeNotSatisfiable, parse_range
+from acs.parser import parse_message
+from acs.profiling import CaptureStore, ProfilingMiddleware
+from acs.simulator import VirtualCPE
+from acs.tr069 import AsyncTR069ACSView
+
+USERNAME = 'acs'
+PASSWORD = 'secret'
+REALM = 'cpe'
+
+
+def md5(data):
+    return hashlib.md5(data.encode()).hexdigest()
+
+
+class StubCPEHandler(BaseHTTPRequestHandler):
+    """Connection request endpoint answering with a Digest challenge like a CPE"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if self.authorized(self.headers.get('Authorization', '')):
+            self.send_response(204)
+            self.end_headers()
+            return
+        server.challenges += 1
+        self.send_response(401)
+        self.send_header(
+            'WWW-Authenticate', f'Digest realm="{REALM}", nonce="{server.nonce}", qop="auth", algorithm=MD5'
+        )
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def authorized(self, header):
+        if not header.startswith('Digest '):
+            return False
+        params = dict(re.findall(r'(\w+)="?([^",]*)"?', header))
+        if params.get('nonce') != self.server.nonce:
+            return False
+        ha1 = md5(f"{USERNAME}:{REALM}:{PASSWORD}")
+        ha2 = md5(f"GET:{params['uri']}")
+        expected = md5(f"{ha1}:{params['nonce']}:{params['nc']}:{params['cnonce']}:auth:{ha2}")
+        return params.get('response') == expected
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ConnectionRequestDigestTests(SimpleTestCase):
+    def setUp(self):
+        challenge_cache.clear()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCPEHandler)
+        self.server.nonce = 'nonce-1'
+        self.server.requests = 0
+        self.server.challenges = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/cr"
+        self.dispatcher = ConnectionRequestDispatcher(username=USERNAME, password=PASSWORD, attempts=1)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        challenge_cache.clear()
+
+    def wake(self):
+        [result] = asyncio.run(self.dispatcher.dispatch([(1, self.url)]))
+        return result
+
+    def test_second_wake_reuses_the_nonce(self):
+        self.assertTrue(self.wake().ok)
+        self.assertEqual((self.server.requests, self.server.challenges), (2, 1))
+
+        self.assertTrue(self.wake().ok)
+        self.assertEqual((self.server.requests, self.server.challenges), (3, 1))
+
+    def test_new_nonce_is_answered(self):
+        self.assertTrue(self.wake().ok)
+        self.server.nonce = 'nonce-2'
+
+        self.assertTrue(self.wake().ok)
+        self.assertEqual(self.server.challenges, 2)
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-200', 100), (0, 99))
+        self.assertEqual(parse_range('bytes=5-5', 100), (5, 5))
+
+    def test_ignored_headers(self):
+        for header in ('', 'bytes=5-3', 'bytes=-', 'bytes=0-1,5-6', 'items=0-9'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 100))
+
+    def test_unsatisfiable(self):
+        for header in ('bytes=100-', 'bytes=150-160', 'bytes=-0'):
+            with self.subTest(header=header):
+                with self.assertRaises(RangeNotSatisfiable):
+                    parse_range(header, 100)
+
+
+SET_PARAMETER_VALUES_FAULT = b"""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:cwmp="urn:dslforum-org:cwmp-1-0">
+  <soap:Header><cwmp:ID soap:mustUnderstand="1">7-abc</cwmp:ID></soap:Header>
+  <soap:Body><soap:Fault>
+    <faultcode>Client</faultcode><faultstring>CWMP fault</faultstring>
+    <detail><cwmp:Fault>
+      <FaultCode>9003</FaultCode><FaultString>Invalid arguments</FaultString>
+      <SetParameterValuesFault>
+        <ParameterName>InternetGatewayDevice.Time.Enable</ParameterName>
+        <FaultCode>9007</FaultCode><FaultString>Invalid parameter value</FaultString>
+      </SetParameterValuesFault>
+    </cwmp:Fault></detail>
+  </soap:Fault></soap:Body>
+</soap:Envelope>"""
+
+
+class ParserFaultTests(SimpleTestCase):
+    def test_parameter_faults_do_not_replace_the_rpc_fault(self):
+        fault = parse_message(SET_PARAMETER_VALUES_FAULT).fault
+        self.assertEqual((fault.code, fault.string), ('9003', 'Invalid arguments'))
+        [(name, parameter_fault)] = fault.parameter_faults.items()
+        self.assertEqual(name, 'InternetGatewayDevice.Time.Enable')
+        self.assertEqual((parameter_fault.code, parameter_fault.string), ('9007', 'Invalid parameter value'))
+
+
+class AsyncEndpointProfilingTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+
+    def test_capture_records_handler_queries(self):
+        with override_settings(ACS_PROFILE_SAMPLE_RATE=1.0, ACS_PROFILE_DIR=self.profile_dir.name):
+            middleware = ProfilingMiddleware(AsyncTR069ACSView.as_view())
+            self.assertTrue(asyncio.iscoroutinefunction(middleware))
+            body = VirtualCPE('huawei', 'PROF0001', 10).inform(['1 BOOT'])
+            request = AsyncRequestFactory().post(
+                reverse('acs:tr069_endpoint'), body, content_type='text/xml'
+            )
+            response = asyncio.run(middleware(request))
+
+            self.assertEqual(response.status_code, 200)
+            [capture] = CaptureStore().all()
+        self.assertGreater(capture['query_count'], 0)
+        self.assertIn('handle_request', capture['profile'])
@@ -3,22 +3,38 @@ TR-069 Protocol Handler
 Handles SOAP-based communication with CPE devices
 """
 
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
-import uuid
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import secrets
+import threading
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
 from django.http import HttpResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
 import logging
 
+from . import firmware, metrics, profiling, sessions, soap
+from . import ingest
+from .ingest import InformJob, InformWriter, determine_value_type
+from .parser import (
+    DEFAULT_MAX_BODY_BYTES, CwmpLimitExceeded, CwmpParseError, parse_message,
+)
+
 logger = logging.getLogger(__name__)
 
+# Task types the ACS can turn into an RPC, and the CPE responses it consumes
+SUPPORTED_TASK_TYPES = ('GetParameterValues', 'SetParameterValues', 'Reboot', 'FactoryReset', 'Download')
+RPC_RESPONSES = frozenset(f"{task_type}Response" for task_type in SUPPORTED_TASK_TYPES)
+TASK_CLAIM_BATCH = 5
+DEFAULT_ASYNC_DB_THREADS = 16
+
 # TR-069 SOAP Namespaces
-SOAP_ENV = "http://schemas.xmlsoap.org/soap/envelope/"
-SOAP_ENC = "http://schemas.xmlsoap.org/soap/encoding/"
-CWMP_NS = "urn:dslforum-org:cwmp-1-0"
+SOAP_ENV = soap.SOAP_ENV
+SOAP_ENC = soap.SOAP_ENC
+CWMP_NS = soap.CWMP_NS
 
 class TR069Handler:
     """Handle TR-069 SOAP messages"""
@@ -27,140 +43,157 @@ class TR069Handler:
         self.session_id = None
         self.device_id = None
         
+    def parse_message(self, xml_data):
+        """Parse any CWMP message into a CwmpMessage (None for an empty body)"""
+        return parse_message(xml_data)
+    
     def parse_inform(self, xml_data):
         """Parse CWMP Inform message"""
         try:
-            root = ET.fromstring(xml_data)
-            
-            # Find Inform element
-            inform = root.find('.//ns:Inform', {'ns': CWMP_NS})
-            if inform is None:
-                return None
-                
-            device_id = inform.find('.//DeviceId', {'ns': CWMP_NS})
-            event_struct = inform.find('.//Event', {'ns': CWMP_NS})
-            param_list = inform.find('.//ParameterList', {'ns': CWMP_NS})
-            
-            # Extract device information
-            device_info = {}
-            if device_id is not None:
-                for child in device_id:
-                    device_info[child.tag] = child.text
-                    
-            # Extract events
-            events = []
-            if event_struct is not None:
-                for event in event_struct.findall('.//EventStruct'):
-                    event_code = event.find('EventCode')
-                    command_key = event.find('CommandKey')
-                    events.append({
-                        'EventCode': event_code.text if event_code is not None else '',
-                        'CommandKey': command_key.text if command_key is not None else ''
-                    })
-            
-            # Extract parameters
-            parameters = {}
-            if param_list is not None:
-                for param in param_list.findall('.//ParameterValueStruct'):
-                    name = param.find('Name')
-                    value = param.find('Value')
-                    if name is not None and value is not None:
-                        parameters[name.text] = value.text
-                        
-            return {
-                'device_info': device_info,
-                'events': events,
-                'parameters': parameters
-            }
-            
-        except ET.ParseError as e:
+            message = self.parse_message(xml_data)
+        except CwmpLimitExceeded:
+            raise
+        except CwmpParseError as e:
             logger.error(f"XML Parse Error: {e}")
             return None
+        
+        if message is None or not message.is_inform:
+            return None
+        return message
     
-    def create_inform_response(self, max_envelopes=1):
+    def create_inform_response(self, max_envelopes=1, cwmp_id=None):
         """Create InformResponse SOAP message"""
-        envelope = ET.Element("{%s}Envelope" % SOAP_ENV)
-        envelope.set("xmlns:soap", SOAP_ENV)
-        envelope.set("xmlns:cwmp", CWMP_NS)
-        
-        header = ET.SubElement(envelope, "{%s}Header" % SOAP_ENV)
-        body = ET.SubElement(envelope, "{%s}Body" % SOAP_ENV)
-        
-        inform_response = ET.SubElement(body, "{%s}InformResponse" % CWMP_NS)
-        max_env = ET.SubElement(inform_response, "MaxEnvelopes")
-        max_env.text = str(max_envelopes)
-        
-        return self._prettify_xml(envelope)
+        return soap.inform_response(max_envelopes, cwmp_id)
     
-    def create_get_parameter_values(self, parameter_names):
+    def create_get_parameter_values(self, parameter_names, cwmp_id=None):
         """Create GetParameterValues SOAP message"""
-        envelope = ET.Element("{%s}Envelope" % SOAP_ENV)
-        envelope.set("xmlns:soap", SOAP_ENV)
-        envelope.set("xmlns:cwmp", CWMP_NS)
-        
-        header = ET.SubElement(envelope, "{%s}Header" % SOAP_ENV)
-        id_elem = ET.SubElement(header, "{%s}ID" % CWMP_NS)
-        id_elem.text = str(uuid.uuid4())
-        
-        body = ET.SubElement(envelope, "{%s}Body" % SOAP_ENV)
-        get_param = ET.SubElement(body, "{%s}GetParameterValues" % CWMP_NS)
-        
-        param_names = ET.SubElement(get_param, "ParameterNames")
-        for name in parameter_names:
-            param = ET.SubElement(param_names, "string")
-            param.text = name
-            
-        return self._prettify_xml(envelope)
+        return soap.get_parameter_values(parameter_names, cwmp_id=cwmp_id)
     
-    def create_set_parameter_values(self, parameters):
+    def create_set_parameter_values(self, parameters, cwmp_id=None):
         """Create SetParameterValues SOAP message"""
-        envelope = ET.Element("{%s}Envelope" % SOAP_ENV)
-        envelope.set("xmlns:soap", SOAP_ENV)
-        envelope.set("xmlns:cwmp", CWMP_NS)
-        
-        header = ET.SubElement(envelope, "{%s}Header" % SOAP_ENV)
-        id_elem = ET.SubElement(header, "{%s}ID" % CWMP_NS)
-        id_elem.text = str(uuid.uuid4())
-        
-        body = ET.SubElement(envelope, "{%s}Body" % SOAP_ENV)
-        set_param = ET.SubElement(body, "{%s}SetParameterValues" % CWMP_NS)
-        
-        param_list = ET.SubElement(set_param, "ParameterList")
-        for name, value in parameters.items():
-            param_struct = ET.SubElement(param_list, "ParameterValueStruct")
-            name_elem = ET.SubElement(param_struct, "Name")
-            name_elem.text = name
-            value_elem = ET.SubElement(param_struct, "Value")
-            value_elem.text = str(value)
-            
-        param_key = ET.SubElement(set_param, "ParameterKey")
-        param_key.text = str(uuid.uuid4())
-        
-        return self._prettify_xml(envelope)
+        return soap.set_parameter_values(parameters, cwmp_id=cwmp_id)
     
-    def create_reboot(self, command_key=""):
+    def create_reboot(self, command_key="", cwmp_id=None):
         """Create Reboot SOAP message"""
-        envelope = ET.Element("{%s}Envelope" % SOAP_ENV)
-        envelope.set("xmlns:soap", SOAP_ENV)
-        envelope.set("xmlns:cwmp", CWMP_NS)
-        
-        header = ET.SubElement(envelope, "{%s}Header" % SOAP_ENV)
-        id_elem = ET.SubElement(header, "{%s}ID" % CWMP_NS)
-        id_elem.text = str(uuid.uuid4())
-        
-        body = ET.SubElement(envelope, "{%s}Body" % SOAP_ENV)
-        reboot = ET.SubElement(body, "{%s}Reboot" % CWMP_NS)
-        
-        cmd_key = ET.SubElement(reboot, "CommandKey")
-        cmd_key.text = command_key
-        
-        return self._prettify_xml(envelope)
+        return soap.reboot(command_key, cwmp_id=cwmp_id)
+    
+    def create_factory_reset(self, cwmp_id=None):
+        """Create FactoryReset SOAP message"""
+        return soap.factory_reset(cwmp_id=cwmp_id)
     
-    def _prettify_xml(self, element):
-        """Return a pretty-printed XML string"""
-        rough_string = ET.tostring(element, 'unicode')
-        reparsed = minidom.parseString(rough_string)
-        return reparsed.toprettyxml(indent="  ")
+    def create_download(self, task, base_url, cwmp_id=None):
+        """Create Download SOAP message for a task's firmware image"""
+        image = task.firmware_image
+        if image is None:
+            raise ValueError("Download task has no firmware image")
+        params = task.parameters or {}
+        return soap.download(
+            firmware.command_key(task), image.file_type, firmware.download_url(task, base_url),
+            file_size=image.size, target_file_name=params.get('target_file_name', ''),
+            delay_seconds=int(params.get('delay_seconds', 0)), cwmp_id=cwmp_id,
+        )
+    
+    def create_transfer_complete_response(self, cwmp_id=None):
+        """Create TransferCompleteResponse SOAP message"""
+        return soap.transfer_complete_response(cwmp_id)
+    
+    def create_task_request(self, task, cwmp_id, base_url=''):
+        """Create the ACS request for a queued DeviceTask"""
+        params = task.parameters or {}
+        if task.task_type == 'GetParameterValues':
+            return self.create_get_parameter_values(params.get('parameter_names', []), cwmp_id)
+        if task.task_type == 'SetParameterValues':
+            return self.create_set_parameter_values(params.get('parameters', {}), cwmp_id)
+        if task.task_type == 'Reboot':
+            return self.create_reboot(params.get('command_key', ''), cwmp_id)
+        if task.task_type == 'FactoryReset':
+            return self.create_factory_reset(cwmp_id)
+        if task.task_type == 'Download':
+            return self.create_download(task, base_url, cwmp_id)
+        raise ValueError(f"Unsupported task type: {task.task_type}")
+
+
+class CwmpSession:
+    """CWMP session state carried across the HTTP POSTs of one CPE session
+    
+    A session moves ``idle`` -> ``informed`` on Inform, then alternates
+    ``informed`` -> ``awaiting`` while ACS requests for queued tasks are
+    outstanding, and returns to ``idle`` when the ACS ends it. The state is
+    kept in an ``acs.sessions`` store under the session cookie, encoded as
+    ``state|device|task|cwmp_id``.
+    """
+    
+    IDLE = 'idle'
+    INFORMED = 'informed'
+    AWAITING = 'awaiting'
+    STATE_CODES = {INFORMED: 'i', AWAITING: 'a'}
+    CODE_STATES = {code: state for state, code in STATE_CODES.items()}
+    
+    def __init__(self, store, session_id=None):
+        self.store = store
+        self.session_id = session_id
+        self.state = self.IDLE
+        self.device_pk = self.task_id = self.cwmp_id = None
+        self._saved = store.load(session_id, sessions.session_ttl()) if session_id else None
+        if self._saved:
+            self.decode(self._saved)
+    
+    def decode(self, data):
+        try:
+            state, device, task, cwmp_id = data.split('|', 3)
+            self.state = self.CODE_STATES[state]
+            self.device_pk = int(device) if device else None
+            self.task_id = int(task) if task else None
+            self.cwmp_id = cwmp_id or None
+        except (KeyError, ValueError):
+            logger.warning(f"Discarding malformed CWMP session {self.session_id}")
+            self.state = self.IDLE
+            self.device_pk = self.task_id = self.cwmp_id = None
+    
+    def encode(self):
+        return '|'.join((
+            self.STATE_CODES[self.state],
+            str(self.device_pk or ''),
+            str(self.task_id or ''),
+            self.cwmp_id or '',
+        ))
+    
+    def begin(self, device_pk):
+        """Start a new session for an Inform, under a fresh session id"""
+        if self.session_id and self._saved:
+            self.store.delete(self.session_id)
+        self.session_id = secrets.token_urlsafe(18)
+        self._saved = None
+        self.state = self.INFORMED
+        self.device_pk = device_pk
+        self.task_id = None
+        self.cwmp_id = None
+        self.save()
+    
+    def await_response(self, task_id, cwmp_id):
+        self.state = self.AWAITING
+        self.task_id = task_id
+        self.cwmp_id = cwmp_id
+        self.save()
+    
+    def response_received(self):
+        self.state = self.INFORMED
+        self.task_id = None
+        self.cwmp_id = None
+        self.save()
+    
+    def end(self):
+        self.state = self.IDLE
+        self.device_pk = self.task_id = self.cwmp_id = None
+        if self.session_id and self._saved:
+            self.store.delete(self.session_id)
+        self._saved = None
+    
+    def save(self):
+        data = self.encode()
+        if data != self._saved:
+            self.store.save(self.session_id, data, sessions.session_ttl())
+            self._saved = data
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -172,123 +205,325 @@ class TR069ACSView(View):
         self.tr069_handler = TR069Handler()
     
     def post(self, request):
-        """Handle TR-069 SOAP requests"""
+        """Handle TR-069 SOAP requests, recording request metrics"""
+        with metrics.RequestMetrics() as observed, profiling.recording():
+            response = self.handle_request(request, observed)
+            observed.status = response.status_code
+        return response
+    
+    def handle_request(self, request, observed):
+        """Answer one CWMP POST"""
         try:
             # Get client IP
             client_ip = self.get_client_ip(request)
             
+            # Reject oversized bodies before reading them
+            max_body = getattr(settings, 'ACS_MAX_BODY_BYTES', DEFAULT_MAX_BODY_BYTES)
+            if int(request.META.get('CONTENT_LENGTH') or 0) > max_body:
+                return self.limit_exceeded_response(f"Request body exceeds {max_body} bytes")
+            
             # Parse SOAP content
-            soap_data = request.body.decode('utf-8')
+            soap_data = request.body
             logger.info(f"Received TR-069 request from {client_ip}")
-            logger.debug(f"SOAP Data: {soap_data}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"SOAP Data: {soap_data}")
+            
+            # Parse CWMP message
+            try:
+                with metrics.stage('parse'):
+                    message = self.tr069_handler.parse_message(soap_data)
+            except CwmpLimitExceeded as e:
+                logger.warning(f"Rejected TR-069 request from {client_ip}: {e}")
+                return self.limit_exceeded_response(str(e))
+            except CwmpParseError as e:
+                logger.error(f"XML Parse Error: {e}")
+                return self.end_session_response(self.load_session(request))
             
-            # Parse Inform message
-            parsed_data = self.tr069_handler.parse_inform(soap_data)
+            session = self.load_session(request)
+            observed.message = self.metrics_label(message)
             
-            if parsed_data:
+            if message is not None and message.is_inform:
+                metrics.inform_received(message)
+                
                 # Handle device discovery
-                self.handle_device_discovery(parsed_data, client_ip, request)
+                device_pk = self.handle_device_discovery(message, client_ip, request)
+                if device_pk is not None:
+                    session.begin(device_pk)
+                else:
+                    session.end()
                 
                 # Create InformResponse
-                response_xml = self.tr069_handler.create_inform_response()
+                with metrics.stage('response_build'):
+                    response_xml = self.tr069_handler.create_inform_response(
+                        cwmp_id=message.cwmp_id
+                    )
                 
-                return HttpResponse(
-                    response_xml.encode('utf-8'),
+                response = HttpResponse(
+                    response_xml,
                     content_type='text/xml; charset=utf-8',
                     status=200
                 )
+                if session.state != CwmpSession.IDLE:
+                    # No max-age: the store's TTL, restarted by every request, bounds the session
+                    response.set_cookie(sessions.cookie_name(), session.session_id, path=request.path, httponly=True)
+                return response
             else:
                 # Handle other SOAP messages (responses, etc.)
-                return self.handle_other_soap_messages(soap_data, request)
+                return self.handle_other_soap_messages(message, session)
                 
         except Exception as e:
             logger.error(f"TR-069 Handler Error: {e}")
             return HttpResponse(
-                self.create_soap_fault("Server", str(e)).encode('utf-8'),
+                self.create_soap_fault("Server", str(e)),
                 content_type='text/xml; charset=utf-8',
                 status=500
             )
     
+    def load_session(self, request):
+        """The CWMP session named by the request's session cookie"""
+        return CwmpSession(sessions.get_store(), request.COOKIES.get(sessions.cookie_name()))
+    
+    def metrics_label(self, message):
+        """Bounded ``message`` label for the request metrics"""
+        if message is None:
+            return 'empty'
+        if message.is_inform or message.rpc in RPC_RESPONSES or message.rpc in ('Fault', 'TransferComplete'):
+            return message.rpc
+        return 'other'
+    
+    def limit_exceeded_response(self, message):
+        """SOAP Fault for bodies over the configured size/parameter caps"""
+        return HttpResponse(
+            self.create_soap_fault("Client", message),
+            content_type='text/xml; charset=utf-8',
+            status=413
+        )
+    
     def handle_device_discovery(self, parsed_data, client_ip, request):
-        """Handle automatic device discovery"""
-        from .models import DeviceInform, DeviceParameter
-        
-        device_info = parsed_data.get('device_info', {})
-        parameters = parsed_data.get('parameters', {})
-        
-        # Extract key information
-        oui = device_info.get('OUI', '')
-        serial_number = device_info.get('SerialNumber', '')
-        product_class = device_info.get('ProductClass', '')
-        manufacturer = device_info.get('Manufacturer', '')
+        """Handle automatic device discovery
         
-        if not serial_number:
+        Writes the Inform inline and returns the device pk, or None when the
+        Inform carries no serial number.
+        """
+        job = InformJob.from_message(parsed_data, client_ip)
+        if not job.serial_number:
             logger.warning("No serial number in device info")
-            return
-            
-        device_id = f"{oui}-{serial_number}"
+            return None
         
-        # Create or update device record
-        device_inform, created = DeviceInform.objects.get_or_create(
-            oui=oui,
-            serial_number=serial_number,
-            defaults={
-                'device_id': device_id,
-                'product_class': product_class,
-                'manufacturer': manufacturer,
-                'model_name': device_info.get('ModelName', ''),
-                'software_version': device_info.get('SoftwareVersion', ''),
-                'hardware_version': device_info.get('HardwareVersion', ''),
-                'ip_address': client_ip,
-                'is_online': True,
-                'auto_discovered': True
-            }
-        )
+        # Known devices can be written behind the response when a queue is configured
+        device_pk = ingest.submit(job)
+        if device_pk is None:
+            device_pk = InformWriter().write([job])[job.key]
+        return device_pk
+    
+    def handle_other_soap_messages(self, message, session):
+        """Handle non-Inform SOAP messages
+        
+        Consumes the response to the outstanding task request, if any, then
+        answers with the device's next pending task or ends the session.
+        """
+        if message is not None and message.rpc == 'TransferComplete':
+            # A CPE request, sent before it lets the ACS issue requests
+            self.transfer_complete(session, message)
+            return HttpResponse(
+                self.tr069_handler.create_transfer_complete_response(message.cwmp_id),
+                content_type='text/xml; charset=utf-8',
+                status=200
+            )
         
-        if not created:
-            # Update existing device
-            device_inform.ip_address = client_ip
-            device_inform.is_online = True
-            device_inform.save()
+        if session.state == CwmpSession.IDLE:
+            # No Inform has opened a session, so there is nothing to send
+            return self.end_session_response(session)
         
-        # Auto-create ONU record if new device
-        if created:
-            device_inform.create_onu_record()
-            logger.info(f"Auto-discovered new device: {device_id}")
+        if session.state == CwmpSession.AWAITING:
+            if message is None:
+                self.fail_task(session, "CPE sent an empty request instead of a response")
+            elif message.rpc in RPC_RESPONSES or message.rpc == 'Fault':
+                self.complete_task(session, message)
+            else:
+                logger.warning(f"Unexpected {message.rpc} while awaiting task {session.task_id}")
+        elif message is not None:
+            logger.warning(f"Ignoring unsupported CPE request {message.rpc}")
         
-        # Store/update parameters
-        for param_name, param_value in parameters.items():
-            DeviceParameter.objects.update_or_create(
-                device_inform=device_inform,
-                parameter_name=param_name,
-                defaults={
-                    'parameter_value': param_value,
-                    'value_type': self.determine_value_type(param_value)
-                }
-            )
+        return self.send_next_task(session)
     
-    def handle_other_soap_messages(self, soap_data, request):
-        """Handle non-Inform SOAP messages"""
-        # For now, return empty response
-        # This can be expanded to handle GetParameterValuesResponse, etc.
+    def send_next_task(self, session):
+        """Send the oldest pending task for the session's device"""
+        task = self.claim_next_task(session.device_pk)
+        if task is None:
+            return self.end_session_response(session)
+        
+        cwmp_id = f"{task.pk}-{soap.new_cwmp_id()[:8]}"
+        try:
+            with metrics.stage('response_build'):
+                request_xml = self.tr069_handler.create_task_request(
+                    task, cwmp_id, base_url=self.request.build_absolute_uri('/')
+                )
+        except ValueError as e:
+            self.close_task(task, 'failed', error_message=str(e))
+            return self.send_next_task(session)
         
+        session.await_response(task.pk, cwmp_id)
+        metrics.task_dispatched(task.task_type, 'sent')
+        logger.info(f"Sent {task.task_type} task {task.pk} to device {session.device_pk}")
         return HttpResponse(
-            '<?xml version="1.0" encoding="UTF-8"?><soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body></soap:Body></soap:Envelope>'.encode('utf-8'),
+            request_xml,
             content_type='text/xml; charset=utf-8',
             status=200
         )
     
+    def claim_next_task(self, device_pk):
+        """Atomically move the next pending task to ``sent`` and return it"""
+        from .models import DeviceTask
+        
+        pending = DeviceTask.objects.filter(
+            device_inform_id=device_pk,
+            status='pending',
+            task_type__in=SUPPORTED_TASK_TYPES,
+        ).select_related('firmware_image').order_by('created_at', 'id')
+        
+        for task in pending[:TASK_CLAIM_BATCH]:
+            if task.firmware_image is not None:
+                claimed = firmware.claim_download(task)
+                if not claimed and task.firmware_image.max_concurrent_downloads:
+                    # Left pending until a download of this image finishes
+                    metrics.task_dispatched(task.task_type, 'deferred')
+                    continue
+            else:
+                # Another worker serving the same CPE may have claimed it first
+                claimed = DeviceTask.objects.filter(pk=task.pk, status='pending').update(
+                    status='sent', sent_at=timezone.now()
+                )
+            if claimed:
+                task.status = 'sent'
+                return task
+        return None
+    
+    def complete_task(self, session, message):
+        """Record the CPE's response to the outstanding task"""
+        from .models import DeviceTask, DeviceParameter
+        
+        task_id = session.task_id
+        expected_id = session.cwmp_id
+        session.response_received()
+        
+        task = DeviceTask.objects.filter(pk=task_id).first()
+        if task is None:
+            return
+        
+        if message.cwmp_id and expected_id and message.cwmp_id != expected_id:
+            # The response belongs to some other request; the task's own answer never comes
+            logger.warning(f"Response ID {message.cwmp_id} does not match task {task_id}")
+            self.close_task(
+                task, 'failed',
+                error_message=f"Response ID {message.cwmp_id} does not match request ID {expected_id}",
+            )
+            return
+        
+        if message.rpc == 'Fault':
+            fault = message.fault
+            if fault is None:
+                self.close_task(task, 'failed', error_message="CWMP fault")
+                return
+            result = {'fault_code': fault.code, 'fault_string': fault.string}
+            error_message = f"CWMP fault {fault.code}: {fault.string}"
+            if fault.parameter_faults:
+                result['parameter_faults'] = {
+                    name: {'fault_code': item.code, 'fault_string': item.string}
+                    for name, item in fault.parameter_faults.items()
+                }
+                error_message += " (" + ", ".join(
+                    f"{name}: {item.code}" for name, item in fault.parameter_faults.items()
+                ) + ")"
+            self.close_task(task, 'failed', result=result, error_message=error_message)
+            return
+        
+        if message.rpc != f"{task.task_type}Response":
+            self.close_task(task, 'failed', error_message=f"Unexpected response {message.rpc}")
+            return
+        
+        result = {}
+        if task.task_type == 'GetParameterValues':
+            result['parameters'] = message.parameters
+            DeviceParameter.upsert_many({task.device_inform_id: {
+                name: (value, self.determine_value_type(value))
+                for name, value in message.parameters.items()
+            }})
+        elif task.task_type == 'SetParameterValues':
+            result['status'] = message.fields.get('Status', '')
+            DeviceParameter.upsert_many({task.device_inform_id: {
+                name: (str(value), self.determine_value_type(value))
+                for name, value in (task.parameters or {}).get('parameters', {}).items()
+            }})
+        elif task.task_type == 'Download':
+            result['status'] = message.fields.get('Status', '')
+            if result['status'] == '1':
+                # Accepted; the outcome arrives later in a TransferComplete
+                task.result = result
+                task.save(update_fields=['result'])
+                metrics.task_dispatched(task.task_type, 'accepted')
+                return
+        self.close_task(task, 'completed', result=result)
+    
+    def transfer_complete(self, session, message):
+        """Close the Download task a TransferComplete reports on"""
+        from .models import DeviceTask
+        
+        key = message.fields.get('CommandKey', '')
+        task_id = firmware.task_id_from_command_key(key)
+        tasks = DeviceTask.objects.filter(pk=task_id, task_type='Download', status='sent')
+        if session.device_pk is not None:
+            tasks = tasks.filter(device_inform_id=session.device_pk)
+        task = tasks.first() if task_id is not None else None
+        if task is None:
+            logger.warning(f"TransferComplete for unknown Download {key!r}")
+            return
+        
+        fault = message.fault
+        result = {
+            **(task.result or {}),
+            'start_time': message.fields.get('StartTime', ''),
+            'complete_time': message.fields.get('CompleteTime', ''),
+        }
+        if fault is not None and fault.code not in ('', '0'):
+            result.update(fault_code=fault.code, fault_string=fault.string)
+            self.close_task(
+                task, 'failed', result=result,
+                error_message=f"Transfer failed {fault.code}: {fault.string}",
+            )
+        else:
+            self.close_task(task, 'completed', result=result)
+    
+    def fail_task(self, session, error_message):
+        """Fail the outstanding task without a CPE response"""
+        from .models import DeviceTask
+        
+        task = DeviceTask.objects.filter(pk=session.task_id).first()
+        session.response_received()
+        if task is not None:
+            self.close_task(task, 'failed', error_message=error_message)
+    
+    def close_task(self, task, status, result=None, error_message=''):
+        task.status = status
+        task.result = result or {}
+        task.error_message = error_message
+        task.completed_at = timezone.now()
+        task.save(update_fields=['status', 'result', 'error_message', 'completed_at'])
+        metrics.task_dispatched(task.task_type, status)
+        logger.info(f"Task {task.pk} {task.task_type} {status}")
+    
+    def end_session_response(self, session):
+        """End the CWMP session with an empty HTTP response"""
+        had_cookie = session.session_id is not None
+        session.end()
+        response = HttpResponse(status=204)
+        if had_cookie:
+            response.delete_cookie(sessions.cookie_name(), path=self.request.path)
+        return response
+    
     def create_soap_fault(self, fault_code, fault_string):
         """Create SOAP Fault response"""
-        return f'''<?xml version="1.0" encoding="UTF-8"?>
-<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
-    <soap:Body>
-        <soap:Fault>
-            <faultcode>{fault_code}</faultcode>
-            <faultstring>{fault_string}</faultstring>
-        </soap:Fault>
-    </soap:Body>
-</soap:Envelope>'''
+        return soap.soap_fault(fault_code, fault_string)
     
     def get_client_ip(self, request):
         """Get client IP address"""
@@ -301,11 +536,44 @@ class TR069ACSView(View):
     
     def determine_value_type(self, value):
         """Determine parameter value type"""
-        if isinstance(value, bool):
-            return 'boolean'
-        elif isinstance(value, int):
-            return 'int'
-        elif isinstance(value, float):
-            return 'float'
-        else:
-            return 'string' 
\ No newline at end of file
+        return determine_value_type(value)
+
+
+_db_executor = None
+_db_executor_lock = threading.Lock()
+
+
+def db_executor():
+    """Thread pool the async endpoint runs request database work on"""
+    global _db_executor
+    with _db_executor_lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ACS_ASYNC_DB_THREADS', DEFAULT_ASYNC_DB_THREADS),
+                thread_name_prefix='acs-db',
+            )
+    return _db_executor
+
+
+class AsyncTR069ACSView(TR069ACSView):
+    """TR-069 ACS endpoint for ASGI servers
+    
+    The ASGI handler reads the request body before calling the view, so a
+    slow upload or the idle time between the POSTs of a CWMP session holds
+    no thread. Each request's database work then runs as one job on a
+    bounded pool (ACS_ASYNC_DB_THREADS) rather than hopping threads per
+    query: Django's async ORM methods would queue every query on the single
+    shared sync thread.
+    """
+    
+    async def post(self, request):
+        handle = sync_to_async(self.handle_in_thread, thread_sensitive=False, executor=db_executor())
+        return await handle(request)
+    
+    def handle_in_thread(self, request):
+        # Pool threads keep their connections; apply CONN_MAX_AGE like a request would
+        close_old_connections()
+        try:
+            return super().post(request)
+        finally:
+            close_old_connections()
@@ -1,21 +1,34 @@
+from django.conf import settings
 from django.urls import path
 from . import views
-from .tr069 import TR069ACSView
+from .tr069 import AsyncTR069ACSView, TR069ACSView
+
+# ASGI servers get the async endpoint unless ACS_ASYNC_ENDPOINT=false
+TR069View = AsyncTR069ACSView if getattr(settings, 'ACS_ASYNC_ENDPOINT', False) else TR069ACSView
 
 app_name = 'acs'
 
 urlpatterns = [
     # TR-069 ACS endpoint for devices
-    path('tr069/', TR069ACSView.as_view(), name='tr069_endpoint'),
+    path('tr069/', TR069View.as_view(), name='tr069_endpoint'),
+    path('firmware/<str:token>/<str:filename>', views.firmware_download, name='firmware_download'),
     
     # ACS Management Views
     path('dashboard/', views.acs_dashboard, name='dashboard'),
     path('devices/', views.discovered_devices, name='discovered_devices'),
     path('devices/<int:device_id>/', views.device_detail, name='device_detail'),
     path('devices/<int:device_id>/parameters/', views.device_parameters, name='device_parameters'),
+    path('devices/<int:device_id>/parameters/tree/', views.device_parameter_tree, name='device_parameter_tree'),
     path('devices/<int:device_id>/tasks/create/', views.create_device_task, name='create_device_task'),
     
     # API endpoints
     path('api/status/', views.real_time_status, name='real_time_status'),
     path('api/statistics/', views.device_statistics, name='device_statistics'),
+    path('api/search/', views.search_suggestions, name='search_suggestions'),
+    path('api/devices/', views.device_list_api, name='device_list_api'),
+    path('api/devices/<int:device_id>/parameters/', views.device_parameters_api, name='device_parameters_api'),
+    path('api/devices/<int:device_id>/history/', views.device_parameter_history, name='device_parameter_history'),
+    path('api/bulk-operations/', views.bulk_operations, name='bulk_operations'),
+    path('api/bulk-operations/<int:operation_id>/', views.bulk_operation_detail, name='bulk_operation_detail'),
+    path('api/bulk-operations/<int:operation_id>/<str:action>/', views.bulk_operation_action, name='bulk_operation_action'),
 ] 
\ No newline at end of file
@@ -1,37 +1,50 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.http import (
+    Http404, HttpResponse, HttpResponseForbidden, JsonResponse, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.views.decorators.http import require_GET, require_POST, require_http_methods, require_safe
+from django.db.models import Q, Count, Max
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
-from .models import DeviceInform, DeviceParameter, DeviceTask, DeviceSession
+import hmac
+import json
+import re
+import time
+from core import search as search_index
+from core.models import ONU
+from core.pagination import COUNT_ESTIMATE, CursorPaginator, InvalidCursor, paginate
+from . import firmware, history, metrics, rollout, rollups, sessions
+from .connreq import wake_devices
+from .models import (
+    BulkOperation, DeviceInform, DeviceParameter, DeviceTask, FirmwareImage,
+)
+from .paths import path_q
+from .status import STATUS_FIELDS, status_row
 
 
 @login_required
 def acs_dashboard(request):
     """ACS Dashboard with device statistics"""
-    # Device statistics
-    total_devices = DeviceInform.objects.count()
-    online_devices = DeviceInform.objects.filter(is_online=True).count()
-    auto_discovered = DeviceInform.objects.filter(auto_discovered=True).count()
+    # Device statistics from the maintained rollups
+    counters = rollups.snapshot()
+    total_devices = counters.get(rollups.TOTAL, {}).get('', 0)
+    online_devices = counters.get(rollups.ONLINE, {}).get('', 0)
+    auto_discovered = counters.get(rollups.AUTO_DISCOVERED, {}).get('', 0)
     
     # Recent discoveries (last 24 hours)
-    recent_cutoff = timezone.now() - timedelta(hours=24)
-    recent_discoveries = DeviceInform.objects.filter(
-        first_contact__gte=recent_cutoff
-    ).count()
+    recent_discoveries = rollups.discoveries_last_day()
     
     # Vendor breakdown
-    vendor_stats = DeviceInform.objects.values('manufacturer').annotate(
-        count=Count('id')
-    ).order_by('-count')[:5]
+    vendor_stats = rollups.breakdown(counters, rollups.VENDOR, 'manufacturer', limit=5)
     
     # Recent devices
     recent_devices = DeviceInform.objects.order_by('-last_inform')[:10]
     
     # Active sessions
-    active_sessions = DeviceSession.objects.filter(is_active=True).count()
+    active_sessions = sessions.get_store().active_count()
     
     context = {
         'total_devices': total_devices,
@@ -47,21 +60,18 @@ def acs_dashboard(request):
     return render(request, 'acs/dashboard.html', context)
 
 
-@login_required
-def discovered_devices(request):
-    """List all auto-discovered devices"""
-    devices = DeviceInform.objects.all().order_by('-last_inform')
+DEVICE_ORDERING = ('-last_inform', '-id')
+PARAMETER_ORDERING = ('parameter_name', 'id')
+
+
+def _filter_devices(request):
+    """Devices matching the list filters in the query string"""
+    devices = DeviceInform.objects.all()
     
     # Search functionality
     search = request.GET.get('search')
     if search:
-        devices = devices.filter(
-            Q(device_id__icontains=search) |
-            Q(serial_number__icontains=search) |
-            Q(manufacturer__icontains=search) |
-            Q(model_name__icontains=search) |
-            Q(ip_address__icontains=search)
-        )
+        devices = devices.filter(search_index.matching_q('device', search))
     
     # Filter by status
     status = request.GET.get('status')
@@ -75,10 +85,16 @@ def discovered_devices(request):
     if manufacturer:
         devices = devices.filter(manufacturer=manufacturer)
     
+    return devices, search, status, manufacturer
+
+
+@login_required
+def discovered_devices(request):
+    """List all auto-discovered devices"""
+    devices, search, status, manufacturer = _filter_devices(request)
+    
     # Pagination
-    paginator = Paginator(devices, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, devices, DEVICE_ORDERING, 25)
     
     # Get available manufacturers for filter
     manufacturers = DeviceInform.objects.values_list(
@@ -120,62 +136,334 @@ def device_detail(request, device_id):
     return render(request, 'acs/device_detail.html', context)
 
 
-@login_required
-def device_parameters(request, device_id):
-    """View device parameters in detail"""
-    device = get_object_or_404(DeviceInform, id=device_id)
-    parameters = DeviceParameter.objects.filter(
-        device_inform=device
-    ).order_by('parameter_name')
+PATH_SEARCH_RE = re.compile(r'^[A-Za-z_][\w*-]*(\.[\w*-]*)+$')
+
+
+def _filter_parameters(request, device):
+    """A device's parameters matching the ``path`` and ``search`` query parameters"""
+    path = request.GET.get('path', '')
+    if path:
+        parameters = DeviceParameter.subtree(device.pk, path)
+    else:
+        parameters = DeviceParameter.objects.filter(device_inform=device)
     
     # Search in parameters
     search = request.GET.get('search')
-    if search:
+    if search and PATH_SEARCH_RE.match(search):
+        parameters = parameters.filter(path_q(search))
+    elif search:
         parameters = parameters.filter(
             Q(parameter_name__icontains=search) |
             Q(parameter_value__icontains=search)
         )
+    return parameters, search, path
+
+
+@login_required
+def device_parameters(request, device_id):
+    """View device parameters in detail
+    
+    ``path`` limits the listing to one subtree. A search that looks like a
+    parameter path (``InternetGatewayDevice.WANDevice.*.``) is a prefix
+    match with ``*`` standing for one segment, served from the name index;
+    anything else is a substring search over names and values.
+    """
+    device = get_object_or_404(DeviceInform, id=device_id)
+    parameters, search, path = _filter_parameters(request, device)
     
     # Pagination
-    paginator = Paginator(parameters, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, parameters, PARAMETER_ORDERING, 50)
     
     context = {
         'device': device,
         'page_obj': page_obj,
         'search': search,
+        'path': path,
     }
     
     return render(request, 'acs/device_parameters.html', context)
 
 
+def _cursor_page(request, queryset, ordering):
+    """Keyset page for a JSON API, or an error response for a bad cursor"""
+    paginator = CursorPaginator(
+        queryset, ordering, _page_limit(request), count=request.GET.get('count', COUNT_ESTIMATE)
+    )
+    try:
+        return paginator.get_page(request.GET.get('cursor')), None
+    except InvalidCursor:
+        return None, JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+
 @login_required
+@require_GET
+def device_list_api(request):
+    """API endpoint listing devices with keyset pagination
+    
+    Takes the discovered_devices filters plus ``cursor``, ``limit`` and
+    ``count`` (exact, estimate or none).
+    """
+    devices, _, _, _ = _filter_devices(request)
+    page, error = _cursor_page(request, devices.values(*STATUS_FIELDS), DEVICE_ORDERING)
+    if error:
+        return error
+    return JsonResponse(page.as_dict([status_row(device) for device in page]))
+
+
+@login_required
+@require_GET
+def device_parameters_api(request, device_id):
+    """API endpoint listing a device's parameters with keyset pagination"""
+    device = get_object_or_404(DeviceInform, id=device_id)
+    parameters, _, _ = _filter_parameters(request, device)
+    page, error = _cursor_page(
+        request,
+        parameters.values('id', 'parameter_name', 'parameter_value', 'value_type', 'last_updated'),
+        PARAMETER_ORDERING,
+    )
+    if error:
+        return error
+    return JsonResponse(page.as_dict([
+        {
+            'name': parameter['parameter_name'],
+            'value': parameter['parameter_value'],
+            'type': parameter['value_type'],
+            'last_updated': parameter['last_updated'].isoformat(),
+        }
+        for parameter in page
+    ]))
+
+
+@login_required
+@require_GET
+def device_parameter_tree(request, device_id):
+    """API endpoint returning one level of a device's parameter tree
+    
+    ``path`` is an object path ending in '.', or empty for the root. The
+    response lists the child objects (to expand lazily) and the parameters
+    stored directly under ``path``.
+    """
+    device = get_object_or_404(DeviceInform, id=device_id)
+    path = request.GET.get('path', '')
+    if path and not path.endswith('.'):
+        path += '.'
+    
+    objects, parameters = DeviceParameter.tree_level(device.pk, path)
+    return JsonResponse({
+        'path': path,
+        'objects': [
+            {'path': child, 'name': child[len(path):-1]} for child in objects
+        ],
+        'parameters': [
+            {
+                'name': parameter.parameter_name,
+                'label': parameter.parameter_name[len(path):],
+                'value': parameter.parameter_value,
+                'type': parameter.value_type,
+                'last_updated': parameter.last_updated.isoformat(),
+            }
+            for parameter in parameters
+        ],
+    })
+
+
+STATUS_STREAM_CHUNK = 500
+
+
+def _status_horizon():
+    """Change sequence old enough that every write stamped before it has committed"""
+    lag = settings.ACS_STATUS_CURSOR_LAG_SECONDS * 1_000_000
+    return time.time_ns() // 1000 - lag
+
+
+def _parse_cursor(value):
+    seq, _, pk = value.partition('.')
+    return int(seq), int(pk or 0)
+
+
+def _page_limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.ACS_STATUS_PAGE_SIZE))
+    except ValueError:
+        limit = settings.ACS_STATUS_PAGE_SIZE
+    return max(1, min(limit, settings.ACS_STATUS_PAGE_SIZE))
+
+
+@login_required
+@require_GET
 def real_time_status(request):
-    """API endpoint for real-time device status updates"""
-    if request.method == 'GET':
-        # Get devices with their online status
-        devices = DeviceInform.objects.values(
-            'id', 'device_id', 'manufacturer', 'model_name', 
-            'is_online', 'last_inform', 'ip_address'
+    """API endpoint for real-time device status updates
+    
+    Without parameters every device is streamed; ``after=<id>&limit=<n>``
+    pages through the same listing. ``since=<cursor>`` returns only devices
+    whose status or last_inform changed after the cursor, in change order,
+    and honours If-None-Match. Every response carries the next ``cursor``.
+    """
+    since = request.GET.get('since')
+    if since is not None:
+        return _status_delta(request, since)
+    return _status_full_sync(request)
+
+
+def _status_delta(request, since):
+    try:
+        seq, pk = _parse_cursor(since)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    changed = DeviceInform.objects.filter(
+        Q(change_seq__gt=seq) | Q(change_seq=seq, id__gt=pk)
+    )
+    summary = changed.aggregate(count=Count('id'), latest=Max('change_seq'))
+    etag = f'"{since}-{summary["count"]}-{summary["latest"] or 0}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    
+    limit = _page_limit(request)
+    rows = list(
+        changed.order_by('change_seq', 'id').values(*STATUS_FIELDS, 'change_seq')[:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    
+    cursor = since
+    if rows:
+        last = rows[-1]
+        horizon = _status_horizon()
+        if more or last['change_seq'] < horizon:
+            cursor = f"{last['change_seq']}.{last['id']}"
+        elif horizon > seq:
+            # Rows stamped by other workers may still be committing; re-read
+            # the lag window next time (the client merge is idempotent)
+            cursor = f"{horizon}.0"
+    
+    response = JsonResponse({
+        'devices': [status_row(row) for row in rows],
+        'cursor': cursor,
+        'more': more,
+        'timestamp': timezone.now().isoformat()
+    })
+    response['ETag'] = etag
+    return response
+
+
+def _status_full_sync(request):
+    # Changes made while the listing streams are picked up by the first delta
+    cursor = f"{_status_horizon()}.0"
+    
+    devices = DeviceInform.objects.order_by('id').values(*STATUS_FIELDS)
+    limit = None
+    if 'after' in request.GET or 'limit' in request.GET:
+        limit = _page_limit(request)
+        try:
+            after = int(request.GET.get('after') or 0)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid after'}, status=400)
+        devices = devices.filter(id__gt=after)[:limit + 1]
+    
+    def stream():
+        yield f'{{"cursor": "{cursor}", "devices": ['
+        count = 0
+        last_id = None
+        more = False
+        chunk = []
+        for device in devices.iterator(chunk_size=2000):
+            if limit is not None and count == limit:
+                more = True
+                break
+            chunk.append(json.dumps(status_row(device)))
+            count += 1
+            last_id = device['id']
+            if len(chunk) == STATUS_STREAM_CHUNK:
+                yield (',' if count > len(chunk) else '') + ','.join(chunk)
+                chunk = []
+        if chunk:
+            yield (',' if count > len(chunk) else '') + ','.join(chunk)
+        yield '], "next_after": %s, "timestamp": "%s"}' % (
+            json.dumps(last_id if more else None), timezone.now().isoformat()
         )
-        
-        device_list = []
-        for device in devices:
-            device_list.append({
-                'id': device['id'],
-                'device_id': device['device_id'],
-                'manufacturer': device['manufacturer'],
-                'model_name': device['model_name'],
-                'is_online': device['is_online'],
-                'last_inform': device['last_inform'].isoformat() if device['last_inform'] else None,
-                'ip_address': device['ip_address'],
-            })
-        
-        return JsonResponse({
-            'devices': device_list,
-            'timestamp': timezone.now().isoformat()
-        })
+    
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+
+HISTORY_DEFAULT_HOURS = 24
+HISTORY_MAX_PARAMETERS = 50
+
+
+@login_required
+@require_GET
+def device_parameter_history(request, device_id):
+    """API endpoint returning parameter history for a time range
+    
+    ``parameter`` (repeatable) is a full name or a partial path such as
+    ``InternetGatewayDevice.WANDevice.*.``; ``start`` and ``end`` are ISO
+    timestamps and default to the last 24 hours. Each series carries the
+    raw change points plus min/max/avg buckets for compacted ranges.
+    """
+    device = get_object_or_404(DeviceInform, id=device_id)
+    end = timezone.now()
+    start = end - timedelta(hours=HISTORY_DEFAULT_HOURS)
+    try:
+        if request.GET.get('end'):
+            end = parse_datetime(request.GET['end'])
+        if request.GET.get('start'):
+            start = parse_datetime(request.GET['start'])
+    except ValueError:
+        start = None
+    if start is None or end is None:
+        return JsonResponse({'error': 'Invalid start or end'}, status=400)
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    
+    names = request.GET.getlist('parameter')
+    if not names:
+        return JsonResponse({'error': 'parameter is required'}, status=400)
+    query = Q()
+    for name in names:
+        query |= path_q(name) if name.endswith('.') or '*' in name else Q(parameter_name=name)
+    parameters = dict(
+        DeviceParameter.objects.filter(query, device_inform=device).order_by(
+            'parameter_name'
+        ).values_list('id', 'parameter_name')[:HISTORY_MAX_PARAMETERS]
+    )
+    
+    series = history.series(device.pk, parameters, start, end)
+    return JsonResponse({
+        'device': device.pk,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': [
+            {'parameter': parameters[pk], **data} for pk, data in series.items()
+        ],
+    })
+
+
+SEARCH_SUGGESTION_LIMIT = 10
+
+
+@login_required
+@require_GET
+def search_suggestions(request):
+    """API endpoint for type-ahead search across CPEs and ONUs"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'devices': [], 'onus': []})
+    
+    devices = DeviceInform.objects.filter(
+        search_index.matching_q('device', query)
+    ).order_by('-last_inform').values(
+        'id', 'device_id', 'serial_number', 'manufacturer', 'model_name', 'ip_address', 'is_online'
+    )[:SEARCH_SUGGESTION_LIMIT]
+    onus = ONU.objects.filter(
+        search_index.matching_q('onu', query)
+    ).order_by('serial_number').values(
+        'id', 'serial_number', 'mac_address', 'ip_address', 'vendor', 'model_name', 'online'
+    )[:SEARCH_SUGGESTION_LIMIT]
+    return JsonResponse({'devices': list(devices), 'onus': list(onus)})
 
 
 @login_required
@@ -204,14 +492,25 @@ def create_device_task(request, device_id):
         elif task_type == 'Reboot':
             parameters['command_key'] = request.POST.get('command_key', '')
         
+        elif task_type == 'Download':
+            image = FirmwareImage.objects.filter(pk=request.POST.get('firmware_image') or None).first()
+            if image is None:
+                return JsonResponse({'success': False, 'message': 'Unknown firmware image'})
+            parameters['firmware_image'] = image.pk
+        
         # Create task
         task = DeviceTask.objects.create(
             device_inform=device,
             task_type=task_type,
             parameters=parameters,
+            firmware_image_id=parameters.get('firmware_image'),
             status='pending'
         )
         
+        # Ask the CPE to connect now rather than at its next periodic Inform
+        if settings.ACS_CONNECTION_REQUEST_ON_TASK and device.connection_request_url:
+            wake_devices([device.pk])
+        
         return JsonResponse({
             'success': True,
             'task_id': task.id,
@@ -221,40 +520,175 @@ def create_device_task(request, device_id):
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
 
+BULK_ROLLOUT_FIELDS = {
+    'wave_size': int,
+    'max_in_flight': int,
+    'wave_interval': int,
+    'min_success_rate': float,
+    'task_timeout': int,
+}
+BULK_ACTIONS = {
+    'start': rollout.start,
+    'pause': rollout.pause,
+    'resume': rollout.start,
+    'abort': rollout.abort,
+}
+
+
+def bulk_operation_row(operation, counts=None):
+    """JSON representation of a bulk operation and its task counts"""
+    return {
+        'id': operation.id,
+        'name': operation.name,
+        'task_type': operation.task_type,
+        'parameters': operation.parameters,
+        'filters': operation.filters,
+        'status': operation.status,
+        'status_message': operation.status_message,
+        **{field: getattr(operation, field) for field in BULK_ROLLOUT_FIELDS},
+        'total_tasks': operation.total_tasks,
+        'tasks': counts if counts is not None else rollout.task_counts(operation),
+        'created_at': operation.created_at.isoformat(),
+        'started_at': operation.started_at.isoformat() if operation.started_at else None,
+        'finished_at': operation.finished_at.isoformat() if operation.finished_at else None,
+    }
+
+
+def can_operate(user):
+    """Whether the user may change devices (Admin or Operator group)"""
+    return user.is_superuser or user.groups.filter(name__in=['Admin', 'Operator']).exists()
+
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def bulk_operations(request):
+    """List bulk operations, or create one from a JSON body
+    
+    The body holds ``name``, ``task_type``, ``parameters`` (as stored on a
+    DeviceTask), ``filters`` (manufacturer, model_name, product_class,
+    software_version and an optional ``parameter`` predicate
+    ``{"name", "op": "eq|ne|contains|startswith", "value"}``) and the
+    rollout limits. ``"dry_run": true`` only counts the matching devices;
+    ``"start": true`` starts the rollout once the tasks are created.
+    """
+    if request.method == 'GET':
+        operations = BulkOperation.objects.all()
+        status = request.GET.get('status')
+        if status:
+            operations = operations.filter(status=status)
+        return JsonResponse({'results': [bulk_operation_row(op) for op in operations[:100]]})
+    
+    if not can_operate(request.user):
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Body must be a JSON object")
+        task_type = data.get('task_type')
+        if task_type not in dict(DeviceTask.TASK_TYPES):
+            raise ValueError(f"Unknown task_type {task_type}")
+        parameters = data.get('parameters') or {}
+        if not isinstance(parameters, dict):
+            raise ValueError("parameters must be an object")
+        filters = data.get('filters') or {}
+        rollout.validate_filters(filters)
+        limits = {
+            field: convert(data[field])
+            for field, convert in BULK_ROLLOUT_FIELDS.items() if field in data
+        }
+        if any(value < 0 for value in limits.values()):
+            raise ValueError("Rollout limits must not be negative")
+        if task_type == 'Download' and not FirmwareImage.objects.filter(
+            pk=parameters.get('firmware_image')
+        ).exists():
+            raise ValueError("Download needs parameters.firmware_image, the id of a firmware image")
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    if data.get('dry_run'):
+        return JsonResponse({'devices': rollout.count_matching(filters)})
+    
+    operation = BulkOperation.objects.create(
+        name=data.get('name') or f"{task_type} rollout",
+        task_type=task_type,
+        parameters=parameters,
+        filters=filters,
+        **limits
+    )
+    rollout.populate(operation)
+    if data.get('start'):
+        rollout.start(operation)
+    return JsonResponse(bulk_operation_row(operation), status=201)
+
+
+@login_required
+@require_GET
+def bulk_operation_detail(request, operation_id):
+    """Progress of one bulk operation"""
+    operation = get_object_or_404(BulkOperation, id=operation_id)
+    return JsonResponse(bulk_operation_row(operation))
+
+
+@login_required
+@require_POST
+def bulk_operation_action(request, operation_id, action):
+    """Start, pause, resume or abort a bulk operation"""
+    if not can_operate(request.user):
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    operation = get_object_or_404(BulkOperation, id=operation_id)
+    if action not in BULK_ACTIONS:
+        return JsonResponse({'error': f'Unknown action {action}'}, status=400)
+    BULK_ACTIONS[action](operation)
+    return JsonResponse(bulk_operation_row(operation))
+
+
+@require_safe
+def firmware_download(request, token, filename):
+    """Firmware file for a Download task; the signed token is the CPE's credential"""
+    ids = firmware.read_token(token)
+    if ids is None:
+        raise Http404("Invalid or expired download link")
+    task_pk, image_pk = ids
+    task = DeviceTask.objects.select_related('firmware_image').filter(
+        pk=task_pk, firmware_image_id=image_pk
+    ).exclude(status__in=['failed', 'cancelled']).first()
+    if task is None or filename != task.firmware_image.filename:
+        raise Http404("Download not found")
+    return firmware.serve(request, task.firmware_image)
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus metrics, for ACS_METRICS_TOKEN bearer tokens or staff users"""
+    token = getattr(settings, 'ACS_METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    authorized = bool(token) and hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode())
+    if not (authorized or request.user.is_staff):
+        return HttpResponseForbidden("Metrics require a bearer token")
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @login_required
 def device_statistics(request):
     """API endpoint for device statistics"""
     # Device counts by status
-    total = DeviceInform.objects.count()
-    online = DeviceInform.objects.filter(is_online=True).count()
+    counters = rollups.snapshot()
+    total = counters.get(rollups.TOTAL, {}).get('', 0)
+    online = counters.get(rollups.ONLINE, {}).get('', 0)
     
     # Device counts by manufacturer
-    manufacturers = DeviceInform.objects.values('manufacturer').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    manufacturers = rollups.breakdown(counters, rollups.VENDOR, 'manufacturer')
     
     # Recent activity (last 7 days)
-    week_ago = timezone.now() - timedelta(days=7)
-    daily_stats = []
-    for i in range(7):
-        day = week_ago + timedelta(days=i)
-        day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        
-        count = DeviceInform.objects.filter(
-            first_contact__gte=day_start,
-            first_contact__lt=day_end
-        ).count()
-        
-        daily_stats.append({
-            'date': day_start.strftime('%Y-%m-%d'),
-            'count': count
-        })
+    week_ago = timezone.localdate() - timedelta(days=7)
+    daily_stats = rollups.daily_discoveries(week_ago, 7)
     
     return JsonResponse({
         'total_devices': total,
         'online_devices': online,
         'offline_devices': total - online,
-        'manufacturers': list(manufacturers),
+        'manufacturers': manufacturers,
+        'firmware_versions': rollups.breakdown(counters, rollups.FIRMWARE, 'software_version'),
         'daily_discoveries': daily_stats
-    }) 
\ No newline at end of file
+    })
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'core' 
\ No newline at end of file
+    name = 'core'
+
+    def ready(self):
+        from . import search
+        from .models import ONU
+
+        search.register('onu', 1, ONU, (
+            'serial_number', 'mac_address', 'ip_address', 'vendor', 'model_name',
+        ))
+        post_migrate.connect(search.create_index, sender=self)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ONU and CPE search index from their tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kinds', nargs='*', metavar='KIND',
+            help="Only reindex these kinds (onu, device)",
+        )
+
+    def handle(self, *args, **options):
+        counts = search.rebuild(options['kinds'] or None)
+        for name, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} {name} objects"))
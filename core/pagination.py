@@ -0,0 +1,228 @@
+"""
+Keyset Pagination
+Pages through a queryset by its sort columns instead of COUNT(*) and OFFSET.
+
+A cursor carries the sort values of the row a page ends (or starts) on;
+the next page is "rows after these values", which the database answers
+from the index on the sort columns at any depth. Sort columns must be
+non-null and end in a unique column (usually ``id``).
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+DEFAULT_COUNT_LIMIT = 10000
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_NONE = 'none'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return parse_datetime(value['dt'])
+        if 'd' in value:
+            return parse_date(value['d'])
+        raise InvalidCursor("Unknown cursor value")
+    return value
+
+
+def encode_cursor(values, backwards=False):
+    data = {'v': [_encode_value(value) for value in values]}
+    if backwards:
+        data['b'] = 1
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(values, backwards)`` for a cursor string"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return [_decode_value(value) for value in data['v']], bool(data.get('b'))
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def _field(ordering):
+    return ordering.lstrip('-'), ordering.startswith('-')
+
+
+def keyset_q(ordering, values):
+    """Q selecting the rows strictly after ``values`` in ``ordering``.
+
+    For ``(a, b)`` ascending this is ``a >= x AND (a > x OR b > y)``: the
+    leading range lets the database seek on the index instead of
+    evaluating an OR across the whole table.
+    """
+    q = None
+    for column, value in reversed(list(zip(ordering, values))):
+        name, descending = _field(column)
+        after = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+        if q is None:
+            q = after
+        else:
+            at_or_after = Q(**{f'{name}__lte' if descending else f'{name}__gte': value})
+            q = at_or_after & (after | q)
+    return q
+
+
+def _reverse(ordering):
+    return [column[1:] if column.startswith('-') else f'-{column}' for column in ordering]
+
+
+class CursorPage:
+    """One page of a CursorPaginator"""
+
+    is_cursor_page = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor, count=None, count_is_estimate=False):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.count_is_estimate = count_is_estimate
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def as_dict(self, results):
+        """JSON API envelope for this page, with ``results`` already serialized"""
+        return {
+            'results': results,
+            'next_cursor': self.next_cursor,
+            'previous_cursor': self.previous_cursor,
+            'count': self.count,
+            'count_is_estimate': self.count_is_estimate,
+        }
+
+
+class CursorPaginator:
+    """Keyset paginator over ``queryset`` sorted by ``ordering``
+
+    ``count`` is ``'exact'`` (COUNT(*)), ``'estimate'`` (counts at most
+    ``count_limit`` rows, or reads MySQL's table statistics for an
+    unfiltered queryset) or ``'none'``.
+    """
+
+    def __init__(self, queryset, ordering, per_page, count=COUNT_ESTIMATE,
+                 count_limit=DEFAULT_COUNT_LIMIT):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.count_mode = count
+        self.count_limit = count_limit
+
+    def _values(self, obj):
+        values = []
+        for column in self.ordering:
+            name, _ = _field(column)
+            if isinstance(obj, dict):
+                values.append(obj[name])
+                continue
+            value = obj
+            for part in name.split('__'):
+                value = getattr(value, part)
+            values.append(value)
+        return values
+
+    def get_page(self, cursor=None):
+        """The page after (or, for a backwards cursor, before) ``cursor``"""
+        values, backwards = decode_cursor(cursor) if cursor else (None, False)
+        ordering = _reverse(self.ordering) if backwards else self.ordering
+
+        rows = self.queryset.order_by(*ordering)
+        if values is not None:
+            if len(values) != len(ordering):
+                raise InvalidCursor("Cursor does not match the ordering")
+            rows = rows.filter(keyset_q(ordering, values))
+        rows = list(rows[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if more or backwards:
+                next_cursor = encode_cursor(self._values(rows[-1]))
+            if values is not None and (more or not backwards):
+                previous_cursor = encode_cursor(self._values(rows[0]), backwards=True)
+
+        count, estimate = self.count()
+        return CursorPage(rows, next_cursor, previous_cursor, count, estimate)
+
+    def count(self):
+        """``(count, is_estimate)`` according to the count mode"""
+        if self.count_mode == COUNT_NONE:
+            return None, False
+        if self.count_mode == COUNT_EXACT:
+            return self.queryset.count(), False
+
+        query = self.queryset.query
+        connection = connections[self.queryset.db]
+        if connection.vendor == 'mysql' and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                    [self.queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] is not None:
+                return row[0], True
+        count = self.queryset.order_by()[:self.count_limit + 1].count()
+        if count > self.count_limit:
+            return self.count_limit, True
+        return count, False
+
+
+def paginate(request, queryset, ordering, per_page, count=COUNT_ESTIMATE):
+    """Page for a list view.
+
+    ``?page=N`` keeps the numbered Paginator for existing links; otherwise
+    the list is keyset-paginated by ``?cursor=``. An unreadable cursor
+    falls back to the first page.
+    """
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        return Paginator(queryset.order_by(*ordering), per_page).get_page(page_number)
+
+    paginator = CursorPaginator(queryset, ordering, per_page, count=count)
+    try:
+        return paginator.get_page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return paginator.get_page()
@@ -0,0 +1,270 @@
+"""
+Search Index
+Substring search over ONUs and CPEs without scanning their tables.
+
+Each indexed object is one row of ``search_index`` holding a normalized
+document of its searchable fields. SQLite uses an FTS5 trigram table
+(``LIKE '%term%'`` is answered from the trigram index), MySQL a FULLTEXT
+index with the ngram parser; other backends fall back to a plain table.
+
+A query matches the objects whose document contains each of its
+whitespace-separated words, so "ZTE F660" finds an ONU whose vendor is ZTE
+and whose model is F660. Words shorter than a trigram (SHORT_QUERY_LENGTH)
+cannot use the trigram index, so they run ``icontains`` over the registered
+fields of the model itself instead: a table scan with the raw word, where
+separators count.
+The index rows of a model live in the database the model is routed to.
+"""
+
+import logging
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'search_index'
+REBUILD_BATCH_SIZE = 1000
+# Queries shorter than this are answered by icontains on the model's fields
+SHORT_QUERY_LENGTH = 3
+
+# SQLite keys each FTS row by rowid = object pk * KIND_SLOTS + kind code
+KIND_SLOTS = 16
+
+# Separators dropped from documents and queries so MACs and serials match
+# however they are typed: "AA:BB:CC", "aa-bb-cc" and "aabbcc" are equal
+_SEPARATORS_RE = re.compile(r'[:\-\s]+')
+
+_registry = {}
+
+
+def normalize(value):
+    return _SEPARATORS_RE.sub('', str(value)).lower()
+
+
+def document(*values):
+    """Searchable text for an object's field values"""
+    return ' '.join(normalize(value) for value in values if value)
+
+
+class SearchKind:
+    """A model registered with the index"""
+
+    def __init__(self, name, code, model, fields):
+        self.name = name
+        self.code = code
+        self.model = model
+        self.fields = fields
+
+    def document(self, instance):
+        return document(*(getattr(instance, field) for field in self.fields))
+
+    def connection(self):
+        return connections[router.db_for_write(self.model)]
+
+
+def register(name, code, model, fields):
+    """Index the ``fields`` of ``model`` under ``name``.
+
+    The index follows saves and deletes through signals; bulk writes that
+    bypass them call update() themselves.
+    """
+    if not 0 <= code < KIND_SLOTS:
+        raise ValueError(f"Search kind code must be below {KIND_SLOTS}")
+    kind = SearchKind(name, code, model, fields)
+    _registry[name] = kind
+
+    def saved(sender, instance, **kwargs):
+        update(name, [instance])
+
+    def deleted(sender, instance, **kwargs):
+        remove(name, [instance.pk])
+
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=f'search-save-{name}')
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=f'search-delete-{name}')
+    return kind
+
+
+class SqliteBackend:
+    """FTS5 virtual table with the trigram tokenizer"""
+
+    def create_table(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} "
+            f"USING fts5(content, tokenize='trigram')"
+        )
+
+    def write(self, cursor, kind, documents):
+        rowids = [(pk * KIND_SLOTS + kind.code,) for pk in documents]
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", rowids)
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, content) VALUES (%s, %s)",
+            [(pk * KIND_SLOTS + kind.code, content) for pk, content in documents.items()],
+        )
+
+    def delete(self, cursor, kind, pks):
+        cursor.executemany(
+            f"DELETE FROM {TABLE} WHERE rowid = %s", [(pk * KIND_SLOTS + kind.code,) for pk in pks]
+        )
+
+    def clear(self, cursor, kind):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid %% {KIND_SLOTS} = %s", [kind.code])
+
+    def matching(self, kind, query):
+        # Documents and queries are lowercase, so the case-sensitive GLOB
+        # matches like LIKE; unlike LIKE ... ESCAPE it keeps the trigram
+        # index.
+        return RawSQL(
+            f"SELECT rowid / {KIND_SLOTS} FROM {TABLE} "
+            f"WHERE content GLOB %s AND rowid %% {KIND_SLOTS} = %s",
+            (f'*{_escape_glob(query)}*', kind.code),
+        )
+
+
+class TableBackend:
+    """Ordinary table keyed by (kind, object_id), searched with LIKE"""
+
+    def create_table(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            f"kind SMALLINT NOT NULL, object_id BIGINT NOT NULL, content TEXT NOT NULL, "
+            f"PRIMARY KEY (kind, object_id))"
+        )
+
+    def write(self, cursor, kind, documents):
+        self.delete(cursor, kind, list(documents))
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (kind, object_id, content) VALUES (%s, %s, %s)",
+            [(kind.code, pk, content) for pk, content in documents.items()],
+        )
+
+    def delete(self, cursor, kind, pks):
+        cursor.executemany(
+            f"DELETE FROM {TABLE} WHERE kind = %s AND object_id = %s",
+            [(kind.code, pk) for pk in pks],
+        )
+
+    def clear(self, cursor, kind):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE kind = %s", [kind.code])
+
+    def matching(self, kind, query):
+        return RawSQL(
+            f"SELECT object_id FROM {TABLE} WHERE kind = %s AND content LIKE %s",
+            (kind.code, f'%{_escape_like(query)}%'),
+        )
+
+
+class MysqlBackend(TableBackend):
+    """InnoDB table with an ngram FULLTEXT index over the documents"""
+
+    def create_table(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            f"kind SMALLINT NOT NULL, object_id BIGINT NOT NULL, content TEXT NOT NULL, "
+            f"PRIMARY KEY (kind, object_id), "
+            f"FULLTEXT KEY {TABLE}_content (content) WITH PARSER ngram"
+            f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+        )
+
+    def matching(self, kind, query):
+        # An ngram phrase search matches the term anywhere in a token
+        phrase = '"%s"' % query.replace('"', '')
+        return RawSQL(
+            f"SELECT object_id FROM {TABLE} "
+            f"WHERE kind = %s AND MATCH (content) AGAINST (%s IN BOOLEAN MODE)",
+            (kind.code, phrase),
+        )
+
+
+def _escape_glob(value):
+    return re.sub(r'([*?\[])', r'[\1]', value)
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def backend(using):
+    vendor = using.vendor
+    if vendor == 'sqlite':
+        return SqliteBackend()
+    if vendor == 'mysql':
+        return MysqlBackend()
+    return TableBackend()
+
+
+def create_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate handler creating the index table if it is missing"""
+    if not router.allow_migrate(using, 'core'):
+        return
+    with connections[using].cursor() as cursor:
+        backend(connections[using]).create_table(cursor)
+
+
+def update(name, instances):
+    """(Re)index model instances of a registered kind"""
+    kind = _registry[name]
+    documents = {instance.pk: kind.document(instance) for instance in instances}
+    if documents:
+        using = kind.connection()
+        with using.cursor() as cursor:
+            backend(using).write(cursor, kind, documents)
+
+
+def update_pks(name, pks):
+    """Reindex objects of a registered kind by primary key"""
+    pks = list(pks)
+    if pks:
+        update(name, _registry[name].model.objects.filter(pk__in=pks))
+
+
+def remove(name, pks):
+    kind = _registry[name]
+    using = kind.connection()
+    with using.cursor() as cursor:
+        backend(using).delete(cursor, kind, list(pks))
+
+
+def matching_q(name, query):
+    """Q selecting the objects of ``name`` whose document contains every word of ``query``"""
+    kind = _registry[name]
+    q = Q()
+    for word in query.split():
+        q &= _word_q(kind, word)
+    return q
+
+
+def _word_q(kind, word):
+    normalized = normalize(word)
+    if not normalized:
+        return Q()
+    if len(normalized) < SHORT_QUERY_LENGTH:
+        return reduce(or_, (Q(**{f'{field}__icontains': word}) for field in kind.fields))
+    return Q(pk__in=backend(kind.connection()).matching(kind, normalized))
+
+
+def rebuild(names=None):
+    """Reindex every object of the given kinds (default: all). Returns row counts."""
+    counts = {}
+    for name in names or list(_registry):
+        kind = _registry[name]
+        using = kind.connection()
+        with using.cursor() as cursor:
+            backend(using).create_table(cursor)
+            backend(using).clear(cursor, kind)
+        counts[name] = 0
+        last_pk = 0
+        while True:
+            batch = list(kind.model.objects.filter(pk__gt=last_pk).order_by('pk')[:REBUILD_BATCH_SIZE])
+            if not batch:
+                break
+            update(name, batch)
+            counts[name] += len(batch)
+            last_pk = batch[-1].pk
+        logger.info(f"Indexed {counts[name]} {name} objects for search")
+    return counts
@@ -0,0 +1,28 @@
+from django.test import TestCase
+
+from core import search
+from core.models import ONU
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        ONU.objects.create(
+            serial_number='ZTEG99990000', mac_address='DE:AD:BE:EF:00:01', ip_address='10.1.1.6',
+            vendor='ZTE', model_name='F660',
+        )
+        ONU.objects.create(
+            serial_number='HWTC1234ABCD', mac_address='AA:BB:CC:00:11:22', ip_address='10.1.1.5',
+            vendor='Huawei', model_name='HG8245H',
+        )
+
+    def matching(self, query):
+        return sorted(ONU.objects.filter(search.matching_q('onu', query)).values_list('serial_number', flat=True))
+
+    def test_words_match_across_fields(self):
+        self.assertEqual(self.matching('ZTE F660'), ['ZTEG99990000'])
+        self.assertEqual(self.matching('huawei  hg8245'), ['HWTC1234ABCD'])
+        self.assertEqual(self.matching('ZTE HG8245'), [])
+
+    def test_short_words_and_separators(self):
+        self.assertEqual(self.matching('aa:bb:cc'), ['HWTC1234ABCD'])
+        self.assertEqual(self.matching('F6 zte'), ['ZTEG99990000'])
@@ -1,8 +1,9 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
+from . import search as search_index
+from .pagination import paginate
 from .models import ONU, CustomerInfo
 from .forms import ONUForm, CustomerForm
 
@@ -47,12 +48,7 @@ def onu_list(request):
     # Search functionality
     search = request.GET.get('search')
     if search:
-        onus = onus.filter(
-            Q(serial_number__icontains=search) |
-            Q(mac_address__icontains=search) |
-            Q(ip_address__icontains=search) |
-            Q(model_name__icontains=search)
-        )
+        onus = onus.filter(search_index.matching_q('onu', search))
     
     # Filter by vendor
     vendor = request.GET.get('vendor')
@@ -67,9 +63,7 @@ def onu_list(request):
         onus = onus.filter(online=False)
     
     # Pagination
-    paginator = Paginator(onus, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, onus, ('serial_number', 'id'), 25)
     
     context = {
         'page_obj': page_obj,
@@ -159,9 +153,7 @@ def customer_list(request):
         )
     
     # Pagination
-    paginator = Paginator(customers, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, customers, ('id',), 25)
     
     return render(request, 'customers/list.html', {'page_obj': page_obj, 'search': search})
 
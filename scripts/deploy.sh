@@ -18,7 +18,9 @@ echo "► Installing Python packages..."
 "$PIP" install -r "$APP_DIR/requirements.txt"
 
 echo "► Applying migrations..."
-"$PY" "$APP_DIR/manage.py" migrate --noinput
+for DB in $("$PY" "$APP_DIR/manage.py" shell -c "from django.conf import settings; print(*settings.DATABASES)"); do
+  "$PY" "$APP_DIR/manage.py" migrate --noinput --database "$DB"
+done
 
 echo "► Collecting static files..."
 "$PY" "$APP_DIR/manage.py" collectstatic --noinput
@@ -56,10 +56,14 @@ MYSQL_USER=$DB_USER
 MYSQL_PASSWORD=$DB_PASS
 MYSQL_HOST=127.0.0.1
 MYSQL_PORT=3306
+
+ACS_FIRMWARE_SENDFILE=nginx
 EOF
 
 # 8. Django migrate & collectstatic
+# Every database: the telemetry tables live in their own (acs.routers)
 sudo -u "$PORTAL_USER" -H "$APP_DIR/venv/bin/python" "$APP_DIR/manage.py" migrate --noinput
+sudo -u "$PORTAL_USER" -H "$APP_DIR/venv/bin/python" "$APP_DIR/manage.py" migrate --noinput --database telemetry
 sudo -u "$PORTAL_USER" -H "$APP_DIR/venv/bin/python" "$APP_DIR/manage.py" collectstatic --noinput
 
 # 9. Ask for superuser creation (interactive)
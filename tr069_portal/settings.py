@@ -47,6 +47,7 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap5'
 CRISPY_TEMPLATE_PACK = 'bootstrap5'
 
 MIDDLEWARE = [
+    'acs.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,15 +76,63 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'tr069_portal.wsgi.application'
+ASGI_APPLICATION = 'tr069_portal.asgi.application'
+
+# Channel layer for WebSocket pushes, which need the ASGI server
+# (scripts/tr069-asgi.service) and CHANNEL_REDIS_URL: Informs, the sweeper
+# and the sockets are in different processes. With the in-memory layer
+# device status is not pushed and the dashboard polls.
+CHANNEL_REDIS_URL = env('CHANNEL_REDIS_URL', default='')
+if CHANNEL_REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [CHANNEL_REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+    }
 
 # Database
+DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', default=300)
+# Seconds a SQLite connection waits for another writer before "database is locked"
+SQLITE_BUSY_TIMEOUT = env.int('SQLITE_BUSY_TIMEOUT', default=20)
+
+# acs.sqlite3 is Django's SQLite backend; read-then-write blocks use BEGIN IMMEDIATE
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'acs.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': SQLITE_BUSY_TIMEOUT},
     }
 }
 
+# ACS telemetry (parameters, history, tasks, bulk operations, firmware images,
+# CWMP sessions) can go to its own database via acs.routers, so Inform bursts
+# do not hold the write lock the operator UI needs. Empty (the default) keeps
+# it in 'default'; set it after moving the rows with `manage.py move_telemetry`
+ACS_TELEMETRY_DATABASE_URL = env('ACS_TELEMETRY_DATABASE_URL', default='')
+if ACS_TELEMETRY_DATABASE_URL:
+    DATABASES['telemetry'] = {
+        **environ.Env.db_url_config(ACS_TELEMETRY_DATABASE_URL),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if DATABASES['telemetry']['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES['telemetry']['ENGINE'] = 'acs.sqlite3'
+        DATABASES['telemetry']['OPTIONS'] = {'timeout': SQLITE_BUSY_TIMEOUT}
+DATABASE_ROUTERS = ['acs.routers.TelemetryRouter']
+
+# Applied to every SQLite connection: WAL lets readers run alongside the
+# writer, and synchronous=NORMAL is durable enough with WAL
+ACS_SQLITE_PRAGMAS = (
+    {'journal_mode': 'WAL', 'synchronous': 'NORMAL'} if env.bool('ACS_SQLITE_WAL', default=True) else {}
+)
+
 # Uncomment below for MySQL production setup
 # DATABASES = {
 #     'default': {
@@ -130,6 +179,108 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# TR-069 ACS
+# Hard caps applied before and while parsing CPE request bodies
+ACS_MAX_BODY_BYTES = env.int('ACS_MAX_BODY_BYTES', default=2 * 1024 * 1024)
+ACS_MAX_PARAMETERS = env.int('ACS_MAX_PARAMETERS', default=5000)
+
+# Inform ingestion: 'sync' writes before replying, 'memory' or 'redis' write
+# behind the InformResponse (redis needs `manage.py run_inform_consumer`)
+ACS_INFORM_INGEST_MODE = env('ACS_INFORM_INGEST_MODE', default='sync')
+ACS_INFORM_QUEUE_SIZE = env.int('ACS_INFORM_QUEUE_SIZE', default=10000)
+ACS_INFORM_BATCH_SIZE = env.int('ACS_INFORM_BATCH_SIZE', default=200)
+ACS_INFORM_BATCH_WAIT = env.float('ACS_INFORM_BATCH_WAIT', default=0.5)
+ACS_INFORM_REDIS_URL = env('ACS_INFORM_REDIS_URL', default='redis://localhost:6379/0')
+# Known devices cached per process so repeat Informs skip the lookup (0 disables)
+ACS_IDENTITY_CACHE_SIZE = env.int('ACS_IDENTITY_CACHE_SIZE', default=100000)
+
+# Liveness: a device goes offline after interval * factor + seconds of silence
+ACS_DEFAULT_INFORM_INTERVAL = env.int('ACS_DEFAULT_INFORM_INTERVAL', default=300)
+ACS_OFFLINE_GRACE_FACTOR = env.float('ACS_OFFLINE_GRACE_FACTOR', default=2.5)
+ACS_OFFLINE_GRACE_SECONDS = env.int('ACS_OFFLINE_GRACE_SECONDS', default=60)
+
+# Parameter history: which parameters keep a change history (glob patterns),
+# and how long raw points / hourly buckets / daily buckets are kept
+ACS_HISTORY_PARAMETERS = env.list('ACS_HISTORY_PARAMETERS', default=[
+    '*.RXPower', '*.TXPower', '*.RxPower', '*.TxPower',
+    '*.OpticalSignalLevel', '*.TransmitOpticalLevel',
+    '*.Temperature', '*.Voltage', '*.BiasCurrent',
+    '*.ExternalIPAddress', '*.SoftwareVersion',
+])
+ACS_HISTORY_RAW_DAYS = env.int('ACS_HISTORY_RAW_DAYS', default=7)
+ACS_HISTORY_HOURLY_DAYS = env.int('ACS_HISTORY_HOURLY_DAYS', default=90)
+ACS_HISTORY_RETENTION_DAYS = env.int('ACS_HISTORY_RETENTION_DAYS', default=365)
+
+# Status API: page size for full syncs/deltas, and how far delta cursors lag
+# behind the newest change so concurrent workers' writes are never skipped
+ACS_STATUS_PAGE_SIZE = env.int('ACS_STATUS_PAGE_SIZE', default=1000)
+ACS_STATUS_CURSOR_LAG_SECONDS = env.int('ACS_STATUS_CURSOR_LAG_SECONDS', default=5)
+
+# Live status push: changed devices are coalesced and sent to dashboard
+# WebSockets at most once per interval
+ACS_STATUS_BROADCAST_INTERVAL = env.float('ACS_STATUS_BROADCAST_INTERVAL', default=1.0)
+
+# Connection requests (ACS -> CPE wake-ups)
+ACS_CONNECTION_REQUEST_USERNAME = env('ACS_CONNECTION_REQUEST_USERNAME', default='')
+ACS_CONNECTION_REQUEST_PASSWORD = env('ACS_CONNECTION_REQUEST_PASSWORD', default='')
+ACS_CONNECTION_REQUEST_CONCURRENCY = env.int('ACS_CONNECTION_REQUEST_CONCURRENCY', default=200)
+ACS_CONNECTION_REQUEST_SUBNET_CONCURRENCY = env.int('ACS_CONNECTION_REQUEST_SUBNET_CONCURRENCY', default=16)
+ACS_CONNECTION_REQUEST_TIMEOUT = env.int('ACS_CONNECTION_REQUEST_TIMEOUT', default=10)
+# Seconds a CPE's digest nonce is reused for later wake-ups
+ACS_CONNECTION_REQUEST_NONCE_TTL = env.int('ACS_CONNECTION_REQUEST_NONCE_TTL', default=300)
+ACS_CONNECTION_REQUEST_ON_TASK = env.bool('ACS_CONNECTION_REQUEST_ON_TASK', default=True)
+
+# Bulk operations: tasks are inserted in chunks and released in waves by
+# `manage.py run_bulk_operations`
+ACS_BULK_CHUNK_SIZE = env.int('ACS_BULK_CHUNK_SIZE', default=1000)
+
+# Firmware images. With ACS_FIRMWARE_SENDFILE=nginx the download view only
+# checks the link and nginx sends the file from ACS_FIRMWARE_ACCEL_PREFIX
+# ('x-sendfile' for servers supporting X-Sendfile; empty serves from Django)
+ACS_FIRMWARE_ROOT = env('ACS_FIRMWARE_ROOT', default=str(BASE_DIR / 'firmware'))
+ACS_FIRMWARE_SENDFILE = env('ACS_FIRMWARE_SENDFILE', default='')
+ACS_FIRMWARE_ACCEL_PREFIX = env('ACS_FIRMWARE_ACCEL_PREFIX', default='/protected-firmware/')
+# Base of the URLs given to CPEs; defaults to the host the CPE reached the ACS on
+ACS_FIRMWARE_BASE_URL = env('ACS_FIRMWARE_BASE_URL', default='')
+ACS_FIRMWARE_URL_MAX_AGE = env.int('ACS_FIRMWARE_URL_MAX_AGE', default=86400)
+ACS_FIRMWARE_DOWNLOAD_TIMEOUT = env.int('ACS_FIRMWARE_DOWNLOAD_TIMEOUT', default=3600)
+
+# Prometheus /metrics. Scrapers authenticate with "Authorization: Bearer
+# <ACS_METRICS_TOKEN>"; staff users can view it when logged in. Workers share
+# samples through PROMETHEUS_MULTIPROC_DIR (set by scripts/tr069.service)
+ACS_METRICS_TOKEN = env('ACS_METRICS_TOKEN', default='')
+
+# Request captures (`manage.py profile_captures`): profile this fraction of
+# CWMP requests and capture every request slower than ACS_PROFILE_SLOW_MS.
+# Both 0 disables the middleware. ACS_PROFILE_ENGINE: cprofile or pyinstrument.
+# Statements and profiles are recorded on the thread running the handler,
+# including the async endpoint's database pool threads
+ACS_PROFILE_SAMPLE_RATE = env.float('ACS_PROFILE_SAMPLE_RATE', default=0.0)
+ACS_PROFILE_SLOW_MS = env.int('ACS_PROFILE_SLOW_MS', default=0)
+ACS_PROFILE_ENGINE = env('ACS_PROFILE_ENGINE', default='cprofile')
+ACS_PROFILE_DIR = env('ACS_PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+ACS_PROFILE_MAX_CAPTURES = env.int('ACS_PROFILE_MAX_CAPTURES', default=200)
+
+# Async CWMP endpoint, on by default when served by tr069_portal/asgi.py
+# (scripts/tr069-asgi.service), off by default under WSGI. Request database
+# work runs on a pool of ACS_ASYNC_DB_THREADS threads per process, each
+# holding its own database connection
+ACS_ASYNC_ENDPOINT = env.bool('ACS_ASYNC_ENDPOINT', default=os.environ.get('TR069_PORTAL_ASGI') == '1')
+ACS_ASYNC_DB_THREADS = env.int('ACS_ASYNC_DB_THREADS', default=16)
+
+# CWMP session store: 'redis' (shared by all workers without database
+# writes), 'memory' (single-process servers only) or 'db' (DeviceSession
+# rows, a write per session state change; only when set explicitly). The
+# default is Redis when REDIS_URL or ACS_SESSION_REDIS_URL is set, as the
+# service units in scripts/ do, else memory. Sessions are keyed by the
+# ACS_SESSION_COOKIE_NAME cookie and expire after ACS_SESSION_TTL seconds
+# without a request
+REDIS_URL = env('REDIS_URL', default='')
+ACS_SESSION_REDIS_URL = env('ACS_SESSION_REDIS_URL', default=REDIS_URL)
+ACS_SESSION_BACKEND = env('ACS_SESSION_BACKEND', default='redis' if ACS_SESSION_REDIS_URL else 'memory')
+ACS_SESSION_COOKIE_NAME = env('ACS_SESSION_COOKIE_NAME', default='cwmpsid')
+ACS_SESSION_TTL = env.int('ACS_SESSION_TTL', default=300)
+
 LOGIN_URL = reverse_lazy('login')
 LOGIN_REDIRECT_URL = reverse_lazy('dashboard')
 LOGOUT_REDIRECT_URL = reverse_lazy('login') 
\ No newline at end of file
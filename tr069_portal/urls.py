@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
 from core import views as core_views
+from acs import views as acs_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -21,4 +22,6 @@ urlpatterns = [
     path('customers/add/', core_views.customer_add, name='customer_add'),
     # TR-069 ACS
     path('acs/', include('acs.urls')),
+    # Prometheus scrape endpoint
+    path('metrics', acs_views.metrics_view, name='metrics'),
 ] 
\ No newline at end of file